@@ -1,10 +1,16 @@
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from dotenv import load_dotenv
 import os
 import logging
+from driver_pool import session_is_fresh, mark_session_fresh, invalidate_session
+import http_fastpath
+from http_fastpath import FastPathUnavailable
+from circuit_breaker import SupplierUnavailable
+from scrape_context import report_rows, propagate
+import waits
+import metrics
 
 # Configure logger
 logging.basicConfig(
@@ -20,11 +26,29 @@ logger = logging.getLogger(__name__)
 # Global session variable
 _login_session = None
 
+load_dotenv()
+
+SUPPLIER = 'IGC'
+SESSION_MAX_AGE = 15 * 60  # Trust a pooled browser's login for this long without re-checking
+BASE_URL = os.getenv('IGC_BASE_URL', 'https://importglasscorp.com').rstrip('/')  # Overridden by the benchmarks
+SEARCH_URL = f'{BASE_URL}/product/search/'
+
+# Readiness predicate: the search form, or the login form when the session is gone
+SEARCH_OR_LOGIN = [(By.CSS_SELECTOR, "input[name='search']"), (By.ID, "email-address")]
+
+DETAIL_FANOUT = int(os.getenv('IGC_DETAIL_FANOUT', 6))  # Detail pages fetched in parallel
+
 
 def login(driver):
     """Login to Import Glass Corp website with session management"""
     global _login_session
 
+    # A pooled browser that recently proved it is logged in needs no navigation at all
+    if session_is_fresh(driver, SUPPLIER, SESSION_MAX_AGE):
+        logger.info("Reusing authenticated IGC browser session")
+        http_fastpath.export_driver_session(SUPPLIER, driver, only_if_missing=True)
+        return True
+
     logger.info("Logging in to Import Glass Corp")
     load_dotenv()
     username = os.getenv('IGC_USER')
@@ -33,7 +57,7 @@ def login(driver):
 
     try:
         # Make sure we're at the login page first
-        driver.get('https://importglasscorp.com')
+        waits.navigate(driver, BASE_URL, label="home page")
 
         # First check if we already have cookies from a previous login
         if _login_session is not None and len(_login_session) > 0:
@@ -46,24 +70,25 @@ def login(driver):
                     logger.warning(f"Failed to add cookie: {e}")
 
             # Try to navigate to a protected page to check if cookies work
-            driver.get('https://importglasscorp.com/product/search/')
+            found, _ = waits.navigate(driver, SEARCH_URL, ready=SEARCH_OR_LOGIN, label="session check")
             # If we're not redirected to login page, session is valid
-            if not driver.find_elements(By.ID, "email-address"):
+            if found == 0:
                 logger.info("Session cookies still valid")
+                mark_session_fresh(driver, SUPPLIER)
+                http_fastpath.export_driver_session(SUPPLIER, driver)
                 return True
             else:
                 logger.info("Session cookies expired, logging in again")
                 _login_session = None
+                waits.navigate(driver, BASE_URL, label="home page")
 
         # If no session or expired session, perform full login
-        wait = WebDriverWait(driver, 5)
-        driver.get('https://importglasscorp.com')
 
         # Find and fill login form elements
         try:
-            email_field = wait.until(EC.presence_of_element_located((By.ID, 'email-address')))
-            cn_field = wait.until(EC.presence_of_element_located((By.ID, 'customer-number')))
-            pass_field = wait.until(EC.presence_of_element_located((By.ID, 'password')))
+            email_field = waits.wait_for(driver, (By.ID, 'email-address'), 5, "login form")
+            cn_field = driver.find_element(By.ID, 'customer-number')
+            pass_field = driver.find_element(By.ID, 'password')
 
             # Clear and fill inputs
             email_field.clear()
@@ -75,15 +100,17 @@ def login(driver):
             pass_field.send_keys(password)
 
             # Submit form
-            submit_button = wait.until(EC.element_to_be_clickable((By.TAG_NAME, 'button')))
+            submit_button = waits.wait_for(driver, EC.element_to_be_clickable((By.TAG_NAME, 'button')), 5, "login button")
             submit_button.click()
 
             # Wait for login to complete
-            wait.until(EC.url_changes('https://importglasscorp.com'))
+            waits.wait_for(driver, EC.url_changes(BASE_URL), 5, "login redirect")
 
             # Save cookies for future use
             _login_session = driver.get_cookies()
             logger.info(f"Login successful - saved {len(_login_session)} cookies")
+            mark_session_fresh(driver, SUPPLIER)
+            http_fastpath.export_driver_session(SUPPLIER, driver)
             return True
 
         except Exception as e:
@@ -101,69 +128,190 @@ def process_part_detail(driver, part_number):
         logger.info(f"Processing part detail for {part_number}")
 
         # Create a dynamic URL directly
-        direct_url = f"https://importglasscorp.com/glass/{part_number}/"
+        direct_url = f"{BASE_URL}/glass/{part_number}/"
         logger.info(f"Using direct URL: {direct_url}")
 
-        # Navigate to the part detail page
-        driver.get(direct_url)
-
-        # Wait for detail page to load with a short timeout
-        detail_wait = WebDriverWait(driver, 5)
+        # Navigate to the part detail page; once the DOM is parsed a missing table is final
+        waits.navigate(driver, direct_url, label="detail page")
 
         # Try to find table, if not found try alternative URL
-        try:
-            detail_table = detail_wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-        except:
+        if not waits.exists(driver, By.TAG_NAME, "table"):
             logger.warning(f"No detail table found at {direct_url}, trying alternate URL format")
             # Try alternative URL format if first one fails
-            alt_url = f"https://importglasscorp.com/product/detail/{part_number}/"
-            driver.get(alt_url)
-            try:
-                detail_table = detail_wait.until(EC.presence_of_element_located((By.TAG_NAME, "table")))
-            except:
+            alt_url = f"{BASE_URL}/product/detail/{part_number}/"
+            waits.navigate(driver, alt_url, label="detail page")
+            if not waits.exists(driver, By.TAG_NAME, "table"):
                 logger.warning(f"No detail table found at alternate URL {alt_url}")
                 return None
 
-        # Check location directly - focus on Opa-Locka
-        location_elements = [elem.text for elem in driver.find_elements(By.TAG_NAME, "b")
-                             if "Locka" in elem.text or "Warehouse" in elem.text]
-        location = location_elements[0] if location_elements else "Unknown"
+        # Parse the whole page from one snapshot instead of per-cell WebDriver calls
+        result = parse_part_detail(driver.page_source, part_number)
+        if result:
+            logger.info(f"Found available part: {part_number}, {result[2]}, {result[3]}")
+        return result
+    except Exception as e:
+        logger.error(f"Error processing part detail for {part_number}: {e}")
+        return None
 
-        # Skip if not in Opa-Locka
-        if location != "Unknown" and "Opa-Locka" not in location:
-            logger.info(f"Part {part_number} not available in Opa-Locka")
-            return None
 
-        # Process detail rows efficiently
-        detail_rows = detail_table.find_elements(By.CSS_SELECTOR, "tbody tr")
+def parse_search_results(html, partNo):
+    """Part numbers from the .blue-table search results that match partNo"""
+    soup = http_fastpath.parse_html(html)
+    part_numbers = []
+    for table in soup.select(".blue-table"):
+        for row in table.select("tbody tr"):
+            cells = row.find_all("td")
+            if len(cells) < 3:
+                continue
+            part_link = cells[0].find("a")
+            if part_link is None:
+                continue
+            part_number = part_link.get_text(strip=True)
+            # Case-insensitive match
+            if partNo.lower() in part_number.lower():
+                part_numbers.append(part_number)
+    return part_numbers
+
+
+def parse_part_detail(html, part_number):
+    """[part, availability, price, location] from a detail page, or None if not stocked in Opa-Locka.
+
+    Raises ValueError if the page has no detail table at all.
+    """
+    soup = http_fastpath.parse_html(html)
+    detail_table = soup.find("table")
+    if detail_table is None:
+        raise ValueError(f"no detail table for {part_number}")
+
+    # Check location directly - focus on Opa-Locka
+    location_elements = [text for text in (b.get_text(" ", strip=True) for b in soup.find_all("b"))
+                         if "Locka" in text or "Warehouse" in text]
+    location = location_elements[0] if location_elements else "Unknown"
+
+    # Skip if not in Opa-Locka
+    if location != "Unknown" and "Opa-Locka" not in location:
+        logger.info(f"Part {part_number} not available in Opa-Locka")
+        return None
 
-        for row in detail_rows:
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if len(cells) < 5 or part_number not in cells[0].text:
+    for row in detail_table.select("tbody tr"):
+        cells = row.find_all("td")
+        if len(cells) < 5 or part_number not in cells[0].get_text(" ", strip=True):
+            continue
+
+        # Get price
+        price = "Unknown"
+        for cell in cells[2:5]:
+            bold = cell.find("b")
+            if bold is not None:
+                potential_price = bold.get_text(strip=True)
+                if "$" in potential_price or any(c.isdigit() for c in potential_price):
+                    price = potential_price
+                    break
+
+        # Check availability
+        availability = "Yes" if any("In Stock" in cell.get_text(" ", strip=True) for cell in cells) else "No"
+        return [part_number, availability, price, location]
+
+    return None
+
+
+def http_part_detail(part_number):
+    """Fetch and parse one detail page over HTTP, trying the alternate URL format as well"""
+    for url in (f"{BASE_URL}/glass/{part_number}/",
+                f"{BASE_URL}/product/detail/{part_number}/"):
+        response = http_fastpath.fetch(SUPPLIER, url)
+        try:
+            return parse_part_detail(response.text, part_number)
+        except ValueError:
+            logger.warning(f"No detail table found at {url}")
+    return None
+
+
+def fetch_part_details(part_numbers, driver=None):
+    """Fetch detail pages with up to DETAIL_FANOUT in flight, streaming rows as they complete.
+
+    Detail pages are fetched over HTTP with the exported login cookies. A page
+    that fails to load or parse only loses that part. If HTTP is not possible
+    at all and a driver is given, the parts whose fetch had not completed are
+    loaded sequentially in the browser instead.
+    """
+    found = {}
+    processed = set()
+    unavailable = None
+    executor = ThreadPoolExecutor(max_workers=max(1, min(DETAIL_FANOUT, len(part_numbers))))
+    detail = propagate(http_part_detail)
+    futures = {executor.submit(detail, part_number): part_number for part_number in part_numbers}
+    try:
+        for future in as_completed(futures):
+            part_number = futures[future]
+            try:
+                result = future.result()
+            except FastPathUnavailable as e:
+                unavailable = e
+                break
+            except Exception as e:
+                # One broken detail page costs that part, not the rows already found
+                logger.error(f"Error fetching part detail for {part_number}: {e}")
+                metrics.count("detail_fetch_error")
+                result = None
+            processed.add(part_number)
+            if result:
+                found[part_number] = result
+                report_rows(list(found.values()))
+    finally:
+        # Fetches that have not started are not needed any more; running ones finish in the background
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if unavailable is not None:
+        if driver is None:
+            raise unavailable
+        logger.info(f"Parallel detail fetch unavailable ({unavailable}), continuing in the browser")
+        metrics.count("detail_fetch_fallback")
+        # Keep the details that completed over HTTP before the fallback was decided
+        for future, part_number in futures.items():
+            if part_number in processed or not future.done() or future.cancelled() or future.exception():
+                continue
+            processed.add(part_number)
+            if future.result():
+                found[part_number] = future.result()
+        for part_number in part_numbers:
+            if part_number in processed:
                 continue
+            result = process_part_detail(driver, part_number)
+            if result:
+                found[part_number] = result
+                report_rows(list(found.values()))
 
-            # Get price
-            price = "Unknown"
-            for cell_idx in range(2, min(5, len(cells))):
-                bold_elements = cells[cell_idx].find_elements(By.TAG_NAME, "b")
-                if bold_elements:
-                    potential_price = bold_elements[0].text
-                    if "$" in potential_price or any(c.isdigit() for c in potential_price):
-                        price = potential_price
-                        break
+    # Keep the order of the search results
+    return [found[part_number] for part_number in part_numbers if part_number in found]
 
-            # Check availability
-            availability = "Yes" if any("In Stock" in cell.text for cell in cells) else "No"
 
-            logger.info(f"Found available part: {part_number}, {price}, {location}")
+def http_search(partNo, logger):
+    """Browserless IGC search using cookies exported from the Selenium login"""
+    response = http_fastpath.fetch(SUPPLIER, SEARCH_URL)
+    soup = http_fastpath.parse_html(response.text)
+    if soup.find(id="email-address"):
+        raise http_fastpath.auth_failed(SUPPLIER, "redirected to login form")
 
-            return [part_number, availability, price, location]
+    search_input = soup.find("input", attrs={"name": "search"})
+    form = search_input.find_parent("form") if search_input else None
+    if form is None:
+        raise FastPathUnavailable("IGC search form not found")
 
-        return None
-    except Exception as e:
-        logger.error(f"Error processing part detail for {part_number}: {e}")
+    logger.info(f"Searching part in IGC over HTTP: {partNo}")
+    response = http_fastpath.submit_form(SUPPLIER, response, form, {"search": partNo})
+    if "contentTitle" not in response.text:
+        raise FastPathUnavailable("IGC results page has unexpected markup")
+
+    part_numbers = parse_search_results(response.text, partNo)
+    logger.info(f"Found {len(part_numbers)} matching part numbers")
+    if not part_numbers:
         return None
 
+    final_results = fetch_part_details(part_numbers)
+    logger.info(f"Final results count: {len(final_results)}")
+    return final_results
+
 
 def IGCScraper(partNo, driver, logger):
     """Optimized scraper for Import Glass Corp website using direct URLs"""
@@ -171,80 +319,66 @@ def IGCScraper(partNo, driver, logger):
 
     try:
         # Check login status first before navigation
-        if not login(driver):
+        with metrics.span("login"):
+            logged_in = login(driver)
+        if not logged_in:
             logger.error("Failed to login")
-            return None
-
-        # Navigate to search page with existing session
-        driver.get('https://importglasscorp.com/product/search/')
-
-        # Wait for search form to load
-        wait = WebDriverWait(driver, 10)
-        search_input = wait.until(EC.presence_of_element_located((By.NAME, 'search')))
-        search_input.clear()
-        search_input.send_keys(partNo)
-
-        # Submit the search form
-        driver.execute_script("arguments[0].closest('form').submit();", search_input)
+            raise SupplierUnavailable("IGC login failed")
+
+        with metrics.span("search"):
+            # Navigate to search page and wait for the search form (or the login form if the session was dropped)
+            found, _ = waits.navigate(driver, SEARCH_URL, ready=SEARCH_OR_LOGIN, label="search form")
+            if found == 1:
+                logger.info("IGC session expired, logging in again")
+                metrics.count("login_fallback")
+                invalidate_session(driver)
+                with metrics.span("login"):
+                    logged_in = login(driver)
+                if not logged_in:
+                    logger.error("Failed to login")
+                    raise SupplierUnavailable("IGC login failed")
+                waits.navigate(driver, SEARCH_URL, ready=(By.NAME, 'search'), label="search form")
+
+            search_input = driver.find_element(By.NAME, 'search')
+            search_input.clear()
+            search_input.send_keys(partNo)
+
+            # Submit the search form
+            driver.execute_script("arguments[0].closest('form').submit();", search_input)
 
         logger.info("Search submitted, waiting for results...")
 
-        # Wait for results to load
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".contentTitle")))
-        time.sleep(1)  # Short wait for results to fully load
-
-        # Find all tables at once
-        tables = driver.find_elements(By.CSS_SELECTOR, ".blue-table")
-        if not tables:
-            logger.warning(f"No tables found for part {partNo}")
-            return None
-
-        # Extract part numbers from search results
-        part_numbers = []
-        for table in tables:
-            try:
-                # Process rows
-                rows = table.find_elements(By.CSS_SELECTOR, "tbody tr")
-
-                # Extract part numbers that match our search
-                for row in rows:
-                    cells = row.find_elements(By.TAG_NAME, "td")
-                    if len(cells) < 3:
-                        continue
-
-                    part_cell = cells[0]
-                    try:
-                        part_links = part_cell.find_elements(By.TAG_NAME, "a")
-                        if part_links:
-                            part_number = part_links[0].text.strip()
-                            # Case-insensitive match
-                            if partNo.lower() in part_number.lower():
-                                part_numbers.append(part_number)
-                    except:
-                        continue
-            except Exception as e:
-                logger.warning(f"Error processing table: {e}")
-                continue
+        # Results are server-rendered: once .contentTitle exists and the DOM is parsed they are complete.
+        # .contentTitle is on every page, so first wait for the search page itself to go away.
+        with metrics.span("results"):
+            waits.wait_for(driver, EC.staleness_of(search_input), 10, "search page unloaded")
+            waits.wait_for(driver, (By.CSS_SELECTOR, ".contentTitle"), 10, "search results")
+            mark_session_fresh(driver, SUPPLIER)
+            waits.wait_for_dom(driver, 10, "search results parsed")
+
+        # Extract part numbers from one snapshot of the search results
+        with metrics.span("extract"):
+            page_source = driver.page_source
+            if "blue-table" not in page_source:
+                logger.warning(f"No tables found for part {partNo}")
+                return None
+            part_numbers = parse_search_results(page_source, partNo)
 
         logger.info(f"Found {len(part_numbers)} matching part numbers")
 
         if not part_numbers:
             return None
 
-        # Process parts sequentially using direct URLs
-        final_results = []
-
-        for part_number in part_numbers:
-            result = process_part_detail(driver, part_number)
-            if result:
-                final_results.append(result)
+        # Fan the detail pages out in parallel using direct URLs
+        with metrics.span("details"):
+            final_results = fetch_part_details(part_numbers, driver)
 
         logger.info(f"Final results count: {len(final_results)}")
         return final_results
 
     except Exception as e:
         logger.error(f"Error searching for part number {partNo} on IGC: {e}")
-        return None
+        raise
 
 
 # Example usage
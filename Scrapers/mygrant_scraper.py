@@ -1,26 +1,51 @@
-from bs4 import BeautifulSoup
 import os
 import time
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from driver_pool import session_is_fresh, mark_session_fresh, invalidate_session
+import http_fastpath
+from http_fastpath import FastPathUnavailable
+from circuit_breaker import SupplierUnavailable
+import waits
+import metrics
 
 # Global cookies storage
 _mygrant_cookies = None
 
+load_dotenv()
+
+SUPPLIER = 'MyGrant'
+BASE_URL = os.getenv('MYGRANT_BASE_URL', 'https://www.mygrantglass.com').rstrip('/')  # Overridden by the benchmarks
+LOGIN_URL = f'{BASE_URL}/pages/login.aspx'
+SESSION_MAX_AGE = 15 * 60  # Trust a pooled browser's login for this long without re-checking
+
+# Readiness predicate for a search: results, an explicit "no results", or the login form
+RESULTS_OR_LOGIN = [
+    (By.ID, "cpsr_DivParts"),
+    (By.XPATH, "//div[contains(text(), 'No results')]"),
+    (By.ID, "clogin_TxtUsername"),
+]
+
 
 def login(driver, logger):
     """Login to MyGrant website with cookies persistence"""
     global _mygrant_cookies
 
+    # A pooled browser that recently proved it is logged in needs no navigation at all
+    if session_is_fresh(driver, SUPPLIER, SESSION_MAX_AGE):
+        logger.info("Reusing authenticated MyGrant browser session")
+        http_fastpath.export_driver_session(SUPPLIER, driver, only_if_missing=True)
+        return True
+
     logger.info("Checking login status for MyGrant")
 
     # Try using existing cookies if available
     if _mygrant_cookies is not None and len(_mygrant_cookies) > 0:
         logger.info("Attempting to use saved cookies")
-        driver.get('https://www.mygrantglass.com')
+        waits.navigate(driver, BASE_URL, label="home page")
 
         # Add saved cookies
         for cookie in _mygrant_cookies:
@@ -30,11 +55,13 @@ def login(driver, logger):
                 logger.warning(f"Failed to add cookie: {e}")
 
         # Navigate to a protected page to verify login
-        driver.get('https://www.mygrantglass.com/pages/search.aspx')
+        waits.navigate(driver, f'{BASE_URL}/pages/search.aspx', label="session check")
 
         # Check if we're still on the search page and not redirected to login
         if 'login.aspx' not in driver.current_url:
             logger.info("Login successful using cookies")
+            mark_session_fresh(driver, SUPPLIER)
+            http_fastpath.export_driver_session(SUPPLIER, driver)
             return True
         else:
             logger.info("Cookies expired, performing full login")
@@ -46,29 +73,31 @@ def login(driver, logger):
     password = os.getenv('MYGRANT_PASS')
 
     try:
-        driver.get('https://www.mygrantglass.com/pages/login.aspx')
-        wait = WebDriverWait(driver, 10)
+        waits.navigate(driver, LOGIN_URL,
+                       ready=EC.visibility_of_element_located((By.ID, "clogin_TxtUsername")), label="login form")
 
-        # Wait until username field is visible and enter username
-        username_field = wait.until(EC.visibility_of_element_located((By.ID, "clogin_TxtUsername")))
+        # Username field is visible - enter username
+        username_field = driver.find_element(By.ID, "clogin_TxtUsername")
         username_field.clear()
         username_field.send_keys(username)
 
         # Wait until password field is visible and enter password
-        password_field = wait.until(EC.visibility_of_element_located((By.ID, "clogin_TxtPassword")))
+        password_field = waits.wait_for(driver, EC.visibility_of_element_located((By.ID, "clogin_TxtPassword")), 10, "login form")
         password_field.clear()
         password_field.send_keys(password)
 
         # Wait until login button is clickable and click it
-        login_button = wait.until(EC.element_to_be_clickable((By.ID, "clogin_ButtonLogin")))
+        login_button = waits.wait_for(driver, EC.element_to_be_clickable((By.ID, "clogin_ButtonLogin")), 10, "login button")
         login_button.click()
 
         # Wait for redirect after login
-        wait.until(EC.url_changes('https://www.mygrantglass.com/pages/login.aspx'))
+        waits.wait_for(driver, EC.url_changes(LOGIN_URL), 10, "login redirect")
 
         # Save cookies for future use
         _mygrant_cookies = driver.get_cookies()
         logger.info(f"Login successful - saved {len(_mygrant_cookies)} cookies")
+        mark_session_fresh(driver, SUPPLIER)
+        http_fastpath.export_driver_session(SUPPLIER, driver)
         return True
 
     except Exception as e:
@@ -76,83 +105,115 @@ def login(driver, logger):
         return False
 
 
-def MyGrantScraper(partNo, driver, logger):
-    """Optimized scraper for MyGrant using list comprehensions and improved error handling"""
-    try:
-        # Ensure login first
-        if not login(driver, logger):
-            logger.error("Failed to login to MyGrant")
-            return []
+def search_url(partNo):
+    return f'{BASE_URL}/pages/search.aspx?q={quote_plus(partNo)}&sc=r&do=Search'
 
-        # URL for part search
-        url = f'https://www.mygrantglass.com/pages/search.aspx?q={partNo}&sc=r&do=Search'
-        logger.info(f"Searching for part in MyGrant: {partNo}")
-        driver.get(url)
 
-        # Wait for page to load with 10-second timeout
-        wait = WebDriverWait(driver, 10)
+def _has_no_results(soup):
+    """Equivalent of //div[contains(text(), 'No results')]"""
+    return any(
+        any('No results' in text for text in div.find_all(string=True, recursive=False))
+        for div in soup.find_all('div')
+    )
 
-        # Wait for either results div or "no results" message
-        wait.until(EC.presence_of_element_located(
-            (By.XPATH, "//div[@id='cpsr_DivParts'] | //div[contains(text(), 'No results')]")))
 
-        # Check for "no results" message
-        if driver.find_elements(By.XPATH, "//div[contains(text(), 'No results')]"):
-            logger.info(f"No results found for part {partNo}")
-            return []
+def parse_search_results(html):
+    """Rows of [part, availability, price, location] from a search results page.
 
-        # Find locations (h3 elements) - skip the first one as it's the header
-        locations = driver.find_elements(By.XPATH, "//div[@id='cpsr_DivParts']/h3")
-        if not locations or len(locations) <= 1:
-            logger.info(f"No location headers found for part {partNo}")
-            return []
+    Returns None if the page is neither a results page nor a "no results" page.
+    """
+    soup = http_fastpath.parse_html(html)
+    parts_div = soup.find('div', id='cpsr_DivParts')
+    if parts_div is None:
+        return [] if _has_no_results(soup) else None
+    if _has_no_results(soup):
+        return []
 
-        # Skip the first h3 as it's usually just the page title
-        locations = locations[1:]
+    # Skip the first h3 as it's usually just the page title
+    locations = parts_div.find_all('h3', recursive=False)[1:]
 
-        # Process all locations and extract parts using list comprehension
-        parts = []
+    parts = []
+    for location_elem in locations:
+        location = location_elem.get_text(" ", strip=True)
+        table = next((sibling for sibling in location_elem.find_next_siblings('table')
+                      if sibling.get('class') == ['partlist']), None)
+        if table is None:
+            continue
 
-        for location_elem in locations:
-            try:
-                location = location_elem.text.strip()
-                logger.info(f"Processing location: {location}")
+        location_parts = []
+        for row in table.find_all('tr')[1:]:
+            cells = row.find_all('td', recursive=False)
+            if len(cells) >= 4:
+                availability_text = cells[1].get_text(" ", strip=True)
+                part_number = cells[2].get_text(" ", strip=True)
+                price = cells[3].get_text(" ", strip=True)
 
-                # Find all table rows for this location
-                xpath_query = f"//h3[contains(text(), '{location}')]/following-sibling::table[@class='partlist'][1]//tr[position() > 1]"
-                rows = driver.find_elements(By.XPATH, xpath_query)
+                # Convert availability to Yes/No format
+                availability = "Yes" if "yes" in availability_text.lower() else "No"
+                location_parts.append([part_number, availability, price, location])
 
-                # Process each row in this location's table
-                location_parts = []
+        parts.extend(location_parts)
+    return parts
 
-                for row in rows:
-                    try:
-                        # Extract cells using XPath
-                        cells = row.find_elements(By.XPATH, "./td")
 
-                        # Only process rows with enough cells
-                        if len(cells) >= 4:
-                            availability_text = cells[1].text.strip()
-                            part_number = cells[2].text.strip()
-                            price = cells[3].text.strip()
+def http_search(partNo, logger):
+    """Browserless MyGrant search using cookies exported from the Selenium login"""
+    logger.info(f"Searching for part in MyGrant over HTTP: {partNo}")
+    response = http_fastpath.fetch(SUPPLIER, search_url(partNo))
+    if 'login.aspx' in response.url:
+        raise http_fastpath.auth_failed(SUPPLIER, "redirected to login.aspx")
 
-                            # Convert availability to Yes/No format
-                            availability = "Yes" if "yes" in availability_text.lower() else "No"
+    parts = parse_search_results(response.text)
+    if parts is None:
+        raise FastPathUnavailable("MyGrant results page has unexpected markup")
 
-                            # Add part to location parts
-                            location_parts.append([part_number, availability, price, location])
+    logger.info(f"Found {len(parts)} parts for {partNo}")
+    return parts
 
-                    except Exception as e:
-                        logger.warning(f"Error processing row: {e}")
-                        continue
 
-                # Add all parts from this location
-                parts.extend(location_parts)
-                logger.info(f"Found {len(location_parts)} parts at {location}")
+def MyGrantScraper(partNo, driver, logger):
+    """Optimized scraper for MyGrant using list comprehensions and improved error handling"""
+    try:
+        # Ensure login first
+        with metrics.span("login"):
+            logged_in = login(driver, logger)
+        if not logged_in:
+            logger.error("Failed to login to MyGrant")
+            raise SupplierUnavailable("MyGrant login failed")
 
-            except Exception as e:
-                logger.warning(f"Error processing location {location}: {e}")
-                continue
+        # URL for part search
+        url = search_url(partNo)
+        logger.info(f"Searching for part in MyGrant: {partNo}")
+        with metrics.span("search"):
+            waits.navigate(driver, url, label="search page")
+        # Wait for results, "no results" or the login form - whichever shows up first
+        with metrics.span("results"):
+            found, _ = waits.wait_for_any(driver, RESULTS_OR_LOGIN, label="search results")
+
+        # A pooled session can be dropped server-side; log in again and retry once
+        if found == 2:
+            logger.info("MyGrant session expired, logging in again")
+            metrics.count("login_fallback")
+            invalidate_session(driver)
+            with metrics.span("login"):
+                logged_in = login(driver, logger)
+            if not logged_in:
+                logger.error("Failed to login to MyGrant")
+                raise SupplierUnavailable("MyGrant login failed")
+            with metrics.span("search"):
+                waits.navigate(driver, url, label="search page")
+            with metrics.span("results"):
+                waits.wait_for_any(driver, RESULTS_OR_LOGIN[:2], label="search results")
+        mark_session_fresh(driver, SUPPLIER)
+        with metrics.span("results"):
+            waits.wait_for_dom(driver, 10, "search results parsed")
+
+        # Parse all locations and rows from one snapshot of the results page
+        with metrics.span("extract"):
+            parts = parse_search_results(driver.page_source)
+        if parts is None:
+            logger.info(f"No location headers found for part {partNo}")
+            raise SupplierUnavailable("MyGrant results page has unexpected markup")
 
         if not parts:
             logger.info(f"No parts found for {partNo}")
@@ -163,7 +224,7 @@ def MyGrantScraper(partNo, driver, logger):
 
     except Exception as e:
         logger.error(f"Error in MyGrant scraper: {e}")
-        return []
+        raise
 
 
 # For testing purposes
@@ -1,147 +1,212 @@
 import os
 import time
 import re
+from urllib.parse import quote_plus
 from dotenv import load_dotenv
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, StaleElementReferenceException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
+from driver_pool import session_is_fresh, mark_session_fresh, invalidate_session
+from http_fastpath import parse_html
+from circuit_breaker import SupplierUnavailable
+import waits
+import metrics
 
 
+load_dotenv()
 
+SUPPLIER = 'Pilkington'
+BASE_URL = os.getenv('PIL_BASE_URL', 'https://shop.pilkington.com').rstrip('/')  # Overridden by the benchmarks
+SHOP_URL = f'{BASE_URL}/ecomm'
+SESSION_MAX_AGE = 15 * 60  # Trust a pooled browser's login for this long without re-checking
+WAIT_TIMEOUT = 10  # Max wait for any single page state
 
+MODAL_XPATH = "//div[@uib-modal-window='modal-window'] | //div[contains(@class, 'modal')]"
+NO_RESULTS_XPATH = "//span[contains(text(), 'Found no') and .//span[@data-slot='inRangeFilter']//strong[contains(text(), 'in range')]]"
+TABLE_XPATH = "//table[contains(@class, 'products-table') and contains(@class, 'table') and contains(@class, 'table-striped') and contains(@class, 'no-image')]"
 
-def PilkingtonScraper(partNo, driver, logger):
-    """Optimized scraper that returns part data from Pilkington website"""
-    wait = WebDriverWait(driver, 10)
+# Whichever of these shows up first tells us what the search page turned into
+SEARCH_OUTCOMES = [
+    (By.XPATH, TABLE_XPATH),
+    (By.XPATH, NO_RESULTS_XPATH),
+    (By.XPATH, MODAL_XPATH),
+]
 
-    # Default parts to return if methods fail
-    default_parts = [["Not Found", "Not Found", "Not Found", "Not Found"]]
+
+def login(driver, logger):
+    """Log in to Pilkington, skipped while the pooled browser's session is known-good"""
+    if session_is_fresh(driver, SUPPLIER, SESSION_MAX_AGE):
+        logger.info("Reusing authenticated Pilkington browser session")
+        return True
 
     load_dotenv()
     username = os.getenv('PIL_USER')
     password = os.getenv('PIL_PASS')
 
+    # First, try to see if we're already logged in by navigating to the main site
+    login_button = waits.navigate(driver, f'{BASE_URL}/', ready=EC.visibility_of_element_located((By.XPATH, "//button[contains(@class, 'btn-login') or contains(text(), 'Customer Login')]")),
+                                  timeout=WAIT_TIMEOUT, label="login button")
+    logger.info("Logging form - trying to login")
+    login_button.click()
+
+    # Step 1: Wait for the username field and enter text
+    username_field = waits.wait_for(driver, EC.visibility_of_element_located((By.ID, "username")), WAIT_TIMEOUT, "username field")
+    username_field.send_keys(username)
+    logger.info("username inserted")
+
+
+    # Step 2: Wait for the password field and enter text
+    password_field = waits.wait_for(driver, EC.visibility_of_element_located((By.ID, "password")), WAIT_TIMEOUT, "password field")
+    password_field.send_keys(password)
+
+    logger.info("password inserted")
+
+    # Step 3: Wait for the checkbox to be clickable and check it
+    checkbox = waits.wait_for(driver, EC.element_to_be_clickable((By.ID, "cbTerms")), WAIT_TIMEOUT, "terms checkbox")
+    checkbox.click()
+
+    logger.info("checkbox clicked")
+
+
+    # Step 4: Wait for the Sign In button and click it
+    sign_in_button = waits.wait_for(driver, EC.element_to_be_clickable((By.XPATH, "//button[@type='button' and @ng-click='submit()']")),
+                                    WAIT_TIMEOUT, "sign in button")
+    sign_in_button.click()
+    logger.info("crendential submitted")
+    popup_elements = waits.wait_for(driver, EC.presence_of_all_elements_located((By.XPATH, MODAL_XPATH)),
+                                    WAIT_TIMEOUT, "post-login popup")
+
+    if SHOP_URL not in driver.current_url:
+        logger.error(f"Login did not reach the shop, ended up on {driver.current_url}")
+        return False
+
+    logger.info("successfully login")
+    mark_session_fresh(driver, SUPPLIER)
     try:
-        # First, try to see if we're already logged in by navigating to the main site
-        driver.get('https://shop.pilkington.com/')
-        logger.info("Logging form - trying to login")
-        wait = WebDriverWait(driver, 10)
-        login_button = wait.until(EC.visibility_of_element_located((By.XPATH, "//button[contains(@class, 'btn-login') or contains(text(), 'Customer Login')]")))
-        login_button.click()
 
-        # Step 1: Wait for the username field and enter text
-        username_field = wait.until(EC.visibility_of_element_located((By.ID, "username")))
-        username_field.send_keys(username)
-        logger.info("username inserted")
+        if popup_elements:
+            close_buttons = driver.find_elements(By.XPATH,
+                                                 ".//button[@class='close'] | //button[contains(text(), 'Close')]")
+            if close_buttons:
+                driver.execute_script("arguments[0].click();", close_buttons[0])
+                logger.info("Closed popup window")
+    except Exception as e:
+        logger.warning(f"Error handling popup: {e}")
+    return True
 
 
-        # Step 2: Wait for the password field and enter text
-        password_field = wait.until(EC.visibility_of_element_located((By.ID, "password")))
-        password_field.send_keys(password)
+def _first_span_text(cell):
+    span = cell.find('span') if cell is not None else None
+    return span.get_text(" ", strip=True) if span is not None else None
 
-        logger.info("password inserted")
 
-        # Step 3: Wait for the checkbox to be clickable and check it
-        checkbox = wait.until(EC.element_to_be_clickable((By.ID, "cbTerms")))
-        checkbox.click()
+def parse_search_results(html):
+    """(location, rows) from the products table; each row is [part, description, price, location]"""
+    soup = parse_html(html)
+    table = soup.find('table', class_=lambda classes: classes and all(
+        cls in classes.split() for cls in ('products-table', 'table', 'table-striped', 'no-image')))
+    if table is None:
+        return None, []
 
-        logger.info("checkbox clicked")
+    # Get location once
+    location_slot = soup.find('span', attrs={'data-slot': 'plantName'})
+    location = _first_span_text(location_slot) or "Unknown Location"
 
+    parts = []
+    for row in table.find_all(lambda tag: tag.name == 'tr' and tag.get('class') == ['product']):
+        cells = row.find_all('td')
+        if len(cells) < 4:
+            continue
+        part_number = _first_span_text(cells[0])
+        description = _first_span_text(cells[1])
+        price = _first_span_text(cells[3])
+        if part_number is None or description is None or price is None:
+            continue
+        parts.append([part_number, description, price, location])
+    return location, parts
 
-        # Step 4: Wait for the Sign In button and click it
-        sign_in_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[@type='button' and @ng-click='submit()']")))
-        sign_in_button.click()
-        logger.info("crendential submitted")
-        popup_elements = wait.until(EC.presence_of_all_elements_located((By.XPATH, "//div[@uib-modal-window='modal-window'] | //div[contains(@class, 'modal')]")))
 
-        if 'https://shop.pilkington.com/ecomm/search/basic/' in driver.current_url or 'https://shop.pilkington.com/ecomm' in driver.current_url:
-            logger.info("successfully login")
-            try:
+def PilkingtonScraper(partNo, driver, logger):
+    """Optimized scraper that returns part data from Pilkington website"""
+    # Returned when the search finds nothing
+    default_parts = [["Not Found", "Not Found", "Not Found", "Not Found"]]
 
-                if popup_elements:
-                    close_buttons = driver.find_elements(By.XPATH,
-                                                         ".//button[@class='close'] | //button[contains(text(), 'Close')]")
-                    if close_buttons:
-                        driver.execute_script("arguments[0].click();", close_buttons[0])
-                        logger.info("Closed popup window")
-            except Exception as e:
-                logger.warning(f"Error handling popup: {e}")
+    try:
+        with metrics.span("login"):
+            logged_in = login(driver, logger)
+        if not logged_in:
+            logger.error("Failed to login to Pilkington")
+            raise SupplierUnavailable("Pilkington login failed")
 
         # Go to search URL
-        url = f'https://shop.pilkington.com/ecomm/search/basic/?queryType=2&query={partNo}&inRange=true&page=1&pageSize=30&sort=PopularityRankAsc'
+        url = f'{SHOP_URL}/search/basic/?queryType=2&query={quote_plus(partNo)}&inRange=true&page=1&pageSize=30&sort=PopularityRankAsc'
         logger.info(f"Searching part in Pilkington: {partNo}")
-        driver.get(url)
-
-        # Handle popup windows - simplified approach
+        with metrics.span("search"):
+            waits.navigate(driver, url, label="search page")
+
+        # Bounced out of the shop means the pooled session was dropped; log in again
+        if SHOP_URL not in driver.current_url:
+            logger.info("Pilkington session expired, logging in again")
+            metrics.count("login_fallback")
+            invalidate_session(driver)
+            with metrics.span("login"):
+                logged_in = login(driver, logger)
+            if not logged_in:
+                logger.error("Failed to login to Pilkington")
+                raise SupplierUnavailable("Pilkington login failed")
+            with metrics.span("search"):
+                waits.navigate(driver, url, label="search page")
+
+        # Wait for results, the no-results banner or a popup - whichever comes first
         try:
-            popup_elements = wait.until(EC.presence_of_all_elements_located((By.XPATH, "//div[@uib-modal-window='modal-window'] | //div[contains(@class, 'modal')]")))
-            if popup_elements:
+            with metrics.span("results"):
+                outcome, _ = waits.wait_for_any(driver, SEARCH_OUTCOMES, WAIT_TIMEOUT, "search outcome")
+        except TimeoutException:
+            logger.warning("Search page did not settle in time, extracting what is there")
+            outcome = None
+
+        # Handle popup windows, then wait for the page underneath it
+        if outcome == 2:
+            try:
                 close_buttons = driver.find_elements(By.XPATH, ".//button[@class='close'] | //button[contains(text(), 'Close')]")
                 if close_buttons:
                     driver.execute_script("arguments[0].click();", close_buttons[0])
                     logger.info("Closed popup window")
-        except Exception as e:
-            logger.warning(f"Error handling popup: {e}")
+                outcome, _ = waits.wait_for_any(driver, SEARCH_OUTCOMES[:2], WAIT_TIMEOUT, "search outcome")
+            except Exception as e:
+                logger.warning(f"Error handling popup: {e}")
 
         # Check for "no results" message
-        try:
-            not_found_elements = driver.find_elements(By.XPATH, "//span[contains(text(), 'Found no') and .//span[@data-slot='inRangeFilter']//strong[contains(text(), 'in range')]]")
-            if not_found_elements:
-                logger.info(f"No data found for part number {partNo}")
-                return default_parts
-        except Exception as e:
-            logger.warning(f"Error checking for no results message: {e}")
+        if outcome == 1:
+            mark_session_fresh(driver, SUPPLIER)
+            logger.info(f"No data found for part number {partNo}")
+            return default_parts
 
         # Extract part data - direct approach
         try:
-            table_xpath = "//table[contains(@class, 'products-table') and contains(@class, 'table') and contains(@class, 'table-striped') and contains(@class, 'no-image')]"
-
-            wait.until(EC.visibility_of_element_located((By.XPATH, table_xpath)))
-            # Check if table exists first
-            tables = driver.find_elements(By.XPATH, table_xpath)
-            if not tables:
+            with metrics.span("results"):
+                waits.wait_for(driver, EC.visibility_of_element_located((By.XPATH, TABLE_XPATH)), WAIT_TIMEOUT, "results table")
+            mark_session_fresh(driver, SUPPLIER)
+            # Parse location and every product row from one snapshot of the page
+            with metrics.span("extract"):
+                location, parts = parse_search_results(driver.page_source)
+            if location is None:
                 logger.info(f"No product table found for {partNo}")
                 return default_parts
-
-            # Get location once
-            try:
-                location_elements = driver.find_elements(By.XPATH, "//span[@data-slot='plantName']//span")
-                location = location_elements[0].text.strip() if location_elements else "Unknown Location"
-            except Exception:
-                location = "Unknown Location"
             logger.info(f"Location: {location}")
 
-            # Extract all parts data
-            part_numbers = [elem.text.strip() for elem in
-                            driver.find_elements(By.XPATH, f'{table_xpath}//tr[@class="product"]//td[1]//span')]
-            descriptions = [elem.text.strip() for elem in
-                            driver.find_elements(By.XPATH, f'{table_xpath}//tr[@class="product"]//td[2]//span')]
-            prices = [elem.text.strip() for elem in
-                      driver.find_elements(By.XPATH, f'{table_xpath}//tr[@class="product"]//td[4]//span')]
-
-            # Build parts list from extracted data
-            parts = []
-            for i in range(min(len(part_numbers), len(descriptions), len(prices))):
-                parts.append([
-                    part_numbers[i],
-                    descriptions[i],
-                    prices[i],
-                    location
-                ])
-
             logger.info(f"Found {len(parts)} parts for {partNo}")
             return parts if parts else default_parts
 
         except Exception as e:
             logger.error(f"Error extracting part data: {e}")
-            return default_parts
+            raise
 
     except Exception as e:
         logger.error(f"Error in Pilkington scraper: {e}")
-        return default_parts
+        raise
     finally:
         # In this version, we're letting the calling code handle driver quitting
         # as shown in your test code
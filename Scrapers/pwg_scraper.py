@@ -4,10 +4,85 @@ import re
 from dotenv import load_dotenv
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException, TimeoutException, StaleElementReferenceException
 from selenium.common.exceptions import UnexpectedAlertPresentException
+from driver_pool import session_is_fresh, mark_session_fresh, invalidate_session
+import waits
+import metrics
+import http_fastpath
+from http_fastpath import FastPathUnavailable
+from circuit_breaker import SupplierUnavailable
+
+load_dotenv()
+
+SUPPLIER = 'PGW'
+BASE_URL = os.getenv('PGW_BASE_URL', 'https://buypgwautoglass.com').rstrip('/')  # Overridden by the benchmarks
+SESSION_MAX_AGE = 15 * 60  # Trust a pooled browser's login for this long without re-checking
+SEARCH_URL = f'{BASE_URL}/PartSearch/search.asp?REG=&UserType=F&ShipToNo=85605&PB=544'
+RESULTS_TIMEOUT = 10  # Max wait for the results table after submitting a search
+CHECKS_TIMEOUT = 20  # Max wait for all availability checks to come back
+CHECKS_QUIET_MS = 300  # No network or DOM activity for this long means the checks are done
+LOGIN_TIMEOUT = 20  # Max wait for the login form and for the post-login landing page
+
+# After submitting the login form we either land on the agreement screen or straight in the app
+AGREE_OR_LOGGED_IN = [
+    (By.XPATH, "//input[@value='I Agree'] | //button[contains(text(), 'Agree')]"),
+    (By.CSS_SELECTOR, ".header, .menu"),
+]
+
+# Instruments XHR/fetch and DOM mutations, then presses every "Check" button in one go
+CHECK_ALL_SCRIPT = """
+if (!window.__pgwChecks) {
+    var state = window.__pgwChecks = {pending: 0, lastChange: Date.now()};
+    var touch = function() { state.lastChange = Date.now(); };
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.pending++; touch();
+        this.addEventListener('loadend', function() { state.pending--; touch(); });
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function() {
+            state.pending++; touch();
+            return fetch.apply(this, arguments).finally(function() { state.pending--; touch(); });
+        };
+    }
+    new MutationObserver(touch).observe(document.body, {childList: true, subtree: true, characterData: true});
+}
+var buttons = document.querySelectorAll('button.button.check');
+buttons.forEach(function(button) { button.click(); });
+window.__pgwChecks.lastChange = Date.now();
+return buttons.length;
+"""
+
+CHECKS_SETTLED_SCRIPT = """
+var state = window.__pgwChecks;
+return !state || (state.pending === 0 && Date.now() - state.lastChange > arguments[0]);
+"""
+
+
+def page_or_alert(driver):
+    """Readiness for navigate(): the DOM is parsed, or an alert popped up that the caller accepts next"""
+    return EC.alert_is_present()(driver) or driver.execute_script("return document.readyState") in ("interactive", "complete")
+
+
+def check_all_availability(driver, logger):
+    """Trigger every availability check at once and wait for them to settle collectively.
+
+    Time spent scales with the slowest check rather than the number of rows.
+    """
+    clicked = driver.execute_script(CHECK_ALL_SCRIPT)
+    logger.info(f"Triggered {clicked} availability checks")
+    if not clicked:
+        return 0
+    try:
+        waits.wait_for(driver, lambda d: d.execute_script(CHECKS_SETTLED_SCRIPT, CHECKS_QUIET_MS),
+                       CHECKS_TIMEOUT, "availability checks")
+    except TimeoutException:
+        logger.warning(f"Availability checks still running after {CHECKS_TIMEOUT}s, extracting what is there")
+    return clicked
 
 
 def login(driver, logger):
@@ -22,7 +97,7 @@ def login(driver, logger):
         try:
 
             # Go to the login page directly
-            driver.get('https://buypgwautoglass.com/')
+            waits.navigate(driver, f'{BASE_URL}/', ready=page_or_alert, label="login page")
 
             # Handle any alert that might be present
             try:
@@ -33,9 +108,6 @@ def login(driver, logger):
             except:
                 pass
 
-            # Wait for page to load
-            wait = WebDriverWait(driver, 20)
-
             # Check if we're already logged in
             if "PartSearch" in driver.current_url:
                 logger.info("Already logged in")
@@ -43,8 +115,8 @@ def login(driver, logger):
 
             # Wait for the username field - this is the most reliable indicator
             try:
-                user_input = wait.until(EC.presence_of_element_located((By.ID, 'txtUsername')))
-                pass_input = wait.until(EC.presence_of_element_located((By.ID, 'txtPassword')))
+                user_input = waits.wait_for(driver, (By.ID, 'txtUsername'), LOGIN_TIMEOUT, "login form")
+                pass_input = driver.find_element(By.ID, 'txtPassword')
 
                 # Clear and fill fields
                 user_input.clear()
@@ -53,7 +125,8 @@ def login(driver, logger):
                 pass_input.send_keys(password)
 
                 # Find and click login button
-                login_button = wait.until(EC.element_to_be_clickable((By.ID, 'button1')))
+                login_button = waits.wait_for(driver, EC.element_to_be_clickable((By.ID, 'button1')),
+                                              LOGIN_TIMEOUT, "login button")
                 login_button.click()
 
                 # Handle any alert that might appear after login
@@ -67,22 +140,20 @@ def login(driver, logger):
 
                 # Handle the agreement screen if it appears
                 try:
-                    time.sleep(2)  # Brief pause to let the page update
-
-                    # Look for the I Agree button or any button with "agree" text
-                    agree_buttons = driver.find_elements(By.XPATH,
-                                                         "//input[@value='I Agree'] | //button[contains(text(), 'Agree')]")
-                    if agree_buttons:
-                        agree_buttons[0].click()
+                    index, element = waits.wait_for_any(driver, AGREE_OR_LOGGED_IN, LOGIN_TIMEOUT, "login landing")
+                    if index == 0:
+                        element.click()
                         logger.info("Clicked 'I Agree' button")
                     else:
                         logger.info("No agreement screen found")
+                except TimeoutException:
+                    logger.info("No agreement screen found")
                 except Exception as e:
                     logger.warning(f"Error handling agreement screen: {e}")
 
                 # Wait for successful login
                 try:
-                    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, ".header, .menu")))
+                    waits.wait_for(driver, (By.CSS_SELECTOR, ".header, .menu"), LOGIN_TIMEOUT, "logged in")
                     logger.info("Login successful")
                     return True
                 except TimeoutException:
@@ -123,11 +194,15 @@ def login(driver, logger):
                                 except:
                                     pass
 
-                                # Wait for page change
-                                time.sleep(5)
+                                # Wait for the redirect to the search page
+                                try:
+                                    waits.wait_for(driver, EC.url_contains("PartSearch"), 5, "alternative login")
+                                except TimeoutException:
+                                    pass
 
                                 # Check if login succeeded
                                 if "PartSearch" in driver.current_url:
+                                    metrics.count("alternative_login")
                                     logger.info("Login successful via alternative method")
                                     return True
 
@@ -146,138 +221,207 @@ def login(driver, logger):
                 raise
 
 
+def _is_part_row(row):
+    bgcolor = row.get('bgcolor') or ''
+    return '#ffffff' in bgcolor or '#C3F4F4' in bgcolor
+
+
+def parse_search_results(html, partNo):
+    """(location, rows, pending_checks) from a results page.
+
+    Each row is [part, availability, price, location, description];
+    pending_checks counts matching rows whose availability cell still holds a
+    "Check" button.
+    """
+    soup = http_fastpath.parse_html(html)
+
+    location = "Unknown"
+    location_element = soup.find('span', class_='b2btext')
+    if location_element is not None:
+        location = location_element.get_text(" ", strip=True).replace("Branch::", "").strip()
+
+    parts = []
+    pending_checks = 0
+    for row in soup.find_all(lambda tag: tag.name == 'tr' and _is_part_row(tag)):
+        cells = row.find_all('td', recursive=False)
+
+        # Get part number from 3rd column
+        part_number = "Unknown"
+        if len(cells) >= 3 and cells[2].find('font') is not None:
+            part_number = cells[2].find('font').get_text(" ", strip=True)
+
+        # Only process if this part is relevant to our search
+        if partNo not in part_number:
+            continue
+
+        # Get availability from 2nd column
+        availability = "Unknown"
+        if len(cells) >= 2:
+            availability = cells[1].get_text(" ", strip=True)
+            if cells[1].select_one('button.button.check') is not None:
+                pending_checks += 1
+
+        # Get description from options div
+        description = "No description"
+        options_el = row.find('div', class_='options')
+        if options_el is not None:
+            description = options_el.get_text('\n', strip=True).replace('»', '').replace('\n', ' - ').strip()
+
+        parts.append([
+            part_number,
+            availability,
+            "See website for pricing",  # Price not directly shown in the HTML
+            location,
+            description
+        ])
+    return location, parts, pending_checks
+
+
+def http_search(partNo, logger):
+    """Browserless PGW search using cookies exported from the Selenium login.
+
+    Availability on PGW is filled in by the per-row "Check" buttons, so results
+    that still need those checks are handed back to the browser path.
+    """
+    response = http_fastpath.fetch(SUPPLIER, SEARCH_URL)
+    if "PartSearch" not in response.url:
+        raise http_fastpath.auth_failed(SUPPLIER, "redirected away from PartSearch")
+
+    soup = http_fastpath.parse_html(response.text)
+    part_input = soup.find('input', id='PartNo')
+    form = part_input.find_parent('form') if part_input else None
+    if form is None:
+        raise FastPathUnavailable("PGW search form not found")
+
+    fields = {part_input.get('name') or 'PartNo': partNo}
+    part_type = soup.find('input', id='PartTypeA')
+    if part_type is not None and part_type.get('name'):
+        fields[part_type['name']] = part_type.get('value', '')
+
+    logger.info(f"Searching for part over HTTP: {partNo}")
+    response = http_fastpath.submit_form(SUPPLIER, response, form, fields)
+    location, parts, pending_checks = parse_search_results(response.text, partNo)
+    if not parts:
+        # The branch banner is on every results page, including one with no matching parts
+        if http_fastpath.parse_html(response.text).find('span', class_='b2btext') is None:
+            raise FastPathUnavailable("PGW results page has unexpected markup")
+        logger.info(f"No parts found for {partNo}")
+        return []
+    if pending_checks:
+        raise FastPathUnavailable("PGW availability requires in-browser checks")
+
+    logger.info(f"Found {len(parts)} parts matching {partNo}")
+    return parts
+
+
 def searchPart(driver, partNo, logger):
     """Search for part on PGW website using optimized XPath selectors"""
     # Default part data if nothing is found
     default_parts = [[f"Not Found", "Not Found", "Not Found", "Not Found", "Not Found"]]
     
     try:
-        # First ensure we're logged in
-        if "PartSearch" not in driver.current_url:
+        # First ensure we're logged in - a pooled browser with a known-good session skips this
+        if session_is_fresh(driver, SUPPLIER, SESSION_MAX_AGE):
+            logger.info("Reusing authenticated PGW browser session")
+        elif "PartSearch" not in driver.current_url:
             logger.info("Not on search page, attempting to login first")
-            if not login(driver, logger):
+            with metrics.span("login"):
+                logged_in = login(driver, logger)
+            if not logged_in:
                 logger.error("Login failed, cannot proceed with search")
-                return default_parts
+                raise SupplierUnavailable("PGW login failed")
+            mark_session_fresh(driver, SUPPLIER)
+            http_fastpath.export_driver_session(SUPPLIER, driver)
                 
         logger.info(f"Searching for part: {partNo}")
             
-        # Navigate to search page
-        search_url = 'https://buypgwautoglass.com/PartSearch/search.asp?REG=&UserType=F&ShipToNo=85605&PB=544'
-        driver.get(search_url)
+        # Navigate to search page and submit the part number
+        with metrics.span("search"):
+            search_url = SEARCH_URL
+            waits.navigate(driver, search_url, ready=page_or_alert, label="search page")
         
-        # Handle any alerts
-        try:
-            alert = driver.switch_to.alert
-            alert.accept()
-        except:
-            pass
+            # Handle any alerts
+            try:
+                alert = driver.switch_to.alert
+                alert.accept()
+            except:
+                pass
+
+            # Redirected away from the search page means the session was dropped
+            if "PartSearch" not in driver.current_url:
+                logger.info("PGW session expired, logging in again")
+                metrics.count("login_fallback")
+                invalidate_session(driver)
+                with metrics.span("login"):
+                    logged_in = login(driver, logger)
+                if not logged_in:
+                    logger.error("Login failed, cannot proceed with search")
+                    raise SupplierUnavailable("PGW login failed")
+                mark_session_fresh(driver, SUPPLIER)
+                http_fastpath.export_driver_session(SUPPLIER, driver)
+                waits.navigate(driver, search_url, ready=page_or_alert, label="search page")
+                try:
+                    driver.switch_to.alert.accept()
+                except:
+                    pass
             
-        # Perform search using XPath
-        wait = WebDriverWait(driver, 5)
-        
-        # Click part type radio button
-        try:
-            type_select = wait.until(EC.element_to_be_clickable((By.ID, "PartTypeA")))
-            type_select.click()
-        except:
-            logger.warning("Part Type radio button not found")
+            # Click part type radio button
+            try:
+                type_select = waits.wait_for(driver, EC.element_to_be_clickable((By.ID, "PartTypeA")), 5, "search form")
+                type_select.click()
+            except:
+                logger.warning("Part Type radio button not found")
             
-        # Enter part number
-        try:
-            part_input = wait.until(EC.presence_of_element_located((By.ID, "PartNo")))
-            part_input.clear()
-            part_input.send_keys(partNo)
-            part_input.send_keys(Keys.RETURN)
-        except Exception as e:
-            logger.error(f"Could not enter part number: {e}")
-            return default_parts
+            # Enter part number
+            try:
+                part_input = waits.wait_for(driver, (By.ID, "PartNo"), 5, "part number field")
+                part_input.clear()
+                part_input.send_keys(partNo)
+                part_input.send_keys(Keys.RETURN)
+            except Exception as e:
+                logger.error(f"Could not enter part number: {e}")
+                raise SupplierUnavailable(f"PGW search form unusable: {e}") from e
             
-        # Wait for results
-        time.sleep(2)
-        
-        # Get location information
-        location = "Unknown"
+        # Wait for the results table (or the branch banner on an empty result). The search page
+        # has the banner too, so first wait for it to go away.
+        results_loaded = False
         try:
-            location_element = driver.find_element(By.XPATH, "//span[@class='b2btext']")
-            if location_element:
-                location = location_element.text.replace("Branch::", "").strip()
-                print(f"Found location: {location}")
-        except:
-            pass
+            with metrics.span("results"):
+                waits.wait_for(driver, EC.staleness_of(part_input), RESULTS_TIMEOUT, "search page unloaded")
+                waits.wait_for(driver, (By.XPATH, "//tr[contains(@bgcolor, '#ffffff') or contains(@bgcolor, '#C3F4F4')] | //span[@class='b2btext']"),
+                               RESULTS_TIMEOUT, "results")
+            # Only a results page proves the session is still good
+            results_loaded = True
+            mark_session_fresh(driver, SUPPLIER)
+            http_fastpath.export_driver_session(SUPPLIER, driver, only_if_missing=True)
+        except TimeoutException:
+            logger.warning("Results did not appear in time, extracting what is there")
         
-        # Click all "Check" buttons first to maximize available data
+        # Press all "Check" buttons in one batch to maximize available data
         try:
-            check_buttons = driver.find_elements(By.CSS_SELECTOR, "button.button.check")
-            print(f"Found {len(check_buttons)} check buttons")
-            for button in check_buttons:
-                button.click()
-                time.sleep(0.2)  # Small delay to avoid UI issues
-        except:
-            pass
+            with metrics.span("availability_checks"):
+                check_all_availability(driver, logger)
+        except Exception as e:
+            logger.warning(f"Error running availability checks: {e}")
             
-        # Extract part data using XPath
-        parts = []
-        
-        # First look for colored rows which contain part data
-        part_rows = driver.find_elements(By.XPATH, "//tr[contains(@bgcolor, '#ffffff') or contains(@bgcolor, '#C3F4F4')]")
-        print(f"Found {len(part_rows)} potential part rows")
-        
-        for row in part_rows:
-            try:
-                # Get part number from 3rd column
-                part_number = "Unknown"
-                try:
-                    part_el = row.find_element(By.XPATH, ".//td[3]//font")
-                    part_number = part_el.text.strip()
-                    print(f"Found part: {part_number}")
-                except:
-                    pass
-                
-                # Only process if this part is relevant to our search
-                if partNo in part_number:
-                    # Get availability from 2nd column
-                    availability = "Unknown"
-                    try:
-                        avail_el = row.find_element(By.XPATH, ".//td[2]")
-                        availability = avail_el.text.strip()
-                        print(f"Availability: {availability}")
-                    except:
-                        pass
-                    
-                    # Get description from options div
-                    description = "No description"
-                    try:
-                        options_el = row.find_element(By.XPATH, ".//div[@class='options']")
-                        if options_el:
-                            description = options_el.text.replace('»', '').replace('\n', ' - ').strip()
-                            print(f"Description: {description}")
-                    except:
-                        pass
-                    
-                    # Add to our parts list
-                    parts.append([
-                        part_number,
-                        availability,
-                        "See website for pricing",  # Price not directly shown in the HTML
-                        location,
-                        description
-                    ])
-                    print(f"Added part to results list: {part_number}")
-            except Exception as e:
-                logger.warning(f"Error processing row: {e}")
-                continue
+        # Extract location and all part rows from one snapshot of the page
+        with metrics.span("extract"):
+            location, parts, pending_checks = parse_search_results(driver.page_source, partNo)
+        logger.info(f"Location: {location}, {len(parts)} matching rows")
                 
         # Return parts or default if none found
         if parts:
             logger.info(f"Found {len(parts)} parts matching {partNo}")
             return parts
+        elif not results_loaded:
+            raise SupplierUnavailable("PGW results page never loaded")
         else:
             logger.warning(f"No parts found for {partNo}")
             return default_parts
             
     except Exception as e:
         logger.error(f"Error in searchPart: {e}")
-        return default_parts
+        raise
 
 def PWGScraper(partNo, driver, logger):
     """Main PGW scraper function"""
@@ -286,6 +430,7 @@ def PWGScraper(partNo, driver, logger):
         return result
     except Exception as e:
         logger.error(f"Error in PWG scraper: {e}")
+        raise
 
 
 
@@ -0,0 +1,59 @@
+import logging
+import math
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveTimeouts:
+    """Per-supplier leg timeouts learned from a rolling window of leg durations.
+
+    A supplier's timeout is its ``percentile`` leg duration times ``margin``
+    plus ``padding`` seconds, clamped to [min_timeout, max_timeout]. Until
+    ``min_samples`` legs have been seen the caller's default applies. Legs
+    that time out are recorded at the timeout they were given, so a supplier
+    that keeps hitting its budget pushes the budget up instead of being
+    starved by it.
+    """
+
+    def __init__(self, min_timeout, max_timeout, percentile=99, margin=1.5, padding=5, window=200,
+                 min_samples=20):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.percentile = percentile
+        self.margin = margin
+        self.padding = padding
+        self.window = window
+        self.min_samples = min_samples
+        self._history = {}  # supplier -> deque of leg durations (seconds)
+        self._budgets = {}  # supplier -> last timeout handed out
+        self._lock = threading.Lock()
+
+    def record(self, supplier, seconds):
+        """Add one finished leg's duration"""
+        with self._lock:
+            history = self._history.get(supplier)
+            if history is None:
+                history = self._history[supplier] = deque(maxlen=self.window)
+            history.append(seconds)
+
+    def timeout_for(self, supplier, default):
+        """Timeout for supplier's next leg; ``default`` while its history is too short"""
+        with self._lock:
+            history = sorted(self._history.get(supplier, ()))
+        if len(history) < self.min_samples:
+            timeout = default
+        else:
+            rank = max(1, math.ceil(self.percentile / 100 * len(history)))
+            timeout = history[rank - 1] * self.margin + self.padding
+        timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+        with self._lock:
+            self._budgets[supplier] = timeout
+        return timeout
+
+    def snapshot(self):
+        """{supplier: (last timeout, legs in the window)}"""
+        with self._lock:
+            return {supplier: (budget, len(self._history.get(supplier, ())))
+                    for supplier, budget in self._budgets.items()}
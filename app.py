@@ -6,7 +6,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from partScraper import runScraper
+from partScraper import STREAM_KEEPALIVE, driver_pool, runScraper
+from job_queue import JobQueue, default_queue_path
+import metrics
 from flask_cors import CORS
 from functools import wraps
 import requests
@@ -19,6 +21,20 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(minutes=30)  # Set session timeout to 30 minutes
 CORS(app)
 
+# SCRAPE_QUEUE=1: searches run in scrape_worker.py processes, fed through the SQLite job queue
+SCRAPE_QUEUE = os.getenv('SCRAPE_QUEUE') == '1'
+job_queue = JobQueue(default_queue_path())
+
+def _collect_job_metrics():
+    depth = job_queue.depth()
+    return metrics.gauge_lines("scrape_jobs", "Queued searches by state", [
+        ({"status": status}, depth.get(status, 0)) for status in ('queued', 'running')])
+
+if SCRAPE_QUEUE:
+    metrics.register_collector(_collect_job_metrics)
+else:
+    driver_pool.start()  # Warm browsers before the first search arrives, as scrape_worker.py does
+
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 login_manager = LoginManager()
@@ -196,11 +212,30 @@ def vinSearch(vin):
 @app.route('/products/<partNumber>', methods=['GET'])
 @login_required
 def products(partNumber):
+    # ?nocache=1 skips cached results and scrapes every supplier live
+    use_cache = request.args.get('nocache', '').lower() not in ('1', 'true', 'yes')
+    user = current_user.get_id()  # Supplier legs are queued fairly per user
+
     def generate():
-        for data in runScraper(partNumber):
-            yield data + '\n'
+        if SCRAPE_QUEUE:
+            job_id = job_queue.enqueue(partNumber, use_cache=use_cache, user=user)
+            lines = job_queue.stream(job_id, keepalive=STREAM_KEEPALIVE)
+        else:
+            lines = runScraper(partNumber, use_cache=use_cache, keepalive=STREAM_KEEPALIVE, user=user)
+        try:
+            for data in lines:
+                yield data + '\n'
+        finally:
+            lines.close()  # Client gone: cancel the search so its drivers are freed
     return Response(stream_with_context(generate()), mimetype='application/json')
 
+@app.route('/metrics')
+@login_required
+@admin_required
+def scraper_metrics():
+    # Per-supplier stage latencies, counters and pool stats in Prometheus text format
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/add_user', methods=['GET', 'POST'])
 @login_required
 @admin_required
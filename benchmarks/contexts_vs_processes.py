@@ -0,0 +1,142 @@
+"""Memory and throughput of one Chrome per driver versus browser contexts in a shared Chrome.
+
+Runs the same searches against the local supplier stubs in each mode, with
+a pool big enough for every supplier leg of ``--concurrency`` searches, and
+samples the resident memory of every chrome/chromedriver process started by
+the run. Needs a local Chrome; set CHROMEDRIVER_PATH (and CHROME_VERSION) so
+undetected_chromedriver does not try to download a driver.
+
+    python benchmarks/contexts_vs_processes.py --searches 20 --concurrency 2 --contexts 4
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_benchmark import CREDENTIAL_VARS
+from stub_server import StubServers
+
+SAMPLE_INTERVAL = 0.25  # Seconds between memory samples
+LEGS_PER_SEARCH = 4
+
+
+class MemorySampler:
+    """Samples the total RSS of chrome/chromedriver processes created after ``since``"""
+
+    def __init__(self, since):
+        self.since = since
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def browser_processes(self):
+        found = []
+        # Chrome is started detached by undetected_chromedriver, so match by name instead of ancestry
+        for proc in psutil.process_iter(['name', 'create_time', 'memory_info']):
+            name = (proc.info['name'] or '').lower()
+            if ('chrome' in name or 'chromedriver' in name) and (proc.info['create_time'] or 0) >= self.since:
+                found.append(proc)
+        return found
+
+    def _run(self):
+        while not self._stop.is_set():
+            procs = self.browser_processes()
+            self.samples.append((len(procs), sum(p.info['memory_info'].rss for p in procs if p.info['memory_info'])))
+            self._stop.wait(SAMPLE_INTERVAL)
+
+
+def search(partScraper, part_no):
+    """Run one search; returns the number of supplier legs that produced rows"""
+    legs = 0
+    for line in partScraper.runScraper(part_no, use_cache=False):
+        payload = json.loads(line)
+        name = next(iter(payload))
+        if name != 'error' and payload.get('status') != 'partial' and payload[name]:
+            legs += 1
+    return legs
+
+
+def run(mode, args, partScraper, DriverPool, ContextFleet):
+    size = args.concurrency * LEGS_PER_SEARCH
+    factory = partScraper.setup_chrome_driver
+    if mode == 'contexts':
+        factory = ContextFleet(partScraper.setup_chrome_driver, args.contexts,
+                               page_load_strategy=partScraper.PAGE_LOAD_STRATEGY).new_driver
+    pool = DriverPool(factory, min_size=size, max_size=size, acquire_timeout=partScraper.DRIVER_ACQUIRE_TIMEOUT)
+    partScraper.driver_pool = pool
+
+    since = time.time() - 1
+    with MemorySampler(since) as sampler:
+        start = time.time()
+        pool.start()
+        while pool.snapshot()['idle'] < size and time.time() - start < 120:
+            time.sleep(0.2)  # Warm every driver so start-up is not counted as throughput
+        warm = time.time() - start
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            legs = sum(executor.map(lambda i: search(partScraper, args.parts[i % len(args.parts)]),
+                                    range(args.searches)))
+        elapsed = time.time() - start
+        processes = max((count for count, _ in sampler.samples), default=0)
+        peak = max((rss for _, rss in sampler.samples), default=0)
+    pool.close()
+
+    print(f"{mode:<9}{size:>8}{processes:>11}{peak / 2**20:>11.0f}{peak / 2**20 / size:>13.0f}"
+          f"{warm:>9.1f}s{args.searches / elapsed:>11.2f}{legs / elapsed:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parts', nargs='+', default=['2000'], help="part numbers to search")
+    parser.add_argument('--searches', type=int, default=10, help="searches per mode")
+    parser.add_argument('--concurrency', type=int, default=1, help="searches running at once")
+    parser.add_argument('--contexts', type=int, default=4, help="browser contexts per Chrome in contexts mode")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every stub response")
+    parser.add_argument('--modes', nargs='+', default=['process', 'contexts'], choices=['process', 'contexts'])
+    args = parser.parse_args()
+
+    servers = StubServers(args.latency).start()
+    os.environ.update(servers.environ())
+    for var in CREDENTIAL_VARS:
+        os.environ[var] = 'benchmark'
+
+    # Imported only now: the scrapers read their base-URL overrides at import time
+    import partScraper
+    from browser_contexts import ContextFleet
+    from driver_pool import DriverPool
+    from result_cache import ResultCache
+
+    partScraper.driver_pool.close()
+    partScraper.result_cache = ResultCache(os.path.join(tempfile.mkdtemp(prefix='scrape-bench-'), 'scrape_cache.db'),
+                                           ttls=partScraper.CACHE_TTLS, default_ttl=partScraper.CACHE_DEFAULT_TTL,
+                                           max_stale=partScraper.CACHE_MAX_STALE)
+    try:
+        print(f"{'mode':<9}{'drivers':>8}{'processes':>11}{'peak MB':>11}{'MB/driver':>13}"
+              f"{'warm-up':>10}{'search/s':>11}{'legs/s':>10}")
+        for mode in args.modes:
+            run(mode, args, partScraper, DriverPool, ContextFleet)
+    finally:
+        servers.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Cold-start time of setup_chrome_driver() with and without the chromedriver/profile cache.
+
+Starts and quits drivers one after another in each mode and reports the
+start-up times and whether directories were left behind in the temp dir or
+the profile cache. Needs a local Chrome; the legacy mode also needs network
+access because undetected_chromedriver downloads chromedriver every time.
+
+    python benchmarks/driver_startup.py --iterations 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def entries(path):
+    return set(os.listdir(path)) if os.path.isdir(path) else set()
+
+
+def run(mode, iterations, setup_chrome_driver, chrome_cache):
+    chrome_cache.ENABLED = mode == 'cached'
+    temp_before = entries(tempfile.gettempdir())
+    profiles_before = entries(chrome_cache.PROFILES_DIR)
+    timings = []
+    for _ in range(iterations):
+        start = time.time()
+        driver = setup_chrome_driver()
+        timings.append(time.time() - start)
+        driver.quit()
+    leaked = len(entries(tempfile.gettempdir()) - temp_before) + len(entries(chrome_cache.PROFILES_DIR) - profiles_before)
+    ordered = sorted(timings)
+    print(f"{mode:<8}first {timings[0]:6.2f}s  median {ordered[len(ordered) // 2]:6.2f}s  "
+          f"max {ordered[-1]:6.2f}s  directories left behind: {leaked}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=3, help="drivers started per mode")
+    parser.add_argument('--modes', nargs='+', default=['legacy', 'cached'], choices=['legacy', 'cached'])
+    args = parser.parse_args()
+
+    import chrome_cache
+    import partScraper
+
+    partScraper.driver_pool.close()  # No background warm-up competing for the CPU
+    for mode in args.modes:
+        run(mode, args.iterations, partScraper.setup_chrome_driver, chrome_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""In-process stand-in for the Selenium WebDriver, backed by static HTML.
+
+Implements the subset of the WebDriver API the scrapers use: navigation,
+find_element(s) by ID/NAME/XPATH/CSS/TAG_NAME/CLASS_NAME, element text and
+attributes, typing, clicking and form submission, cookies, alerts and the
+few execute_script calls the scrapers make. Pages come from a transport, so
+the same driver can run against the benchmark stubs (including their login
+flows), a dict of pages, or a captured replay bundle - with no Chrome and
+no network.
+
+JavaScript is not executed. Form submission (submit buttons, Enter in a
+field, ``form.submit()`` via execute_script) is emulated; other scripts
+return None unless registered through ``scripts``.
+"""
+import re
+from urllib.parse import parse_qs, urlencode, urljoin, urlparse
+
+import lxml.etree
+import lxml.html
+from lxml.cssselect import CSSSelector
+from selenium.common.exceptions import (NoAlertPresentException, NoSuchElementException,
+                                        StaleElementReferenceException)
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+
+MAX_REDIRECTS = 10
+SUBMIT_KEYS = (Keys.RETURN, Keys.ENTER)
+
+
+class FakeResponse:
+    def __init__(self, status=200, body='', location=None, set_cookies=None):
+        self.status = status
+        self.body = body
+        self.location = location
+        self.set_cookies = set_cookies or {}
+
+
+class PagesTransport:
+    """Serves a fixed {url or path: html} mapping; unknown pages are 404s"""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def __call__(self, method, url, data, cookies):
+        parsed = urlparse(url)
+        for key in (url, parsed.path + ('?' + parsed.query if parsed.query else ''), parsed.path):
+            if key in self.pages:
+                return FakeResponse(body=self.pages[key])
+        return FakeResponse(404, f"<html><body>No fake page for {url}</body></html>")
+
+
+class BundleTransport:
+    """Serves the responses recorded in a capture bundle (see capture.py)"""
+
+    def __init__(self, bundle):
+        self.responses = {}
+        for exchange in bundle['exchanges']:
+            parsed = urlparse(exchange['url'])
+            self.responses[(exchange['method'], parsed.path or '/', parsed.query)] = exchange
+            self.responses.setdefault((exchange['method'], parsed.path or '/', None), exchange)
+
+    def __call__(self, method, url, data, cookies):
+        parsed = urlparse(url)
+        exchange = (self.responses.get((method, parsed.path or '/', parsed.query))
+                    or self.responses.get((method, parsed.path or '/', None)))
+        if exchange is None:
+            return FakeResponse(404, f"<html><body>Not recorded: {method} {url}</body></html>")
+        return FakeResponse(exchange['status'], exchange.get('body', ''), exchange.get('location'))
+
+
+class StubTransport:
+    """Runs a benchmark StubSupplier's handlers in-process instead of over HTTP"""
+
+    def __init__(self, stub):
+        self.stub = stub
+
+    def __call__(self, method, url, data, cookies):
+        request = _StubRequest(method, url, cookies)
+        self.stub.handle(request)
+        return request.response
+
+
+class _StubRequest:
+    """The slice of StubRequestHandler the stub handlers call"""
+
+    def __init__(self, method, url, cookies):
+        parsed = urlparse(url)
+        self.command = method
+        self.path_only = parsed.path or '/'
+        self.query = parse_qs(parsed.query)
+        self.cookies = cookies
+        self.response = None
+
+    def param(self, name):
+        return self.query.get(name, [''])[0]
+
+    def has_cookie(self, name):
+        return name in self.cookies
+
+    def send_page(self, body, status=200):
+        self.response = FakeResponse(status, body)
+
+    def redirect(self, location, set_cookie=None):
+        self.response = FakeResponse(303, '', location, {set_cookie: '1'} if set_cookie else None)
+
+
+class FakeAlertSwitch:
+    """driver.switch_to: there is never an alert, window or frame to switch to"""
+
+    @property
+    def alert(self):
+        raise NoAlertPresentException("No alert is present")
+
+    def default_content(self):
+        pass
+
+    def window(self, name):
+        pass
+
+    def frame(self, reference):
+        pass
+
+
+class FakeElement:
+    """WebElement over an lxml element of the page that was current when it was found"""
+
+    def __init__(self, driver, node, generation):
+        self._driver = driver
+        self._node = node
+        self._generation = generation
+
+    def _check(self):
+        if self._generation != self._driver._generation:
+            raise StaleElementReferenceException("element is not attached to the page document")
+        return self._node
+
+    @property
+    def tag_name(self):
+        return self._check().tag
+
+    @property
+    def text(self):
+        return " ".join(self._check().text_content().split())
+
+    def get_attribute(self, name):
+        node = self._check()
+        if name == 'value' and node.tag in ('input', 'textarea', 'select'):
+            return self._driver._values.get(node, node.get('value', '' if node.tag != 'textarea' else node.text or ''))
+        if name == 'checked':
+            return 'true' if self.is_selected() else None
+        if name in ('innerHTML', 'outerHTML'):
+            html = lxml.html.tostring(node, encoding='unicode')
+            return html if name == 'outerHTML' else html[html.find('>') + 1:html.rfind('<')]
+        if name == 'textContent':
+            return node.text_content()
+        return node.get(name)
+
+    get_dom_attribute = get_attribute
+
+    def get_property(self, name):
+        return self.get_attribute(name)
+
+    def is_displayed(self):
+        node = self._check()
+        if node.tag == 'input' and (node.get('type') or '').lower() == 'hidden':
+            return False
+        while node is not None:
+            style = (node.get('style') or '').replace(' ', '').lower()
+            if 'display:none' in style or 'visibility:hidden' in style or node.get('hidden') is not None:
+                return False
+            node = node.getparent()
+        return True
+
+    def is_enabled(self):
+        return self._check().get('disabled') is None
+
+    def is_selected(self):
+        node = self._check()
+        return self._driver._checked.get(node, node.get('checked') is not None or node.get('selected') is not None)
+
+    def clear(self):
+        self._driver._values[self._check()] = ''
+
+    def send_keys(self, *values):
+        node = self._check()
+        typed = self._driver._values.get(node, node.get('value', ''))
+        for value in values:
+            for char in str(value):
+                if char in SUBMIT_KEYS:
+                    self._driver._values[node] = typed
+                    self._driver._submit(node)
+                    return
+                typed += char
+        self._driver._values[node] = typed
+
+    def click(self):
+        node = self._check()
+        node_type = (node.get('type') or '').lower()
+        if node.tag == 'input' and node_type == 'checkbox':
+            self._driver._checked[node] = not self.is_selected()
+        elif node.tag == 'input' and node_type == 'radio':
+            for other in node.getroottree().iter('input'):
+                if other.get('name') == node.get('name') and (other.get('type') or '').lower() == 'radio':
+                    self._driver._checked[other] = other is node
+        elif (node.tag == 'button' and node_type in ('', 'submit')) or (node.tag == 'input' and node_type in ('submit', 'image')):
+            self._driver._submit(node, submitter=node)
+        elif node.tag == 'a' and node.get('href') and not node.get('href').startswith(('#', 'javascript:')):
+            self._driver.get(urljoin(self._driver.current_url, node.get('href')))
+
+    def submit(self):
+        self._driver._submit(self._check())
+
+    def find_element(self, by=By.ID, value=None):
+        return self._driver._find(by, value, self._check(), single=True)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._driver._find(by, value, self._check())
+
+    def __eq__(self, other):
+        return isinstance(other, FakeElement) and other._node is self._node
+
+    def __hash__(self):
+        return id(self._node)
+
+
+class FakeDriver:
+    """Selenium-compatible driver over static HTML served by ``transport``.
+
+    ``transport(method, url, data, cookies)`` returns a FakeResponse; see
+    PagesTransport, BundleTransport and StubTransport. ``scripts`` maps a
+    regular expression to ``handler(driver, *args)`` for execute_script calls
+    beyond the built-in ones.
+    """
+
+    def __init__(self, transport, scripts=None):
+        self.transport = transport
+        self.switch_to = FakeAlertSwitch()
+        self.current_url = 'about:blank'
+        self.page_source = '<html><head></head><body></body></html>'
+        self._cookies = {}
+        self._generation = 0
+        self._tree = lxml.html.fromstring(self.page_source)
+        self._values = {}
+        self._checked = {}
+        self._scripts = [
+            (re.compile(r"return\s+document\.readyState"), lambda driver, *args: 'complete'),
+            (re.compile(r"return\s+navigator\.userAgent"), lambda driver, *args: 'FakeDriver'),
+            (re.compile(r"^\s*arguments\[0\]\.click\(\)"), lambda driver, element, *args: element.click()),
+            (re.compile(r"closest\(['\"]form['\"]\)\.submit\(\)"), lambda driver, element, *args: element.submit()),
+        ]
+        for pattern, handler in (scripts or {}).items():
+            self._scripts.insert(0, (re.compile(pattern), handler))
+
+    # Navigation --------------------------------------------------------
+    def get(self, url, method='GET', data=None):
+        url = urljoin(self.current_url, url) if self.current_url != 'about:blank' else url
+        for _ in range(MAX_REDIRECTS):
+            response = self.transport(method, url, data, dict(self._cookies))
+            self._cookies.update(response.set_cookies)
+            if response.status in (301, 302, 303, 307, 308) and response.location:
+                url = urljoin(url, response.location)
+                if response.status in (301, 302, 303):
+                    method, data = 'GET', None
+                continue
+            break
+        self._load(url, response.body)
+
+    def _load(self, url, html):
+        self.current_url = url
+        self.page_source = html or '<html><head></head><body></body></html>'
+        try:
+            self._tree = lxml.html.fromstring(self.page_source)
+        except (ValueError, lxml.etree.ParserError):
+            self._tree = lxml.html.fromstring('<html><body></body></html>')
+        self._generation += 1
+        self._values = {}
+        self._checked = {}
+
+    def refresh(self):
+        self.get(self.current_url)
+
+    def back(self):
+        pass
+
+    @property
+    def title(self):
+        title = self._tree.find('.//title')
+        return title.text_content().strip() if title is not None else ''
+
+    # Finding -----------------------------------------------------------
+    def find_element(self, by=By.ID, value=None):
+        return self._find(by, value, None, single=True)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self._find(by, value, None)
+
+    def _find(self, by, value, scope, single=False):
+        root = self._tree
+        if by == By.ID:
+            nodes = root.xpath('//*[@id=$value]', value=value)
+        elif by == By.NAME:
+            nodes = root.xpath('//*[@name=$value]', value=value)
+        elif by == By.XPATH:
+            # Like Selenium, "//..." searches the whole document even from an element
+            context = scope if scope is not None and value.startswith('.') else root
+            nodes = [node for node in context.xpath(value) if isinstance(node, lxml.html.HtmlElement)]
+        elif by == By.CSS_SELECTOR:
+            nodes = CSSSelector(value)(scope if scope is not None else root)
+        elif by == By.TAG_NAME:
+            nodes = list((scope if scope is not None else root).iter(value))
+        elif by == By.CLASS_NAME:
+            nodes = CSSSelector(f".{value}")(scope if scope is not None else root)
+        elif by == By.LINK_TEXT:
+            nodes = [a for a in root.iter('a') if a.text_content().strip() == value]
+        elif by == By.PARTIAL_LINK_TEXT:
+            nodes = [a for a in root.iter('a') if value in a.text_content()]
+        else:
+            raise ValueError(f"Unsupported locator strategy {by!r}")
+
+        if scope is not None and by in (By.ID, By.NAME):
+            nodes = [node for node in nodes if _is_descendant(node, scope)]
+        elements = [FakeElement(self, node, self._generation) for node in nodes]
+        if single:
+            if not elements:
+                raise NoSuchElementException(f"Unable to locate element: {by}={value}")
+            return elements[0]
+        return elements
+
+    # Forms -------------------------------------------------------------
+    def _submit(self, node, submitter=None):
+        form = next((ancestor for ancestor in node.iterancestors('form')), None)
+        if form is None and node.tag == 'form':
+            form = node
+        if form is None:
+            return
+
+        data = []
+        for field in form.iter('input', 'select', 'textarea', 'button'):
+            name = field.get('name')
+            if not name:
+                continue
+            field_type = (field.get('type') or '').lower()
+            if field.tag == 'button' or field_type in ('submit', 'image', 'reset', 'button'):
+                if field is submitter:
+                    data.append((name, field.get('value', '')))
+                continue
+            if field_type in ('checkbox', 'radio'):
+                if self._checked.get(field, field.get('checked') is not None):
+                    data.append((name, field.get('value', 'on')))
+                continue
+            if field.tag == 'select':
+                selected = field.xpath('.//option[@selected]') or field.xpath('.//option')[:1]
+                value = self._values.get(field, selected[0].get('value', selected[0].text_content()) if selected else '')
+            else:
+                value = self._values.get(field, field.get('value', '') if field.tag != 'textarea' else field.text or '')
+            data.append((name, value))
+
+        action = urljoin(self.current_url, form.get('action') or self.current_url)
+        if (form.get('method') or 'get').lower() == 'post':
+            self.get(action, method='POST', data=data)
+        else:
+            parsed = urlparse(action)
+            self.get(parsed._replace(query=urlencode(data)).geturl())
+
+    # Scripts, cookies and driver plumbing ------------------------------
+    def execute_script(self, script, *args):
+        for pattern, handler in self._scripts:
+            if pattern.search(script):
+                return handler(self, *args)
+        return None
+
+    def execute_cdp_cmd(self, cmd, params):
+        return {}
+
+    def get_cookies(self):
+        host = urlparse(self.current_url).hostname or ''
+        return [{'name': name, 'value': value, 'domain': host, 'path': '/', 'secure': False}
+                for name, value in self._cookies.items()]
+
+    def get_cookie(self, name):
+        return next((cookie for cookie in self.get_cookies() if cookie['name'] == name), None)
+
+    def add_cookie(self, cookie):
+        self._cookies[cookie['name']] = cookie['value']
+
+    def delete_all_cookies(self):
+        self._cookies.clear()
+
+    def get_log(self, log_type):
+        return []
+
+    @property
+    def window_handles(self):
+        return ['fake-window']
+
+    @property
+    def current_window_handle(self):
+        return 'fake-window'
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def set_page_load_timeout(self, seconds):
+        pass
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def close(self):
+        pass
+
+    def quit(self):
+        pass
+
+
+def _is_descendant(node, ancestor):
+    return any(parent is ancestor for parent in node.iterancestors())
+
@@ -0,0 +1,103 @@
+"""Millisecond-scale scraper benchmarks on the in-process fake driver.
+
+Runs each supplier's scraper function against its benchmark stub through
+FakeDriver (no Chrome, no sockets) and times the HTML parsers on their own,
+so extraction changes can be measured on CI.
+
+    python benchmarks/micro_benchmark.py --iterations 500
+"""
+import argparse
+import logging
+import math
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import http_fastpath
+from driver_pool import mark_session_fresh
+from fake_driver import FakeDriver, StubTransport
+from stub_server import IGCStub, MyGrantStub, PGWStub, PilkingtonStub
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def logged_in_driver(stub, supplier):
+    """Fake driver whose stub session cookie is set and whose pooled login is trusted"""
+    driver = FakeDriver(StubTransport(stub))
+    driver.add_cookie({'name': stub.cookie, 'value': '1'})
+    mark_session_fresh(driver, supplier)
+    return driver
+
+
+def bench(label, func, iterations):
+    result = func()  # Warm-up, and a sanity check of what the case returns
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    rows = len(result) if isinstance(result, (list, tuple)) else result
+    print(f"{label:<34}{percentile(timings, 50) * 1000:9.3f}{percentile(timings, 95) * 1000:9.3f}"
+          f"{sum(timings) * 1000:11.1f}   {rows}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--part', default='2000', help="part number to search")
+    parser.add_argument('--iterations', type=int, default=200, help="timed runs per case")
+    args = parser.parse_args()
+
+    # Everything goes through the fake driver; nothing may reach the network
+    http_fastpath.ENABLED = False
+    logging.disable(logging.WARNING)
+
+    from Scrapers import igc_scraper, mygrant_scraper, pilkington_scraper, pwg_scraper
+    from Scrapers.igc_scraper import IGCScraper
+    from Scrapers.mygrant_scraper import MyGrantScraper
+    from Scrapers.pilkington_scraper import PilkingtonScraper
+    from Scrapers.pwg_scraper import PWGScraper
+
+    logger = logging.getLogger('micro_benchmark')
+    part_no = args.part
+    igc, pgw, pilkington, mygrant = IGCStub(), PGWStub(), PilkingtonStub(), MyGrantStub()
+
+    print(f"{'case':<34}{'p50 ms':>9}{'p95 ms':>9}{'total ms':>11}   rows")
+
+    # Full scraper functions over the fake driver
+    drivers = {
+        'IGC': logged_in_driver(igc, 'IGC'),
+        'PGW': logged_in_driver(pgw, 'PGW'),
+        'Pilkington': logged_in_driver(pilkington, 'Pilkington'),
+        'MyGrant': logged_in_driver(mygrant, 'MyGrant'),
+    }
+    bench("IGCScraper", lambda: IGCScraper(part_no, drivers['IGC'], logger), args.iterations)
+    bench("PWGScraper", lambda: PWGScraper(part_no, drivers['PGW'], logger), args.iterations)
+    bench("PilkingtonScraper", lambda: PilkingtonScraper(part_no, drivers['Pilkington'], logger), args.iterations)
+    bench("MyGrantScraper", lambda: MyGrantScraper(part_no, drivers['MyGrant'], logger), args.iterations)
+
+    # Parsers alone, on the pages the scrapers above received
+    igc_results = igc.render('results.html', part_no=part_no)
+    igc_detail = igc.render('detail.html', part=f"FW0{part_no}GTY", price='201.50')
+    pgw_results = pgw.render('results.html', part_no=part_no)
+    pilkington_results = pilkington.render('results.html', part_no=part_no)
+    mygrant_results = mygrant.render('results.html', part_no=part_no)
+    bench("igc parse_search_results", lambda: igc_scraper.parse_search_results(igc_results, part_no), args.iterations)
+    bench("igc parse_part_detail", lambda: igc_scraper.parse_part_detail(igc_detail, f"FW0{part_no}GTY"),
+          args.iterations)
+    bench("pgw parse_search_results", lambda: pwg_scraper.parse_search_results(pgw_results, part_no)[1],
+          args.iterations)
+    bench("pilkington parse_search_results", lambda: pilkington_scraper.parse_search_results(pilkington_results)[1],
+          args.iterations)
+    bench("mygrant parse_search_results", lambda: mygrant_scraper.parse_search_results(mygrant_results),
+          args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Offline end-to-end benchmark of /products/<partNumber> against the local supplier stubs.
+
+Starts the stub servers, points every scraper at them, then streams
+``/products/<partNumber>?nocache=1`` through the Flask app (login disabled)
+and reports, per search, the time to the first and the last NDJSON line, and
+per supplier the time its final line arrived. Needs a local Chrome for the
+browser legs but no network access or supplier credentials; set
+CHROMEDRIVER_PATH (and CHROME_VERSION) so undetected_chromedriver does not
+try to download a driver.
+
+    python benchmarks/run_benchmark.py --parts 2000 3000 --iterations 5 --latency 0.1
+
+With ``--replay DIR`` the suppliers are served from bundles recorded by
+``python partScraper.py <part> --capture DIR`` instead of the hand-built
+fixtures.
+"""
+import argparse
+import json
+import os
+import math
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import StubServers, parse_overrides
+
+# Dummy credentials so real ones from .env are never sent anywhere
+CREDENTIAL_VARS = ('IGC_USER', 'IGC_PASS', 'IGC_CN', 'PGW_USER', 'PGW_PASS',
+                   'PIL_USER', 'PIL_PASS', 'MYGRANT_USER', 'MYGRANT_PASS')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; None for an empty list"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def fmt(seconds):
+    return "-" if seconds is None else f"{seconds:7.2f}s"
+
+
+def run_search(client, part_no):
+    """Stream one search; returns (first_line, last_line, {supplier: final line time}, rows)"""
+    start = time.time()
+    first = last = None
+    suppliers = {}
+    rows = {}
+    response = client.get(f'/products/{part_no}?nocache=1', buffered=False)
+    buffer = ''
+    for chunk in response.iter_encoded():
+        buffer += chunk.decode('utf-8')
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            if not line.strip():
+                continue
+            now = time.time() - start
+            first = now if first is None else first
+            last = now
+            payload = json.loads(line)
+            name = next(iter(payload))
+            if payload.get('status') == 'partial' or name == 'error':
+                continue
+            suppliers[name] = now
+            rows[name] = len(payload[name] or [])
+    response.close()
+    return first, last, suppliers, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parts', nargs='+', default=['2000'], help="part numbers to search")
+    parser.add_argument('--iterations', type=int, default=3, help="searches per part number")
+    parser.add_argument('--warmup', type=int, default=1, help="untimed searches before measuring")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every stub response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random latency of up to this many seconds")
+    parser.add_argument('--latency-for', action='append', metavar='SUPPLIER=SECONDS',
+                        help="per-supplier latency, e.g. PGW=0.5 (repeatable)")
+    parser.add_argument('--replay', metavar='DIR', help="serve captured replay bundles instead of the fixtures")
+    parser.add_argument('--metrics', action='store_true', help="print the /metrics exposition afterwards")
+    args = parser.parse_args()
+
+    if args.replay:
+        from capture import ReplayServers
+        servers = ReplayServers(args.replay, latency=args.latency).start()
+    else:
+        servers = StubServers(args.latency, args.jitter, parse_overrides(args.latency_for)).start()
+    os.environ.update(servers.environ())
+    for var in CREDENTIAL_VARS:
+        os.environ[var] = 'benchmark'
+
+    # Imported only now: the scrapers read their base-URL overrides at import time
+    import app as flask_app
+    import metrics
+    import partScraper
+    from result_cache import ResultCache
+
+    # Keep benchmark rows out of the real result cache
+    cache_dir = tempfile.mkdtemp(prefix='scrape-bench-')
+    partScraper.result_cache = ResultCache(os.path.join(cache_dir, 'scrape_cache.db'),
+                                           ttls=partScraper.CACHE_TTLS, default_ttl=partScraper.CACHE_DEFAULT_TTL,
+                                           max_stale=partScraper.CACHE_MAX_STALE)
+    flask_app.app.config['LOGIN_DISABLED'] = True
+    client = flask_app.app.test_client()
+
+    try:
+        for _ in range(args.warmup):
+            for part_no in args.parts:
+                run_search(client, part_no)
+
+        first_lines, last_lines = [], []
+        per_supplier = {}
+        for iteration in range(args.iterations):
+            for part_no in args.parts:
+                first, last, suppliers, rows = run_search(client, part_no)
+                first_lines.append(first)
+                last_lines.append(last)
+                for name, seconds in suppliers.items():
+                    per_supplier.setdefault(name, []).append(seconds)
+                summary = ", ".join(f"{name} {seconds:.2f}s ({rows[name]} rows)" for name, seconds in suppliers.items())
+                print(f"[{iteration + 1}/{args.iterations}] {part_no}: first {fmt(first)}, last {fmt(last)} - {summary}")
+
+        print()
+        print(f"{'':<14}{'p50':>9}{'p95':>9}{'max':>9}")
+        for label, values in [("first line", first_lines), ("last line", last_lines)] + sorted(per_supplier.items()):
+            values = [value for value in values if value is not None]
+            print(f"{label:<14}{fmt(percentile(values, 50)):>9}{fmt(percentile(values, 95)):>9}"
+                  f"{fmt(max(values) if values else None):>9}")
+        if args.replay:
+            print(f"\nUnrecorded requests: {servers.misses()}")
+        else:
+            print(f"\nStub requests: {servers.request_counts()}")
+        if args.metrics:
+            print()
+            print(metrics.render())
+    finally:
+        partScraper.driver_pool.close()
+        servers.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Local stand-ins for the four supplier sites, serving fixture HTML with injected latency.
+
+Each supplier gets its own HTTP server on 127.0.0.1 so the scrapers can be
+pointed at it through their ``*_BASE_URL`` environment overrides. The stubs
+implement just enough of each site for the scrapers to run unchanged: login
+forms that set a session cookie, protected search pages that bounce to the
+login page without it, result pages, IGC detail pages and PGW availability
+checks.
+
+Run standalone to poke at the stubs in a browser:
+
+    python benchmarks/stub_server.py --latency 0.2
+"""
+import argparse
+import hashlib
+import os
+import random
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+class StubSupplier:
+    """Routes for one supplier site; subclasses map (method, path) to handlers"""
+
+    name = None
+    env_var = None  # Base-URL override read by the supplier's scraper
+    fixtures = None  # Sub-directory of FIXTURES_DIR
+    cookie = None  # Session cookie set by the stub login
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def routes(self):
+        raise NotImplementedError
+
+    def delay(self):
+        """Sleep for the configured latency plus up to ``jitter`` seconds"""
+        pause = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if pause > 0:
+            time.sleep(pause)
+
+    def render(self, fixture, **values):
+        if fixture not in self._templates:
+            with open(os.path.join(FIXTURES_DIR, self.fixtures, fixture), encoding='utf-8') as f:
+                self._templates[fixture] = Template(f.read())
+        return self._templates[fixture].safe_substitute(values)
+
+    def handle(self, request):
+        with self._lock:
+            self.requests += 1
+        self.delay()
+        handler = self.routes().get((request.command, request.path_only), self.fallback)
+        return handler(request)
+
+    def fallback(self, request):
+        """Requests no route matched"""
+        return request.send_page("Not found", status=404)
+
+
+class IGCStub(StubSupplier):
+    name = 'IGC'
+    env_var = 'IGC_BASE_URL'
+    fixtures = 'igc'
+    cookie = 'igc_session'
+
+    def routes(self):
+        return {
+            ('GET', '/'): lambda r: r.send_page(self.render('home.html')),
+            ('POST', '/login'): lambda r: r.redirect('/product/search/', set_cookie=self.cookie),
+            ('GET', '/product/search/'): self.search,
+            ('GET', '/product/search/results/'): self.results,
+        }
+
+    def search(self, request):
+        if not request.has_cookie(self.cookie):
+            return request.redirect('/')
+        return request.send_page(self.render('search.html'))
+
+    def results(self, request):
+        if not request.has_cookie(self.cookie):
+            return request.redirect('/')
+        return request.send_page(self.render('results.html', part_no=request.param('search')))
+
+    def fallback(self, request):
+        # Detail pages live under /glass/<part>/ and /product/detail/<part>/
+        for prefix in ('/glass/', '/product/detail/'):
+            if request.command == 'GET' and request.path_only.startswith(prefix):
+                if not request.has_cookie(self.cookie):
+                    return request.redirect('/')
+                part = request.path_only[len(prefix):].strip('/')
+                return request.send_page(self.render('detail.html', part=part, price=_price(part)))
+        return super().fallback(request)
+
+
+class PGWStub(StubSupplier):
+    name = 'PGW'
+    env_var = 'PGW_BASE_URL'
+    fixtures = 'pgw'
+    cookie = 'pgw_session'
+
+    def routes(self):
+        return {
+            ('GET', '/'): self.home,
+            ('POST', '/login'): lambda r: r.redirect('/agreement.asp', set_cookie=self.cookie),
+            ('GET', '/agreement.asp'): lambda r: r.send_page(self.render('agreement.html')),
+            ('POST', '/agree'): lambda r: r.redirect('/PartSearch/search.asp'),
+            ('GET', '/PartSearch/search.asp'): self.protected('search.html'),
+            ('GET', '/PartSearch/results.asp'): self.protected('results.html'),
+            ('GET', '/PartSearch/check.asp'): self.check,
+        }
+
+    def home(self, request):
+        if request.has_cookie(self.cookie):
+            return request.redirect('/PartSearch/search.asp')
+        return request.send_page(self.render('login.html'))
+
+    def protected(self, fixture):
+        def page(request):
+            if not request.has_cookie(self.cookie):
+                return request.redirect('/')
+            return request.send_page(self.render(fixture, part_no=request.param('PartNo')))
+        return page
+
+    def check(self, request):
+        part = request.param('part')
+        stock = int(hashlib.md5(part.encode()).hexdigest(), 16) % 5
+        return request.send_page(f"In Stock ({stock})" if stock else "Out of Stock")
+
+
+class PilkingtonStub(StubSupplier):
+    name = 'Pilkington'
+    env_var = 'PIL_BASE_URL'
+    fixtures = 'pilkington'
+    cookie = 'pil_session'
+
+    def routes(self):
+        return {
+            ('GET', '/'): lambda r: r.send_page(self.render('home.html')),
+            ('GET', '/login'): lambda r: r.redirect('/ecomm/', set_cookie=self.cookie),
+            ('GET', '/ecomm/'): self.shop,
+            ('GET', '/ecomm/search/basic/'): self.search,
+        }
+
+    def shop(self, request):
+        if not request.has_cookie(self.cookie):
+            return request.redirect('/')
+        return request.send_page(self.render('shop.html'))
+
+    def search(self, request):
+        if not request.has_cookie(self.cookie):
+            return request.redirect('/')
+        if not request.param('query'):
+            return request.send_page(self.render('shop.html'))
+        return request.send_page(self.render('results.html', part_no=request.param('query')))
+
+
+class MyGrantStub(StubSupplier):
+    name = 'MyGrant'
+    env_var = 'MYGRANT_BASE_URL'
+    fixtures = 'mygrant'
+    cookie = 'mygrant_session'
+
+    def routes(self):
+        return {
+            ('GET', '/'): lambda r: r.send_page(self.render('home.html')),
+            ('GET', '/pages/login.aspx'): lambda r: r.send_page(self.render('login.html')),
+            ('POST', '/pages/login.aspx'): lambda r: r.redirect('/pages/search.aspx', set_cookie=self.cookie),
+            ('GET', '/pages/search.aspx'): self.search,
+        }
+
+    def search(self, request):
+        if not request.has_cookie(self.cookie):
+            return request.redirect('/pages/login.aspx')
+        if not request.param('q'):
+            return request.send_page(self.render('search.html'))
+        return request.send_page(self.render('results.html', part_no=request.param('q')))
+
+
+STUBS = (IGCStub, PGWStub, PilkingtonStub, MyGrantStub)
+
+
+def _price(part):
+    """Stable pseudo-random price so repeated runs serve identical pages"""
+    cents = int(hashlib.md5(part.encode()).hexdigest(), 16) % 40000 + 10000
+    return f"{cents / 100:.2f}"
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches to the StubSupplier attached to the server"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)  # Credentials are accepted without looking at them
+        self._dispatch()
+
+    def _dispatch(self):
+        parsed = urlparse(self.path)
+        self.path_only = parsed.path
+        self.query = parse_qs(parsed.query)
+        self.server.stub.handle(self)
+
+    def param(self, name):
+        return self.query.get(name, [''])[0]
+
+    def has_cookie(self, name):
+        cookies = SimpleCookie(self.headers.get('Cookie', ''))
+        return name in cookies
+
+    def send_page(self, body, status=200):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def redirect(self, location, set_cookie=None):
+        self.send_response(303)
+        self.send_header('Location', location)
+        if set_cookie:
+            self.send_header('Set-Cookie', f'{set_cookie}=1; Path=/')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+class StubServers:
+    """All supplier stubs, each on its own 127.0.0.1 port"""
+
+    def __init__(self, latency=0.0, jitter=0.0, overrides=None, port=0):
+        overrides = overrides or {}
+        self.stubs = []
+        self._servers = []
+        for index, stub_class in enumerate(STUBS):
+            stub = stub_class(latency=overrides.get(stub_class.name, latency), jitter=jitter)
+            server = ThreadingHTTPServer(('127.0.0.1', port + index if port else 0), StubRequestHandler)
+            server.daemon_threads = True
+            server.stub = stub
+            self.stubs.append(stub)
+            self._servers.append(server)
+
+    def start(self):
+        for server in self._servers:
+            threading.Thread(target=server.serve_forever, name=f"stub-{server.stub.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def environ(self):
+        """Environment overrides that point every scraper at its stub"""
+        return {server.stub.env_var: f"http://127.0.0.1:{server.server_address[1]}" for server in self._servers}
+
+    def request_counts(self):
+        return {stub.name: stub.requests for stub in self.stubs}
+
+
+def parse_overrides(values):
+    """["PGW=0.5", ...] -> {"PGW": 0.5}"""
+    overrides = {}
+    for value in values or []:
+        name, _, seconds = value.partition('=')
+        overrides[name] = float(seconds)
+    return overrides
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the supplier stand-ins until interrupted")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random latency of up to this many seconds")
+    parser.add_argument('--latency-for', action='append', metavar='SUPPLIER=SECONDS',
+                        help="per-supplier latency, e.g. PGW=0.5 (repeatable)")
+    parser.add_argument('--port', type=int, default=8101, help="first port; suppliers use consecutive ports")
+    args = parser.parse_args()
+
+    servers = StubServers(args.latency, args.jitter, parse_overrides(args.latency_for), args.port).start()
+    for name, url in servers.environ().items():
+        print(f"export {name}={url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        servers.stop()
@@ -0,0 +1,318 @@
+"""Browser broker: one process owns the Chrome fleet and leases sessions to every worker.
+
+Without it each gunicorn worker (or scrape worker) builds its own driver
+pool and its own Chromes. With ``BROWSER_BROKER`` set to the broker's socket,
+``partScraper.driver_pool`` is a BrokerClient instead: a lease asks the broker
+for a driver from its DriverPool and gets back the chromedriver URL and
+session id, and the worker attaches to that running session over WebDriver.
+
+Leases expire after ``lease_timeout`` seconds and are then reclaimed by force
+(the browser is quit and replaced), as are all leases of a client whose
+connection drops.
+
+Connections are authenticated with ``BROWSER_BROKER_KEY`` if it is set;
+otherwise the broker generates a random key at startup and writes it to
+``<socket>.key`` (mode 0600), where clients running as the same user read it.
+
+    BROWSER_BROKER=/app/instance/browser_broker.sock python browser_broker.py
+"""
+import itertools
+import logging
+import os
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from driver_pool import PoolExhausted, PoolOverloaded, hold_until_done, restore_session, session_state
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADDRESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'browser_broker.sock')
+LEASE_TIMEOUT = 6 * 60  # Seconds before a lease is reclaimed by force (longer than MAX_SCRAPER_TIME)
+REAP_INTERVAL = 5  # Seconds between expired-lease sweeps
+CONNECT_TIMEOUT = 30  # Seconds a client keeps retrying while the broker is starting up
+CONNECT_RETRY_INTERVAL = 0.5  # Seconds between connection attempts
+
+
+def _key_path(address):
+    return f"{address}.key"
+
+
+def create_authkey(address):
+    """The broker's key: BROWSER_BROKER_KEY, or a fresh random one written next to the socket"""
+    key = os.getenv('BROWSER_BROKER_KEY')
+    if key:
+        return key.encode()
+    key = secrets.token_hex(32).encode()
+    path = _key_path(address)
+    if os.path.exists(path):
+        os.unlink(path)  # O_CREAT keeps the mode of an existing file
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def read_authkey(address):
+    """The key a client connects with: BROWSER_BROKER_KEY, or the one the broker wrote"""
+    key = os.getenv('BROWSER_BROKER_KEY')
+    if key:
+        return key.encode()
+    try:
+        with open(_key_path(address), 'rb') as f:
+            return f.read()
+    except OSError as e:
+        raise PoolExhausted(f"Browser broker key not readable: {e}")
+
+
+class Lease:
+    def __init__(self, lease_id, driver, client_id, timeout):
+        self.id = lease_id
+        self.driver = driver
+        self.client_id = client_id
+        self.expires_at = time.time() + timeout
+
+
+class BrowserBroker:
+    """Serves leases from ``pool`` to clients connecting on ``address``"""
+
+    def __init__(self, pool, address=DEFAULT_ADDRESS, lease_timeout=LEASE_TIMEOUT):
+        self.pool = pool
+        self.address = address
+        self.lease_timeout = lease_timeout
+        self._leases = {}  # lease id -> Lease
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.stats = {'leases': 0, 'reclaimed_expired': 0, 'reclaimed_disconnect': 0}
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # Left behind by a previous broker
+        os.makedirs(os.path.dirname(os.path.abspath(self.address)), exist_ok=True)
+        listener = Listener(self.address, family='AF_UNIX', authkey=create_authkey(self.address))
+        self.pool.start()
+        threading.Thread(target=self._reap_loop, name="broker-reaper", daemon=True).start()
+        logger.info(f"Browser broker listening on {self.address}")
+        for client_id in itertools.count(1):
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning(f"Rejected broker connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn, client_id), name=f"broker-client-{client_id}",
+                             daemon=True).start()
+
+    def _serve(self, conn, client_id):
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = self._handle(client_id, *request)
+                except PoolOverloaded as e:
+                    reply = ('overloaded', str(e))
+                except PoolExhausted as e:
+                    reply = ('exhausted', str(e))
+                except Exception as e:
+                    logger.error(f"Broker request {request[0]} failed: {e}")
+                    reply = ('error', str(e))
+                conn.send(reply)
+        finally:
+            conn.close()
+            self._reclaim(lambda lease: lease.client_id == client_id, 'reclaimed_disconnect')
+
+    def _handle(self, client_id, command, *args):
+        if command == 'acquire':
+            supplier, timeout = args
+            driver = self.pool.acquire(supplier, timeout)
+            lease = Lease(next(self._ids), driver, client_id, self.lease_timeout)
+            with self._lock:
+                self._leases[lease.id] = lease
+                self.stats['leases'] += 1
+            return ('ok', lease.id, driver.service.service_url, driver.session_id, session_state(driver),
+                    self.pool.session_ids())
+        if command in ('release', 'discard'):
+            lease_id, session = args
+            with self._lock:
+                lease = self._leases.pop(lease_id, None)
+            if lease is None:
+                return ('ok', False)  # Already reclaimed
+            restore_session(lease.driver, session)
+            if command == 'release':
+                return ('ok', self.pool.release(lease.driver))
+            self.pool.discard(lease.driver)
+            return ('ok', False)
+        if command == 'snapshot':
+            with self._lock:
+                leases = len(self._leases)
+            return ('ok', {**self.pool.snapshot(), 'broker_leases': leases, **self.stats})
+        raise ValueError(f"Unknown broker command {command!r}")
+
+    def _reclaim(self, predicate, reason):
+        with self._lock:
+            reclaimed = [lease for lease in self._leases.values() if predicate(lease)]
+            for lease in reclaimed:
+                del self._leases[lease.id]
+                self.stats[reason] += 1
+        for lease in reclaimed:
+            logger.warning(f"Reclaiming lease {lease.id} ({reason.replace('reclaimed_', '')})")
+            self.pool.discard(lease.driver)  # The client may still be driving it, so never hand it out again
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            now = time.time()
+            self._reclaim(lambda lease: lease.expires_at < now, 'reclaimed_expired')
+
+
+def _attach(executor_url, session_id):
+    """WebDriver bound to a session already running in the broker's chromedriver"""
+    from selenium.webdriver import ChromeOptions
+    from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+    class LeasedDriver(WebDriver):
+        def start_session(self, capabilities):
+            self.session_id = session_id  # Attach instead of creating a session
+            self.caps = {}
+
+        def execute_cdp_cmd(self, cmd, cmd_args):
+            return self.execute("executeCdpCommand", {"cmd": cmd, "params": cmd_args})["value"]
+
+        def quit(self):
+            pass  # The broker owns the browser
+
+    executor = ChromiumRemoteConnection(executor_url, vendor_prefix='goog', browser_name='chrome', ignore_proxy=True)
+    return LeasedDriver(command_executor=executor, options=ChromeOptions())
+
+
+class BrokerClient:
+    """DriverPool stand-in that leases drivers from the browser broker.
+
+    Each thread keeps its own connection, retrying for ``connect_timeout``
+    seconds while the broker is not listening yet. Attached drivers are reused per
+    session so the supplier session and block-list bookkeeping keyed by the
+    driver object keeps working across leases; each lease reply lists the
+    broker's live sessions, and attachments to any others are dropped.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, acquire_timeout=60, connect_timeout=CONNECT_TIMEOUT):
+        self.address = address
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._drivers = {}  # session id -> attached driver
+        self._leases = {}  # id(driver) -> lease id
+        self.stats = {'quarantined': 0, 'force_killed': 0}
+        self._quarantined = 0
+
+    def start(self):
+        pass  # The broker runs the pool
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def acquire(self, supplier=None, timeout=None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        reply = self._call('acquire', supplier, timeout)
+        _, lease_id, executor_url, session_id, session, live_sessions = reply
+        with self._lock:
+            # Forget attachments to browsers the broker has since recycled or reclaimed
+            self._drivers = {sid: d for sid, d in self._drivers.items() if sid in live_sessions}
+            driver = self._drivers.get(session_id)
+        if driver is None:
+            driver = _attach(executor_url, session_id)
+            with self._lock:
+                self._drivers[session_id] = driver
+        restore_session(driver, session)
+        with self._lock:
+            self._leases[id(driver)] = lease_id
+        return driver
+
+    def release(self, driver):
+        return self._give_back('release', driver)
+
+    def discard(self, driver):
+        self._give_back('discard', driver)
+
+    def quarantine(self, driver, busy, grace):
+        """Keep the lease while ``busy`` runs; release afterwards, or discard after ``grace`` seconds"""
+        with self._lock:
+            self._quarantined += 1
+            self.stats['quarantined'] += 1
+
+        def end(forced):
+            with self._lock:
+                self._quarantined -= 1
+                if forced:
+                    self.stats['force_killed'] += 1
+            if forced:
+                self.discard(driver)
+                self.close()  # The timer thread's own connection; it holds no leases
+            else:
+                self.release(driver)
+
+        hold_until_done(busy, grace, lambda: end(False), lambda: end(True))
+
+    def snapshot(self):
+        with self._lock:
+            local = {'in_quarantine': self._quarantined, **self.stats}
+        return {**self._call('snapshot')[1], **local}
+
+    def _give_back(self, command, driver):
+        with self._lock:
+            lease_id = self._leases.pop(id(driver), None)
+        if lease_id is None:
+            logger.warning("Returned a driver that was not leased from the broker")
+            return False
+        kept = self._call(command, lease_id, session_state(driver))[1]
+        if not kept:
+            # The broker quit that browser; forget the attachment
+            with self._lock:
+                self._drivers = {sid: d for sid, d in self._drivers.items() if d is not driver}
+        return kept
+
+    def _call(self, *request):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            conn.send(request)
+            reply = conn.recv()
+        except (EOFError, OSError):
+            self._local.conn = None
+            raise PoolExhausted("Browser broker connection lost")
+        if reply[0] == 'overloaded':
+            raise PoolOverloaded(reply[1])
+        if reply[0] == 'exhausted':
+            raise PoolExhausted(reply[1])
+        if reply[0] == 'error':
+            raise RuntimeError(f"Browser broker: {reply[1]}")
+        return reply
+
+    def _connect(self):
+        # The broker writes its key before it binds the socket, but a stale key can outlive a restart
+        deadline = time.time() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, family='AF_UNIX', authkey=read_authkey(self.address))
+            except (OSError, PoolExhausted, AuthenticationError) as e:
+                if time.time() >= deadline:
+                    raise PoolExhausted(f"Browser broker not reachable: {e}")
+                time.sleep(CONNECT_RETRY_INTERVAL)
+
+
+if __name__ == "__main__":
+    # The broker itself owns a local pool, so partScraper must not build a client
+    address = os.environ.pop('BROWSER_BROKER', None) or DEFAULT_ADDRESS
+    import partScraper
+
+    BrowserBroker(partScraper.driver_pool, address).serve_forever()
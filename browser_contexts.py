@@ -0,0 +1,191 @@
+"""Isolated browser contexts in a shared Chrome instead of one Chrome per driver.
+
+With ``BROWSER_CONTEXTS=N`` the driver pool's factory is ``ContextFleet.new_driver``:
+each pooled driver is a tab in its own CDP browser context (separate cookies,
+storage and cache, like an incognito window) inside a host Chrome shared by
+up to N drivers, so four concurrent supplier legs cost one browser process
+instead of four.
+
+Each driver is a separate WebDriver session that the host's chromedriver
+attaches to the running browser (``debuggerAddress``) and pins to its own
+tab, so legs still run concurrently. Quitting a driver closes its tab and
+disposes of its context; the host Chrome is quit once its last driver is
+gone. Hosts whose process tree has grown past ``max_rss`` take no new
+drivers and are quit when their last driver leaves.
+"""
+import logging
+import os
+import threading
+
+import psutil
+
+from driver_pool import process_tree_rss
+
+logger = logging.getLogger(__name__)
+
+CONTEXTS_PER_CHROME = int(os.getenv('BROWSER_CONTEXTS', '0'))  # Drivers sharing one Chrome; 0 = one Chrome each
+
+# Mirrors what undetected_chromedriver patches on the host's first tab in headless mode
+HIDE_WEBDRIVER = """
+Object.defineProperty(window, "navigator", {
+  value: new Proxy(navigator, {
+    has: (target, key) => (key === "webdriver" ? false : key in target),
+    get: (target, key) =>
+      key === "webdriver" ? false : typeof target[key] === "function" ? target[key].bind(target) : target[key],
+  }),
+});
+"""
+
+
+def enabled():
+    return CONTEXTS_PER_CHROME > 0
+
+
+class Host:
+    """A Chrome started by the host factory and the context drivers it serves"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.drivers = 0  # Live context drivers
+        self.retired = False  # Takes no new drivers; quit when the last one leaves
+        self.user_agent = None
+
+    def alive(self):
+        pid = getattr(self.driver, 'browser_pid', None)
+        return pid is None or psutil.pid_exists(pid)
+
+
+def _context_driver_class():
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+    class ContextDriver(WebDriver):
+        """A session pinned to one tab in its own browser context of a host Chrome"""
+
+        def execute_cdp_cmd(self, cmd, cmd_args):
+            return self.execute("executeCdpCommand", {"cmd": cmd, "params": cmd_args})["value"]
+
+        def quit(self):
+            try:
+                self.execute_cdp_cmd("Target.closeTarget", {"targetId": self.target_id})
+                self.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": self.browser_context_id})
+            except Exception as e:
+                logger.debug(f"Could not dispose of browser context: {e}")
+            try:
+                super().quit()  # Ends the attached session; the host browser keeps running
+            finally:
+                self.fleet._detach(self.host)
+
+    return ContextDriver
+
+
+class ContextFleet:
+    """Hands out context drivers, starting host Chromes with ``host_factory`` as needed"""
+
+    def __init__(self, host_factory, contexts_per_host, max_rss=None, page_load_strategy='eager',
+                 performance_log=False):
+        self.host_factory = host_factory
+        self.contexts_per_host = max(contexts_per_host, 1)
+        self.max_rss = max_rss  # Host process-tree RSS past which the host is retired
+        self.page_load_strategy = page_load_strategy
+        self.performance_log = performance_log
+        self._hosts = []
+        self._lock = threading.Lock()
+        self._driver_class = None
+        self.stats = {'hosts_started': 0, 'hosts_retired': 0}
+
+    def new_driver(self):
+        """A driver in a fresh browser context, on a host Chrome with a free slot"""
+        return self._open_context(self._reserve())
+
+    def snapshot(self):
+        with self._lock:
+            hosts = list(self._hosts)
+        return {
+            'hosts': len(hosts),
+            'contexts': sum(host.drivers for host in hosts),
+            'host_rss_bytes': sum(process_tree_rss(host.driver) for host in hosts),
+            **self.stats,
+        }
+
+    def _reserve(self):
+        with self._lock:
+            for host in self._hosts:
+                if host.retired or host.drivers >= self.contexts_per_host:
+                    continue
+                if not host.alive():
+                    self._retire(host, "its browser died")
+                elif self.max_rss is not None and process_tree_rss(host.driver) > self.max_rss:
+                    self._retire(host, f"it grew past {self.max_rss / 2**20:.0f} MB")
+                else:
+                    host.drivers += 1
+                    return host
+            # Started under the lock so concurrent misses share the new host
+            host = Host(self.host_factory())
+            host.drivers = 1
+            self._hosts.append(host)
+            self.stats['hosts_started'] += 1
+            logger.info(f"Started host Chrome #{len(self._hosts)} for browser contexts")
+            return host
+
+    def _retire(self, host, reason):
+        host.retired = True
+        self.stats['hosts_retired'] += 1
+        logger.info(f"Retiring host Chrome: {reason}")
+        if host.drivers == 0:
+            self._quit_host(host)
+
+    def _detach(self, host):
+        with self._lock:
+            host.drivers -= 1
+            if host.drivers == 0:
+                self._quit_host(host)
+
+    def _quit_host(self, host):
+        if host in self._hosts:
+            self._hosts.remove(host)
+        try:
+            host.driver.quit()
+        except Exception:
+            pass
+
+    def _open_context(self, host):
+        from selenium.webdriver import ChromeOptions
+        from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+
+        if self._driver_class is None:
+            self._driver_class = _context_driver_class()
+        options = ChromeOptions()
+        options.debugger_address = host.driver.options.debugger_address
+        options.page_load_strategy = self.page_load_strategy
+        if self.performance_log:
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+        executor = ChromiumRemoteConnection(host.driver.service.service_url, vendor_prefix='goog',
+                                            browser_name='chrome', ignore_proxy=True)
+        try:
+            driver = self._driver_class(command_executor=executor, options=options)
+        except Exception:
+            self._detach(host)
+            raise
+        driver.fleet = self
+        driver.host = host
+        driver.service = host.driver.service  # The browser broker hands out sessions by chromedriver URL
+        try:
+            context = driver.execute_cdp_cmd("Target.createBrowserContext", {"disposeOnDetach": False})
+            driver.browser_context_id = context["browserContextId"]
+            target = driver.execute_cdp_cmd(
+                "Target.createTarget", {"url": "about:blank", "browserContextId": driver.browser_context_id})
+            driver.target_id = target["targetId"]
+            driver.switch_to.window(driver.target_id)  # chromedriver window handles are target ids
+            self._disguise(host, driver)
+        except Exception:
+            driver.quit()  # Also releases the host slot
+            raise
+        return driver
+
+    def _disguise(self, host, driver):
+        """Apply the host tab's headless patches to the new tab"""
+        if host.user_agent is None:
+            host.user_agent = host.driver.execute_script("return navigator.userAgent").replace("Headless", "")
+        driver.execute_cdp_cmd("Network.setUserAgentOverride", {"userAgent": host.user_agent})
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": HIDE_WEBDRIVER})
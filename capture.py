@@ -0,0 +1,253 @@
+"""Record-and-replay of supplier traffic for offline scraper benchmarks.
+
+Capture: while real searches run, every document and XHR/fetch response a
+scraper's browser receives (read from Chrome's performance log) and every
+HTTP fast-path response is recorded against the supplier leg's ScrapeContext.
+Bodies and URLs are scrubbed of the supplier credentials, no headers or
+cookies are kept, and each leg is written to
+``<capture dir>/<supplier>/<PART>.json.gz``.
+
+Replay: ``ReplayServers`` serves those bundles back from one local HTTP
+server per supplier, answering each request with the recorded response for
+the same method, path and query, so scrapers pointed at it through their
+``*_BASE_URL`` overrides see identical inputs on every run.
+"""
+import base64
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, urlunparse
+
+import scrape_context
+
+logger = logging.getLogger(__name__)
+
+# Resource types worth keeping from the browser; images, scripts and styles are not replayed
+CAPTURED_TYPES = ('Document', 'XHR', 'Fetch')
+
+# Environment variables holding secrets that must never end up in a bundle
+SECRET_VARS = ('IGC_USER', 'IGC_PASS', 'IGC_CN', 'PGW_USER', 'PGW_PASS',
+               'PIL_USER', 'PIL_PASS', 'MYGRANT_USER', 'MYGRANT_PASS')
+REDACTED = '[REDACTED]'
+
+# Base-URL override each supplier's scraper reads
+BASE_URL_VARS = {
+    'IGC': 'IGC_BASE_URL',
+    'PGW': 'PGW_BASE_URL',
+    'Pilkington': 'PIL_BASE_URL',
+    'MyGrant': 'MYGRANT_BASE_URL',
+}
+
+_capture_dir = None
+
+
+def enable(directory):
+    """Turn capture on for this process; bundles are written below directory"""
+    global _capture_dir
+    _capture_dir = directory
+    os.makedirs(directory, exist_ok=True)
+
+
+def enabled():
+    return _capture_dir is not None
+
+
+def _secrets():
+    return [value for value in (os.getenv(var) for var in SECRET_VARS) if value and len(value) >= 3]
+
+
+def scrub(text):
+    """Replace every configured credential in text"""
+    if not text:
+        return text
+    for secret in _secrets():
+        text = text.replace(secret, REDACTED)
+    return text
+
+
+class Recorder:
+    """Responses seen by one supplier leg, in the order they arrived"""
+
+    def __init__(self, supplier, part_no):
+        self.supplier = supplier
+        self.part_no = part_no
+        self.exchanges = []
+        self._requests = {}  # CDP requestId -> method
+        self._lock = threading.Lock()
+
+    def record(self, method, url, status, content_type='', body='', location=None, source='browser'):
+        exchange = {
+            'method': method,
+            'url': scrub(url),
+            'status': status,
+            'content_type': content_type,
+            'body': scrub(body),
+            'source': source,
+        }
+        if location:
+            exchange['location'] = scrub(location)
+        with self._lock:
+            self.exchanges.append(exchange)
+
+    def record_response(self, response):
+        """Record a requests.Response from the HTTP fast path, including its redirects"""
+        for hop in list(response.history) + [response]:
+            self.record(hop.request.method, hop.url, hop.status_code,
+                        hop.headers.get('Content-Type', ''), hop.text,
+                        location=hop.headers.get('Location'), source='http')
+
+    def start(self, driver):
+        """Discard performance log entries left over from the driver's previous leg"""
+        try:
+            driver.get_log('performance')
+        except Exception as e:
+            logger.warning(f"Performance log unavailable, {self.supplier} pages will not be captured: {e}")
+
+    def consume(self, driver, events):
+        """Record the captured responses among events and fetch their bodies from the browser"""
+        for method, params in events:
+            if method == 'Network.requestWillBeSent':
+                redirect = params.get('redirectResponse')
+                if redirect is not None:
+                    self.record(self._requests.get(params['requestId'], 'GET'), redirect.get('url', ''),
+                                redirect.get('status', 302), location=params['request'].get('url'))
+                self._requests[params['requestId']] = params['request'].get('method', 'GET')
+            elif method == 'Network.responseReceived' and params.get('type') in CAPTURED_TYPES:
+                response = params['response']
+                self.record(self._requests.get(params['requestId'], 'GET'), response.get('url', ''),
+                            response.get('status', 200), response.get('mimeType', ''),
+                            self._body(driver, params['requestId']))
+
+    def _body(self, driver, request_id):
+        try:
+            result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception:
+            return ''  # Evicted or never finished; the status line is still worth keeping
+        if result.get('base64Encoded'):
+            return base64.b64decode(result['body']).decode('utf-8', errors='replace')
+        return result.get('body', '')
+
+    def save(self):
+        """Write the bundle; returns its path (None when nothing was recorded)"""
+        if not self.exchanges:
+            return None
+        from result_cache import normalize_part_number
+        directory = os.path.join(_capture_dir, self.supplier)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{normalize_part_number(self.part_no)}.json.gz")
+        bundle = {
+            'supplier': self.supplier,
+            'part_no': self.part_no,
+            'captured_at': time.time(),
+            'exchanges': self.exchanges,
+        }
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            json.dump(bundle, f)
+        logger.info(f"Captured {len(self.exchanges)} {self.supplier} responses to {path}")
+        return path
+
+
+def current_recorder():
+    context = scrape_context.current()
+    return getattr(context, 'recorder', None) if context is not None else None
+
+
+def load_bundles(directory):
+    """{supplier: [bundle, ...]} for every bundle below directory"""
+    bundles = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*', '*.json.gz'))):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            bundle = json.load(f)
+        bundles.setdefault(bundle['supplier'], []).append(bundle)
+    return bundles
+
+
+def _request_key(method, url):
+    parsed = urlparse(url)
+    return method, parsed.path or '/', parsed.query
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._replay()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self._replay()
+
+    def _replay(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        method, path, query = _request_key(self.command, self.path)
+        exchange = server.responses.get((method, path, query)) or server.responses.get((method, path, None))
+        if exchange is None:
+            server.misses += 1
+            body = f"No recorded {server.supplier} response for {self.command} {self.path}".encode('utf-8')
+            self.send_response(404)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        body = exchange.get('body', '').encode('utf-8')
+        self.send_response(exchange['status'])
+        self.send_header('Content-Type', exchange.get('content_type') or 'text/html')
+        if exchange.get('location'):
+            # Keep redirects on the replay server
+            self.send_header('Location', urlunparse(urlparse(exchange['location'])._replace(scheme='', netloc='')))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServers:
+    """One local server per captured supplier answering from its bundles"""
+
+    def __init__(self, directory, latency=0.0):
+        self._servers = []
+        for supplier, bundles in load_bundles(directory).items():
+            server = ThreadingHTTPServer(('127.0.0.1', 0), _ReplayHandler)
+            server.daemon_threads = True
+            server.supplier = supplier
+            server.latency = latency
+            server.misses = 0
+            server.responses = {}
+            for bundle in bundles:
+                for exchange in bundle['exchanges']:
+                    method, path, query = _request_key(exchange['method'], exchange['url'])
+                    # Later captures win; the path-only key serves queries that were never recorded
+                    server.responses[(method, path, query)] = exchange
+                    server.responses.setdefault((method, path, None), exchange)
+            self._servers.append(server)
+
+    def start(self):
+        for server in self._servers:
+            threading.Thread(target=server.serve_forever, name=f"replay-{server.supplier}", daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+    def environ(self):
+        """Base-URL overrides pointing each captured supplier at its replay server"""
+        return {BASE_URL_VARS[server.supplier]: f"http://127.0.0.1:{server.server_address[1]}"
+                for server in self._servers if server.supplier in BASE_URL_VARS}
+
+    def misses(self):
+        return {server.supplier: server.misses for server in self._servers}
@@ -0,0 +1,174 @@
+"""Shared chromedriver binary and Chrome profile template for fast driver start-up.
+
+undetected_chromedriver downloads and patches chromedriver on every
+``uc.Chrome()`` unless it is given an executable, and Chrome spends its first
+launch on a new user-data-dir initializing the profile. This module patches
+chromedriver once per Chrome major version into ``instance/chrome/drivers``,
+initializes a profile template once, and gives every driver its own clone of
+that template (copy-on-write where the filesystem supports it). The clones
+live in ``instance/chrome/profiles`` and are removed when the driver quits;
+clones left behind by dead processes are swept on start-up.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('CHROME_STARTUP_CACHE', '1') != '0'  # Off: uc downloads chromedriver for every driver
+CACHE_DIR = os.getenv('CHROME_CACHE_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'instance', 'chrome')
+DRIVERS_DIR = os.path.join(CACHE_DIR, 'drivers')  # chromedriver-<major version>, already patched
+TEMPLATE_DIR = os.path.join(CACHE_DIR, 'profile-template')
+PROFILES_DIR = os.path.join(CACHE_DIR, 'profiles')  # <pid>-<random> per live driver
+TEMPLATE_TIMEOUT = 60  # Seconds allowed for the one-off headless launch that initializes the template
+TEMPLATE_READY = '.ready'  # Marker written once the template is complete
+
+_lock = threading.Lock()
+_template_attempted = False
+_swept = False
+
+
+def driver_executable(version_main, executable_path=None):
+    """Path of a patched chromedriver for version_main, patching it into the cache on first use.
+
+    An explicit ``executable_path`` (CHROMEDRIVER_PATH) is used as is; uc
+    patches such a binary in place once and leaves it alone afterwards.
+    """
+    if executable_path:
+        return executable_path
+    path = os.path.join(DRIVERS_DIR, f"chromedriver-{version_main}")
+    with _lock:
+        if os.path.exists(path):
+            return path
+        from undetected_chromedriver.patcher import Patcher
+
+        start = time.time()
+        patcher = Patcher(version_main=version_main)
+        patcher.auto()  # Downloads and patches into uc's own data dir
+        os.makedirs(DRIVERS_DIR, exist_ok=True)
+        staging = f"{path}.{os.getpid()}.tmp"
+        shutil.copy2(patcher.executable_path, staging)
+        os.replace(staging, path)  # Atomic, so other workers never run a half-copied binary
+        logger.info(f"Cached patched chromedriver {version_main} in {time.time() - start:.2f}s: {path}")
+        return path
+
+
+def new_profile(chrome_args=()):
+    """Fresh user-data-dir for one driver, cloned from the profile template when there is one"""
+    _sweep_stale_profiles()
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    template = _profile_template(chrome_args)
+    profile = tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=PROFILES_DIR)
+    if template is None:
+        return profile
+    try:
+        _clone(template, profile)
+    except Exception as e:
+        logger.warning(f"Could not clone Chrome profile template, starting with an empty profile: {e}")
+        shutil.rmtree(profile, ignore_errors=True)
+        os.makedirs(profile, exist_ok=True)
+    return profile
+
+
+def remove_on_quit(driver, directory):
+    """Let uc's quit() delete the driver's profile directory (it keeps dirs passed via --user-data-dir)"""
+    driver.user_data_dir = directory
+    driver.keep_user_data_dir = False
+
+
+def _profile_template(chrome_args):
+    """Path of the initialized template, building it on first use; None if Chrome could not build it"""
+    global _template_attempted
+    if os.path.exists(os.path.join(TEMPLATE_DIR, TEMPLATE_READY)):
+        return TEMPLATE_DIR
+    with _lock:
+        if os.path.exists(os.path.join(TEMPLATE_DIR, TEMPLATE_READY)):
+            return TEMPLATE_DIR
+        if _template_attempted:
+            return None
+        _template_attempted = True
+        try:
+            _build_template(chrome_args)
+            return TEMPLATE_DIR
+        except Exception as e:
+            logger.warning(f"Could not build Chrome profile template: {e}")
+            shutil.rmtree(TEMPLATE_DIR, ignore_errors=True)
+            return None
+
+
+def _build_template(chrome_args):
+    """Launch headless Chrome once on the template dir so it does its first-run initialization"""
+    import undetected_chromedriver as uc
+
+    chrome = os.getenv('CHROME_BIN') or uc.find_chrome_executable()
+    if not chrome:
+        raise RuntimeError("Chrome executable not found")
+    start = time.time()
+    shutil.rmtree(TEMPLATE_DIR, ignore_errors=True)
+    os.makedirs(TEMPLATE_DIR)
+    subprocess.run(
+        [chrome, *chrome_args, f"--user-data-dir={TEMPLATE_DIR}", "--no-first-run", "--dump-dom", "about:blank"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=TEMPLATE_TIMEOUT, check=True)
+    # Per-instance and throwaway state must not be cloned
+    for name in os.listdir(TEMPLATE_DIR):
+        if name.startswith('Singleton') or name in ('Crashpad', 'ShaderCache', 'GrShaderCache'):
+            _remove(os.path.join(TEMPLATE_DIR, name))
+    open(os.path.join(TEMPLATE_DIR, TEMPLATE_READY), 'w').close()
+    logger.info(f"Built Chrome profile template in {time.time() - start:.2f}s")
+
+
+def _clone(source, target):
+    """Copy the template into target, using reflinks (copy-on-write) where available"""
+    if sys.platform.startswith('linux'):
+        # cp -a source/. copies the contents into the existing target directory
+        result = subprocess.run(['cp', '-a', '--reflink=auto', f"{source}/.", target],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode == 0:
+            return
+        logger.debug(f"cp --reflink failed, falling back to a plain copy: {result.stderr.strip()}")
+    shutil.copytree(source, target, symlinks=True, dirs_exist_ok=True)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _sweep_stale_profiles():
+    """Remove profiles whose owning process is gone (crashes, kill -9) - once per process"""
+    global _swept
+    with _lock:
+        if _swept:
+            return
+        _swept = True
+    if not os.path.isdir(PROFILES_DIR):
+        return
+    removed = 0
+    for name in os.listdir(PROFILES_DIR):
+        pid = name.split('-', 1)[0]
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            shutil.rmtree(os.path.join(PROFILES_DIR, name), ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} Chrome profiles left behind by exited processes")
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Breaker states
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+CIRCUIT_STATES = (CLOSED, OPEN, HALF_OPEN)
+
+
+class SupplierUnavailable(Exception):
+    """Raised by a scraper that could not log in to or navigate the supplier's site.
+
+    Counts as a failed leg for the supplier's circuit breaker, unlike an
+    empty result, which means the site answered that it has no such part.
+    """
+
+
+class CircuitBreaker:
+    """Per-supplier circuit breaker.
+
+    After ``failure_threshold`` consecutive failed legs (errors or timeouts)
+    the breaker opens and ``allow`` refuses the supplier without spending a
+    driver. Once ``reset_timeout`` seconds have passed a single caller is let
+    through as a half-open probe: success closes the breaker, failure opens it
+    for another ``reset_timeout``. A probe that never reports back (its search
+    was cancelled) is replaced after ``probe_timeout`` seconds.
+    """
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=60, probe_timeout=300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.state = CLOSED
+        self.failures = 0  # Consecutive failures while closed
+        self.opened_at = None
+        self.probe_started_at = None
+        self.stats = {'opened': 0, 'rejected': 0, 'probes': 0}
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if the supplier may be scraped now (possibly as the half-open probe)"""
+        now = time.time()
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            elif self.state == HALF_OPEN and now - self.probe_started_at >= self.probe_timeout:
+                logger.warning(f"{self.name} circuit probe never reported back, probing again")
+            else:
+                self.stats['rejected'] += 1
+                return False
+            self.probe_started_at = now
+            self.stats['probes'] += 1
+            logger.info(f"{self.name} circuit half-open, probing")
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"{self.name} circuit closed")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_inconclusive(self):
+        """The leg ended without reaching the supplier; a pending probe may be retried at once"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probe_started_at = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.time()
+                self.stats['opened'] += 1
+                logger.warning(f"{self.name} circuit opened after {self.failures} consecutive failures, "
+                               f"failing fast for {self.reset_timeout}s")
+
+
+class CircuitBreakers:
+    """Lazily created CircuitBreaker per supplier name, sharing one configuration"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, probe_timeout=300):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(
+                    name, self.failure_threshold, self.reset_timeout, self.probe_timeout)
+            return breaker
+
+    def all(self):
+        with self._lock:
+            return dict(self._breakers)
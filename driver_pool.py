@@ -0,0 +1,544 @@
+import logging
+import threading
+import time
+import weakref
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_POLL_INTERVAL = 1.0  # Seconds between memory re-checks while a lease is held back
+CLOSE_GRACE = 10  # Seconds close() waits for leased drivers to come back before quitting them
+
+# Supplier session state per driver: driver -> (supplier, validated_at)
+_sessions = weakref.WeakKeyDictionary()
+_sessions_lock = threading.Lock()
+
+
+def session_is_fresh(driver, supplier, max_age):
+    """True if the driver was authenticated against ``supplier`` less than max_age seconds ago"""
+    with _sessions_lock:
+        state = _sessions.get(driver)
+    if not state:
+        return False
+    session_supplier, validated_at = state
+    return session_supplier == supplier and time.time() - validated_at < max_age
+
+
+def mark_session_fresh(driver, supplier):
+    """Record that the driver just proved it is logged in to ``supplier``"""
+    with _sessions_lock:
+        _sessions[driver] = (supplier, time.time())
+
+
+def session_state(driver):
+    """(supplier, validated_at) of the driver's known-good login, or None - for handing it to another process"""
+    with _sessions_lock:
+        return _sessions.get(driver)
+
+
+def restore_session(driver, state):
+    """Adopt a login state returned by session_state (None forgets any login)"""
+    with _sessions_lock:
+        if state is None:
+            _sessions.pop(driver, None)
+        else:
+            _sessions[driver] = tuple(state)
+
+
+def invalidate_session(driver):
+    """Forget any known-good login on this driver"""
+    with _sessions_lock:
+        _sessions.pop(driver, None)
+
+
+def process_tree_rss(driver):
+    """Resident memory (bytes) of the driver's chromedriver and Chrome process trees; 0 if unknown"""
+    pids = {getattr(driver, 'browser_pid', None)}
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    pids.add(getattr(process, 'pid', None))
+    seen = set()
+    total = 0
+    for pid in pids - {None}:
+        try:
+            root = psutil.Process(pid)
+            tree = [root] + root.children(recursive=True)
+        except psutil.Error:
+            continue
+        for proc in tree:
+            if proc.pid in seen:
+                continue
+            seen.add(proc.pid)
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                pass
+    return total
+
+
+def hold_until_done(busy, grace, release, force_quit):
+    """Call release() once the future ``busy`` is done, or force_quit() if that takes longer than grace seconds"""
+    claimed = threading.Lock()
+
+    def end(forced):
+        if claimed.acquire(blocking=False):  # Whichever comes first
+            (force_quit if forced else release)()
+
+    timer = threading.Timer(grace, end, args=(True,))
+    timer.daemon = True
+    timer.start()
+
+    def done(_):
+        timer.cancel()
+        end(False)
+    busy.add_done_callback(done)
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def available_memory():
+    """Bytes that can still be allocated: the container's cgroup headroom when limited, else host available"""
+    host = psutil.virtual_memory().available
+    for limit_file, usage_file in (('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory.current'),
+                                   ('/sys/fs/cgroup/memory/memory.limit_in_bytes',
+                                    '/sys/fs/cgroup/memory/memory.usage_in_bytes')):
+        limit, usage = _read_int(limit_file), _read_int(usage_file)
+        # cgroup v1 reports "no limit" as a huge number; anything above host RAM means unlimited
+        if limit is not None and usage is not None and limit < psutil.virtual_memory().total:
+            return min(host, max(limit - usage, 0))
+    return host
+
+
+class PoolExhausted(Exception):
+    """Raised when no driver could be leased before the acquire timeout"""
+
+
+class PoolOverloaded(PoolExhausted):
+    """Raised without waiting when too many scrapes are already queued for a driver"""
+
+
+class PooledDriver:
+    """Bookkeeping for a single driver owned by the pool"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.uses = 0
+        self.rss = 0  # Process-tree resident memory at the last measurement (bytes)
+        self.supplier = None  # Supplier the browser is authenticated against
+        self.quarantined = False  # Leased, but a timed-out scraper thread may still be driving it
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+
+class DriverPool:
+    """Long-lived, thread-safe pool of warm Chrome drivers shared by every request.
+
+    Drivers are created with ``factory`` and kept between searches. The pool keeps
+    at least ``min_size`` idle drivers warm in the background, never owns more
+    than ``max_size`` drivers in total, and recycles a driver once it has served
+    ``max_uses`` leases, is older than ``max_age`` seconds or its Chrome process
+    tree has grown past ``max_rss`` bytes.
+
+    Admission control: no new driver is started while less than
+    ``min_available_memory`` bytes are available; leases then queue for a
+    driver to come back, and once ``max_waiting`` leases are queued further
+    ones are shed with PoolOverloaded.
+
+    A driver whose scraper thread outlived its leg is quarantined: it stays
+    leased until the thread exits and is force-quit if that takes too long,
+    so no other search can get a browser that is still being driven.
+
+    Drivers are tagged with the supplier they were last leased to, and a lease
+    for a supplier prefers a driver already logged in to it so the scraper can
+    skip its login and validation navigations.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=4, max_uses=50, max_age=30 * 60,
+                 acquire_timeout=60, maintenance_interval=30, max_rss=None, min_available_memory=None,
+                 max_waiting=None):
+        self._factory = factory
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.max_rss = max_rss
+        self.min_available_memory = min_available_memory
+        self.max_waiting = max_waiting
+        self.acquire_timeout = acquire_timeout
+        self.maintenance_interval = maintenance_interval
+
+        self._idle = []  # PooledDriver entries, most recently returned last
+        self._leased = {}  # id(driver) -> PooledDriver
+        self._creating = 0
+        self._checking = 0  # idle drivers temporarily out for a health check
+        self._waiting = 0  # acquire() calls queued for a driver
+        self._quarantined = 0  # leased drivers held back until their scraper thread exits
+        self._cond = threading.Condition()
+        self._closed = False
+        self._started = False
+        self._stop_event = threading.Event()
+        self._maintenance_thread = None
+
+        self.stats = {
+            'created': 0,
+            'hits': 0,
+            'affinity_hits': 0,
+            'misses': 0,
+            'recycled': 0,
+            'recycled_rss': 0,
+            'unhealthy': 0,
+            'memory_deferred': 0,  # leases that queued because memory was tight
+            'shed': 0,
+            'quarantined': 0,  # drivers held back after their leg timed out or was cancelled
+            'force_killed': 0,  # quarantined drivers quit because their thread never let go
+        }
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the background maintenance thread (idempotent)"""
+        with self._cond:
+            if self._started or self._closed:
+                return
+            self._started = True
+        self._maintenance_thread = threading.Thread(
+            target=self._maintenance_loop, name="driver-pool-maintenance", daemon=True)
+        self._maintenance_thread.start()
+
+    def acquire(self, supplier=None, timeout=None):
+        """Lease a healthy driver, creating one if the pool is below max_size.
+
+        Preference order: an idle driver already tagged with ``supplier``, an
+        untagged idle driver, a new driver (unless memory is tight), and finally
+        the least recently used driver tagged with another supplier.
+        """
+        self.start()
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+
+        while True:
+            entry = None
+            create = False
+            queued = deferred = False
+            with self._cond:
+                try:
+                    while True:
+                        if self._closed:
+                            raise PoolExhausted("Driver pool is closed")
+                        entry = self._pop_idle(supplier)
+                        if entry is not None:
+                            break
+                        if self._total() < self.max_size:
+                            if not self._memory_tight():
+                                self._creating += 1
+                                create = True
+                                break
+                            if not deferred:
+                                deferred = True
+                                self.stats['memory_deferred'] += 1
+                                logger.warning("Memory is tight, queueing the lease instead of starting Chrome")
+                        if self._idle:
+                            # Steal the coldest driver from another supplier
+                            entry = self._idle.pop(0)
+                            break
+                        if not queued:
+                            if self.max_waiting is not None and self._waiting >= self.max_waiting:
+                                self.stats['shed'] += 1
+                                raise PoolOverloaded(f"{self._waiting} scrapes already waiting for a driver")
+                            queued = True
+                            self._waiting += 1
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            if deferred:
+                                self.stats['shed'] += 1
+                            raise PoolExhausted(
+                                f"No driver available after {timeout}s ({self._total()} in use)")
+                        # Memory is not signalled through the condition, so re-check it periodically
+                        self._cond.wait(min(remaining, ADMISSION_POLL_INTERVAL) if deferred else remaining)
+                finally:
+                    if queued:
+                        self._waiting -= 1
+
+            if create:
+                entry = self._create_entry(lease=True)
+                entry.supplier = supplier
+                return entry.driver
+
+            # Reused idle driver - make sure it is still worth handing out
+            if self._should_recycle(entry) or not self._is_healthy(entry):
+                self._quit(entry)
+                with self._cond:
+                    self._cond.notify()
+                continue
+
+            if supplier is not None and entry.supplier == supplier:
+                affinity = True
+            else:
+                affinity = False
+                if entry.supplier is not None:
+                    logger.debug(f"Re-tagging driver from {entry.supplier} to {supplier}")
+                invalidate_session(entry.driver)
+                entry.supplier = supplier
+
+            with self._cond:
+                self.stats['hits'] += 1
+                if affinity:
+                    self.stats['affinity_hits'] += 1
+                self._leased[id(entry.driver)] = entry
+            return entry.driver
+
+    def release(self, driver):
+        """Return a leased driver; it is kept warm unless it is due for recycling"""
+        with self._cond:
+            entry = self._leased.pop(id(driver), None)
+        if entry is None:
+            logger.warning("Released a driver that is not owned by the pool, quitting it")
+            self._quit_driver(driver)
+            return False
+
+        entry.uses += 1
+        entry.last_used = time.time()
+        self._measure(entry)
+
+        if self._closed or self._should_recycle(entry) or not self._is_healthy(entry):
+            self._quit(entry)
+            with self._cond:
+                self._cond.notify()
+            return False
+
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+        return True
+
+    def discard(self, driver):
+        """Quit a leased driver instead of returning it to the pool"""
+        with self._cond:
+            entry = self._leased.pop(id(driver), None)
+        if entry is None:
+            self._quit_driver(driver)
+        else:
+            self._quit(entry)
+        with self._cond:
+            self._cond.notify()
+
+    def quarantine(self, driver, busy, grace):
+        """Hold back a leased driver while ``busy`` (the future of the thread using it) is running.
+
+        The driver goes through release() once the thread exits, or is quit
+        if it is still running after ``grace`` seconds.
+        """
+        with self._cond:
+            entry = self._leased.get(id(driver))
+            if entry is None:
+                return
+            entry.quarantined = True
+            self._quarantined += 1
+            self.stats['quarantined'] += 1
+        logger.warning(f"Quarantining a {entry.supplier} driver until its scraper thread exits")
+
+        def end(forced):
+            with self._cond:
+                entry.quarantined = False
+                self._quarantined -= 1
+                if forced:
+                    self.stats['force_killed'] += 1
+            if forced:
+                logger.warning(f"{entry.supplier} scraper thread still running after {grace}s, quitting its driver")
+                self.discard(driver)
+            else:
+                self.release(driver)
+
+        hold_until_done(busy, grace, lambda: end(False), lambda: end(True))
+
+    def close(self, grace=CLOSE_GRACE):
+        """Quit every driver and stop maintenance.
+
+        Idle drivers are quit at once. Leased drivers quit as they are released;
+        any still out after ``grace`` seconds are quit from under their scraper.
+        """
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        self._stop_event.set()
+        for entry in idle:
+            self._quit(entry)
+
+        deadline = time.time() + grace
+        with self._cond:
+            while self._leased and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            leased, self._leased = list(self._leased.values()), {}
+        if leased:
+            logger.warning(f"Quitting {len(leased)} drivers still leased after {grace}s")
+        for entry in leased:
+            self._quit(entry)
+
+    def session_ids(self):
+        """WebDriver session ids of the drivers the pool currently holds"""
+        with self._cond:
+            entries = self._idle + list(self._leased.values())
+        return {getattr(entry.driver, 'session_id', None) for entry in entries} - {None}
+
+    def snapshot(self):
+        """Current pool sizes and counters"""
+        with self._cond:
+            entries = self._idle + list(self._leased.values())
+            return {
+                'idle': len(self._idle),
+                'leased': len(self._leased),
+                'creating': self._creating,
+                'waiting': self._waiting,
+                'in_quarantine': self._quarantined,
+                'rss_bytes': sum(entry.rss for entry in entries),
+                'max_rss_bytes': max((entry.rss for entry in entries), default=0),
+                **self.stats,
+            }
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _pop_idle(self, supplier):
+        """Pop the warmest idle driver tagged with supplier, else an untagged one"""
+        for wanted in (supplier, None):
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i].supplier == wanted:
+                    return self._idle.pop(i)
+        return None
+
+    def _total(self):
+        return len(self._idle) + len(self._leased) + self._creating + self._checking
+
+    def _create_entry(self, lease):
+        """Build a driver for a slot already reserved via ``_creating``"""
+        try:
+            driver = self._factory()
+        except Exception:
+            with self._cond:
+                self._creating -= 1
+                self._cond.notify()
+            raise
+        entry = PooledDriver(driver)
+        with self._cond:
+            self._creating -= 1
+            self.stats['created'] += 1
+            if lease:
+                self.stats['misses'] += 1
+                self._leased[id(driver)] = entry
+            else:
+                self._idle.insert(0, entry)
+                self._cond.notify()
+        return entry
+
+    def _should_recycle(self, entry):
+        if self.max_rss is not None and entry.rss > self.max_rss:
+            with self._cond:
+                self.stats['recycled_rss'] += 1
+            logger.info(f"Recycling driver using {entry.rss / 2**20:.0f} MB")
+            return True
+        return entry.uses >= self.max_uses or entry.age >= self.max_age
+
+    def _measure(self, entry):
+        """Refresh the entry's process-tree RSS"""
+        try:
+            entry.rss = process_tree_rss(entry.driver)
+        except Exception as e:
+            logger.debug(f"Could not measure driver memory: {e}")
+
+    def _memory_tight(self):
+        if self.min_available_memory is None:
+            return False
+        try:
+            return available_memory() < self.min_available_memory
+        except Exception as e:
+            logger.debug(f"Could not read available memory: {e}")
+            return False
+
+    def _is_healthy(self, entry):
+        try:
+            entry.driver.current_url  # Will throw if driver is unhealthy
+            return True
+        except Exception:
+            with self._cond:
+                self.stats['unhealthy'] += 1
+            return False
+
+    def _quit(self, entry):
+        invalidate_session(entry.driver)
+        with self._cond:
+            self.stats['recycled'] += 1
+        logger.debug(f"Recycling driver after {entry.uses} uses and {entry.age:.0f}s")
+        self._quit_driver(entry.driver)
+
+    @staticmethod
+    def _quit_driver(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _maintenance_loop(self):
+        # Runs once immediately so the pool is warm before the first search
+        while True:
+            try:
+                self._reap_idle()
+                self._top_up()
+            except Exception as e:
+                logger.error(f"Driver pool maintenance failed: {e}")
+            if self._stop_event.wait(self.maintenance_interval):
+                return
+
+    def _reap_idle(self):
+        """Health-check idle drivers and drop the ones that are stale or dead"""
+        with self._cond:
+            candidates, self._idle = self._idle, []
+            self._checking += len(candidates)
+
+        keep = []
+        for entry in candidates:
+            self._measure(entry)
+            if self._should_recycle(entry) or not self._is_healthy(entry):
+                self._quit(entry)
+            else:
+                keep.append(entry)
+
+        with self._cond:
+            self._checking -= len(candidates)
+            if self._closed:
+                stale, keep = keep, []
+            else:
+                stale = []
+                # Drivers returned while we were checking stay on top (warmest)
+                self._idle[:0] = keep
+            self._cond.notify_all()
+        for entry in stale:
+            self._quit(entry)
+
+    def _top_up(self):
+        """Create drivers until min_size are idle, without exceeding max_size"""
+        while not self._closed:
+            with self._cond:
+                if len(self._idle) >= self.min_size or self._total() >= self.max_size:
+                    return
+                if self._memory_tight():
+                    logger.info("Memory is tight, not pre-warming drivers")
+                    return
+                self._creating += 1
+            try:
+                self._create_entry(lease=False)
+            except Exception as e:
+                logger.warning(f"Could not pre-warm driver: {e}")
+                return
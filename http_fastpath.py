@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+
+import capture
+import scrape_context
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 15  # Seconds per plain HTTP request on the fast path
+ENABLED = os.getenv('HTTP_FAST_PATH', '1') != '0'  # Off: every search and detail page goes through the browser
+
+
+class FastPathUnavailable(Exception):
+    """The plain HTTP path cannot serve this search; fall back to the browser"""
+
+
+class SupplierSessions:
+    """One pooled requests.Session per supplier, seeded with cookies from a Selenium login"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def store(self, supplier, driver):
+        """Copy the browser's cookies and user agent into a fresh session for supplier"""
+        session = requests.Session()
+        try:
+            user_agent = driver.execute_script("return navigator.userAgent")
+            if user_agent:
+                session.headers['User-Agent'] = user_agent
+        except Exception:
+            pass
+
+        cookies = driver.get_cookies()
+        for cookie in cookies:
+            session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain'),
+                path=cookie.get('path', '/'),
+                secure=cookie.get('secure', False),
+            )
+
+        with self._lock:
+            old = self._sessions.get(supplier)
+            self._sessions[supplier] = session
+        if old is not None:
+            old.close()
+        logger.info(f"Exported {len(cookies)} {supplier} cookies to the HTTP fast path")
+
+    def get(self, supplier):
+        with self._lock:
+            return self._sessions.get(supplier)
+
+    def invalidate(self, supplier):
+        with self._lock:
+            session = self._sessions.pop(supplier, None)
+        if session is not None:
+            session.close()
+
+
+sessions = SupplierSessions()
+
+
+def export_driver_session(supplier, driver, only_if_missing=False):
+    """Hand a logged-in browser's cookies to the HTTP fast path (never raises)"""
+    if not ENABLED:
+        return
+    if only_if_missing and sessions.get(supplier) is not None:
+        return
+    try:
+        sessions.store(supplier, driver)
+    except Exception as e:
+        logger.warning(f"Could not export {supplier} cookies: {e}")
+
+
+def get_session(supplier):
+    """The supplier's HTTP session, or FastPathUnavailable if no browser has logged in yet"""
+    if not ENABLED:
+        raise FastPathUnavailable("HTTP fast path disabled")
+    session = sessions.get(supplier)
+    if session is None:
+        raise FastPathUnavailable(f"no {supplier} session exported yet")
+    return session
+
+
+def fetch(supplier, url, method='GET', **kwargs):
+    """Fetch url with the supplier's session; network errors become FastPathUnavailable"""
+    scrape_context.check_cancelled()
+    session = get_session(supplier)
+    kwargs.setdefault('timeout', scrape_context.remaining(HTTP_TIMEOUT))
+    try:
+        response = session.request(method, url, **kwargs)
+        recorder = capture.current_recorder()
+        if recorder is not None:
+            recorder.record_response(response)
+        response.raise_for_status()
+        return response
+    except requests.RequestException as e:
+        raise FastPathUnavailable(f"{supplier} request failed: {e}")
+
+
+def auth_failed(supplier, reason):
+    """Drop the supplier's session and signal the caller to use the browser"""
+    sessions.invalidate(supplier)
+    return FastPathUnavailable(f"{supplier} session rejected: {reason}")
+
+
+def submit_form(supplier, response, form, fields):
+    """Submit an HTML form the way the browser would, overriding ``fields``"""
+    data = {}
+    for field in form.find_all(['input', 'select', 'textarea']):
+        name = field.get('name')
+        if not name:
+            continue
+        field_type = (field.get('type') or '').lower()
+        if field_type in ('submit', 'button', 'image', 'reset'):
+            continue
+        if field_type in ('checkbox', 'radio') and not field.has_attr('checked'):
+            continue
+        data[name] = field.get('value', '')
+    data.update(fields)
+
+    action = urljoin(response.url, form.get('action') or response.url)
+    if (form.get('method') or 'get').lower() == 'post':
+        return fetch(supplier, action, method='POST', data=data)
+    return fetch(supplier, action, params=data)
+
+
+def parse_html(html):
+    """Parse a page snapshot with lxml (much faster than html.parser on large result pages)"""
+    return BeautifulSoup(html, 'lxml')
@@ -0,0 +1,350 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+import psutil
+
+from result_cache import _ClosingConnection, normalize_part_number
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+LEG_POLL_INTERVAL = 0.25  # Seconds before retrying a leg start while other processes hold every slot
+
+# Columns added to the jobs table after its first release, with their definitions
+JOB_COLUMNS = (
+    ('subscribers', 'INTEGER NOT NULL DEFAULT 0'),  # Open streams of the job
+    ('cancelled', 'INTEGER NOT NULL DEFAULT 0'),  # Set once the last subscriber left
+    ('user', 'TEXT'),  # Who queued the search, for per-user fairness in the supplier scheduler
+)
+
+
+class Job:
+    """A search claimed by a worker"""
+
+    def __init__(self, job_id, part_no, use_cache, attempts, user=None):
+        self.id = job_id
+        self.part_no = part_no
+        self.use_cache = use_cache
+        self.attempts = attempts
+        self.user = user
+
+
+class JobQueue:
+    """Durable SQLite queue of part searches shared by the web and scrape-worker processes.
+
+    The web process enqueues a search and streams the NDJSON lines workers
+    publish for it; a search for a part that is already queued or running
+    joins that job instead of starting another. Each enqueue counts as a
+    subscriber until its stream is closed, and a job whose last subscriber
+    left is cancelled: dropped if still queued, otherwise flagged for its
+    worker to stop. Workers heartbeat their running jobs, and jobs whose
+    worker stopped heartbeating are handed to another worker (up to
+    ``max_attempts`` times).
+
+    The same database holds the supplier legs in flight and each supplier's
+    token bucket, so SupplierScheduler limits hold across every web and
+    worker process (see ``start_leg``).
+    """
+
+    def __init__(self, path, stale_after=60, max_attempts=2, keep_for=3600, leg_expiry=600):
+        self.path = path
+        self.stale_after = stale_after  # Seconds without a heartbeat before a running job is requeued
+        self.max_attempts = max_attempts
+        self.keep_for = keep_for  # Seconds finished jobs and their lines are kept
+        self.leg_expiry = leg_expiry  # Seconds after which a leg that was never finished stops counting
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def enqueue(self, part_no, use_cache=True, user=None):
+        """Queue a search, or join the unfinished job for the same part; returns the job id.
+
+        The caller becomes one of the job's subscribers and must stream() it.
+        A joined job keeps running on behalf of the user who queued it.
+        """
+        key = normalize_part_number(part_no)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE part_key = ? AND use_cache = ? AND status IN (?, ?) AND cancelled = 0 "
+                "ORDER BY id DESC LIMIT 1",
+                (key, int(use_cache), QUEUED, RUNNING),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET subscribers = subscribers + 1 WHERE id = ?", (row[0],))
+                logger.info(f"Search for {part_no} joined job {row[0]}")
+                return row[0]
+            cursor = conn.execute(
+                "INSERT INTO jobs (part_no, part_key, use_cache, status, subscribers, user, created_at) "
+                "VALUES (?, ?, ?, ?, 1, ?, ?)",
+                (part_no, key, int(use_cache), QUEUED, user, now),
+            )
+            return cursor.lastrowid
+
+    def unsubscribe(self, job_id):
+        """One subscriber stopped streaming; the last one to leave cancels an unfinished job"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE jobs SET subscribers = MAX(subscribers - 1, 0) WHERE id = ?", (job_id,))
+            row = conn.execute("SELECT status, subscribers FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None or row[1] > 0:
+                return
+            if row[0] == QUEUED:
+                logger.info(f"Job {job_id} lost its last subscriber before it started, dropping it")
+                conn.execute("UPDATE jobs SET status = ?, cancelled = 1, finished_at = ? WHERE id = ?",
+                             (CANCELLED, now, job_id))
+            elif row[0] == RUNNING:
+                logger.info(f"Job {job_id} lost its last subscriber, cancelling it")
+                conn.execute("UPDATE jobs SET cancelled = 1 WHERE id = ?", (job_id,))
+
+    def cancelled(self, job_id):
+        """True once every subscriber of the job has gone"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancelled FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row is None or bool(row[0])
+
+    def claim(self, worker):
+        """Take the oldest queued job for worker (requeueing abandoned ones first), or None"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._requeue_stale(conn, now)
+            row = conn.execute(
+                "SELECT id, part_no, use_cache, attempts, user FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                (QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started_at = ?, heartbeat_at = ? "
+                "WHERE id = ?",
+                (RUNNING, worker, now, now, row[0]),
+            )
+        return Job(row[0], row[1], bool(row[2]), row[3] + 1, row[4])
+
+    def publish(self, job_id, line):
+        """Append one NDJSON line to the job's output (also a heartbeat)"""
+        now = time.time()
+        with self._connect() as conn:
+            _append(conn, job_id, line)
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (now, job_id))
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", [(time.time(), i) for i in job_ids])
+
+    def finish(self, job_id, error=None, cancelled=False):
+        """Mark the job done (failed with error, or cancelled) and purge old finished jobs"""
+        now = time.time()
+        status = CANCELLED if cancelled else FAILED if error is not None else DONE
+        with self._connect() as conn:
+            if error is not None:
+                _append(conn, job_id, json.dumps({"error": error}))
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (status, now, job_id))
+            old = "SELECT id FROM jobs WHERE status IN (?, ?, ?) AND finished_at < ?"
+            params = (*FINISHED, now - self.keep_for)
+            conn.execute(f"DELETE FROM job_lines WHERE job_id IN ({old})", params)
+            conn.execute(f"DELETE FROM jobs WHERE id IN ({old})", params)
+
+    def read(self, job_id, after=0):
+        """(lines with seq > after as [(seq, line)], job status or None if unknown)"""
+        with self._connect() as conn:
+            lines = conn.execute(
+                "SELECT seq, line FROM job_lines WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after),
+            ).fetchall()
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return lines, row[0] if row else None
+
+    def stream(self, job_id, poll_interval=0.1, timeout=600, keepalive=None):
+        """Yield the job's lines as workers publish them, until it finishes.
+
+        With ``keepalive`` a blank line is yielded after that many seconds
+        without output. Closing the stream unsubscribes from the job, which
+        cancels it unless other searches have joined it.
+        """
+        after = 0
+        deadline = time.time() + timeout
+        last_output = time.time()
+        try:
+            while True:
+                lines, status = self.read(job_id, after)
+                for after, line in lines:
+                    yield line
+                    last_output = time.time()
+                if keepalive is not None and time.time() - last_output >= keepalive:
+                    yield ''
+                    last_output = time.time()
+                if status in FINISHED or status is None:
+                    return
+                if time.time() > deadline:
+                    yield json.dumps({"error": f"Search did not finish within {timeout}s"})
+                    return
+                if not lines:
+                    time.sleep(poll_interval)
+        finally:
+            try:
+                self.unsubscribe(job_id)
+            except Exception as e:
+                logger.error(f"Could not unsubscribe from job {job_id}: {e}")
+
+    def start_leg(self, supplier, max_in_flight, per_minute):
+        """Start one of supplier's legs if the shared limits allow it.
+
+        Returns 0 if the leg was started (call ``finish_leg`` when it ends),
+        else the seconds to wait before asking again. Limits are the same as
+        SupplierLimiter's: at most ``max_in_flight`` legs at once and a token
+        bucket of that size refilled at ``per_minute`` legs a minute.
+        """
+        now = time.time()
+        rate = per_minute / 60.0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._drop_dead_legs(conn, supplier, now)
+            in_flight = conn.execute("SELECT COUNT(*) FROM supplier_legs WHERE supplier = ?",
+                                     (supplier,)).fetchone()[0]
+            if in_flight >= max_in_flight:
+                return LEG_POLL_INTERVAL
+            row = conn.execute("SELECT tokens, refilled_at FROM supplier_buckets WHERE supplier = ?",
+                               (supplier,)).fetchone()
+            tokens = max_in_flight if row is None else min(max_in_flight, row[0] + (now - row[1]) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate if rate > 0 else 1
+            conn.execute("INSERT OR REPLACE INTO supplier_buckets (supplier, tokens, refilled_at) VALUES (?, ?, ?)",
+                         (supplier, tokens - 1, now))
+            conn.execute("INSERT INTO supplier_legs (supplier, owner, started_at) VALUES (?, ?, ?)",
+                         (supplier, _owner(), now))
+            return 0
+
+    def finish_leg(self, supplier):
+        """End one of this process's legs for supplier"""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM supplier_legs WHERE id = "
+                "(SELECT id FROM supplier_legs WHERE supplier = ? AND owner = ? ORDER BY id LIMIT 1)",
+                (supplier, _owner()),
+            )
+
+    def depth(self):
+        """{status: number of jobs}"""
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def _requeue_stale(self, conn, now):
+        stale = conn.execute(
+            "SELECT id, attempts, worker, cancelled FROM jobs WHERE status = ? AND heartbeat_at < ?",
+            (RUNNING, now - self.stale_after),
+        ).fetchall()
+        for job_id, attempts, worker, cancelled in stale:
+            if cancelled:
+                conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (CANCELLED, now, job_id))
+            elif attempts >= self.max_attempts:
+                logger.error(f"Job {job_id} failed: worker {worker} stopped responding {attempts} times")
+                _append(conn, job_id, json.dumps({"error": "Scrape worker stopped responding"}))
+                conn.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?", (FAILED, now, job_id))
+            else:
+                logger.warning(f"Requeueing job {job_id}: worker {worker} stopped responding")
+                conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE id = ?", (QUEUED, job_id))
+
+    def _drop_dead_legs(self, conn, supplier, now):
+        # Legs whose process died never finish: drop those of gone local processes and very old ones
+        conn.execute("DELETE FROM supplier_legs WHERE started_at < ?", (now - self.leg_expiry,))
+        host = socket.gethostname()
+        for leg_id, owner in conn.execute("SELECT id, owner FROM supplier_legs WHERE supplier = ?",
+                                          (supplier,)).fetchall():
+            owner_host, _, pid = owner.rpartition(':')
+            if owner_host == host and not psutil.pid_exists(int(pid)):
+                conn.execute("DELETE FROM supplier_legs WHERE id = ?", (leg_id,))
+
+    def _connect(self):
+        # Short-lived connections like ResultCache; WAL lets the web process read while workers write
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS jobs ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "part_no TEXT NOT NULL, "
+                        "part_key TEXT NOT NULL, "
+                        "use_cache INTEGER NOT NULL, "
+                        "status TEXT NOT NULL, "
+                        "worker TEXT, "
+                        "attempts INTEGER NOT NULL DEFAULT 0, "
+                        "subscribers INTEGER NOT NULL DEFAULT 0, "
+                        "cancelled INTEGER NOT NULL DEFAULT 0, "
+                        "user TEXT, "
+                        "created_at REAL NOT NULL, "
+                        "started_at REAL, "
+                        "heartbeat_at REAL, "
+                        "finished_at REAL)"
+                    )
+                    _add_missing_columns(conn, 'jobs', JOB_COLUMNS)
+                    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS job_lines ("
+                        "job_id INTEGER NOT NULL, "
+                        "seq INTEGER NOT NULL, "
+                        "line TEXT NOT NULL, "
+                        "PRIMARY KEY (job_id, seq))"
+                    )
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS supplier_legs ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                        "supplier TEXT NOT NULL, "
+                        "owner TEXT NOT NULL, "
+                        "started_at REAL NOT NULL)"
+                    )
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS supplier_buckets ("
+                        "supplier TEXT PRIMARY KEY, "
+                        "tokens REAL NOT NULL, "
+                        "refilled_at REAL NOT NULL)"
+                    )
+                    conn.commit()
+                    self._initialized = True
+        return _ClosingConnection(conn)
+
+
+def _add_missing_columns(conn, table, columns):
+    # Queue databases created before a column was added get it with its default
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, definition in columns:
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _owner():
+    """host:pid of this process, as recorded on the legs it starts"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _append(conn, job_id, line):
+    conn.execute(
+        "INSERT INTO job_lines (job_id, seq, line) "
+        "VALUES (?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_lines WHERE job_id = ?), ?)",
+        (job_id, job_id, line),
+    )
+
+
+def default_queue_path():
+    """instance/scrape_jobs.db, next to the result cache"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'scrape_jobs.db')
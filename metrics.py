@@ -0,0 +1,183 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import scrape_context
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+# Upper bounds of the per-page-load histograms (requests, bytes)
+REQUEST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+NO_SUPPLIER = "none"  # Label used for work not tied to a supplier leg (e.g. pool warm-up)
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for label_values, values in sorted(series.items()):
+            labels = dict(zip(self.label_names, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(dict(zip(self.label_names, label_values)))} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+stage_seconds = Histogram(
+    "scraper_stage_seconds", "Time spent in each stage of a supplier leg", ("supplier", "stage"))
+leg_seconds = Histogram(
+    "scraper_leg_seconds", "End-to-end time of a supplier leg by how it was served", ("supplier", "path", "outcome"))
+events = Counter(
+    "scraper_events_total", "Notable scraper events (timeouts, login fallbacks, cache hits, ...)", ("supplier", "event"))
+page_requests = Histogram(
+    "scraper_page_requests", "Browser requests per page load by outcome (loaded, blocked, failed)",
+    ("supplier", "outcome"), buckets=REQUEST_BUCKETS)
+# Blocked requests are never downloaded, so their size is unknown: blocking shows up as
+# "blocked" request counts and as fewer downloaded bytes, not as a blocked-bytes figure
+page_downloaded_bytes = Histogram(
+    "scraper_page_downloaded_bytes", "Bytes the browser downloaded per page load", ("supplier",),
+    buckets=BYTE_BUCKETS)
+
+_collectors = []  # Callables returning extra exposition lines at scrape time
+
+
+def _supplier(supplier):
+    if supplier is not None:
+        return supplier
+    context = scrape_context.current()
+    return context.supplier if context is not None else NO_SUPPLIER
+
+
+@contextmanager
+def span(stage, supplier=None):
+    """Time the enclosed block as ``stage`` of the current supplier leg.
+
+    The supplier defaults to the ScrapeContext bound to this thread, so scrapers
+    only name the stage. Failed stages are still timed and also counted as
+    ``<stage>_error`` events.
+    """
+    supplier = _supplier(supplier)
+    start = time.time()
+    try:
+        yield
+    except BaseException:
+        events.inc(supplier, f"{stage}_error")
+        raise
+    finally:
+        stage_seconds.observe(time.time() - start, supplier, stage)
+
+
+def observe(stage, seconds, supplier=None):
+    """Record a stage duration measured by the caller"""
+    stage_seconds.observe(seconds, _supplier(supplier), stage)
+
+
+def observe_leg(supplier, path, outcome, seconds):
+    """Record a finished supplier leg.
+
+    path: fast_path/browser/cache/queue; outcome: ok/empty/timeout/error/shed/cancelled
+    """
+    leg_seconds.observe(seconds, supplier, path, outcome)
+
+
+def count(event, supplier=None, amount=1):
+    """Increment the ``event`` counter for the current (or given) supplier"""
+    events.inc(_supplier(supplier), event, amount=amount)
+
+
+def observe_page_load(loaded, blocked, failed, downloaded, supplier=None):
+    """Record the network activity of one page load of the current (or given) supplier"""
+    supplier = _supplier(supplier)
+    for outcome, requests in (("loaded", loaded), ("blocked", blocked), ("failed", failed)):
+        page_requests.observe(requests, supplier, outcome)
+    page_downloaded_bytes.observe(downloaded, supplier)
+
+
+def register_collector(collector):
+    """Add a callable returning exposition lines (gauges, foreign stats) rendered on every scrape"""
+    _collectors.append(collector)
+
+
+def gauge_lines(name, help_text, samples):
+    """Exposition lines for a gauge from an iterable of (labels dict, value)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def counter_lines(name, help_text, samples):
+    """Exposition lines for a counter kept elsewhere, from an iterable of (labels dict, value)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = stage_seconds.render() + leg_seconds.render() + events.render()
+    lines += page_requests.render() + page_downloaded_bytes.render()
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+    return "\n".join(lines) + "\n"
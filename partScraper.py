@@ -4,13 +4,31 @@ import logging
 import os
 from concurrent.futures import ThreadPoolExecutor
 import undetected_chromedriver as uc
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import time
 import tempfile
 import shutil
 from dotenv import load_dotenv
 import signal
+import atexit
+from driver_pool import DriverPool, PoolExhausted, available_memory
+from browser_broker import BrokerClient
+from result_cache import ResultCache, default_cache_path, normalize_part_number
+from single_flight import SingleFlight
+from adaptive_timeouts import AdaptiveTimeouts
+from circuit_breaker import CIRCUIT_STATES, CircuitBreakers
+from scraper_loop import ScraperLoop
+from supplier_scheduler import SupplierScheduler
+from job_queue import JobQueue, default_queue_path
+from http_fastpath import FastPathUnavailable
+import scrape_context
+from scrape_context import ScrapeContext
+import metrics
+import waits
+import capture
+import chrome_cache
+import resource_blocking
+import browser_contexts
+from browser_contexts import ContextFleet
 
 # Set up logging
 logging.basicConfig(
@@ -24,64 +42,101 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Constants for optimization
-CHROME_VERSION = 134  # Update this to your Chrome version
+CHROME_VERSION = int(os.getenv('CHROME_VERSION', 134))  # Update this to your Chrome version
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH')  # Local chromedriver; skips the download (offline benchmarks)
 MAX_SCRAPER_TIME = 300  # Maximum time a scraper can run (seconds)
-SHARED_DRIVER_POOL_SIZE = 3  # Number of drivers to keep in pool
-IMPLICIT_WAIT = 5  # Reduced from 10
+SEARCH_DEADLINE = int(os.getenv('SEARCH_DEADLINE', 150))  # Seconds a whole search may take; no leg outlives it
+LEG_MIN_TIMEOUT = 20  # Floor for learned per-supplier timeouts (seconds)
+SCRAPER_EXECUTOR_WORKERS = 32  # Threads for scrapers, fast paths and pool calls (timed-out scrapers keep theirs)
+DRIVER_POOL_MIN_SIZE = 2  # Idle drivers kept warm between requests
+DRIVER_POOL_MAX_SIZE = 6  # Upper bound on Chrome instances owned by the process
+DRIVER_MAX_USES = 50  # Recycle a driver after this many scrapes
+DRIVER_MAX_AGE = 30 * 60  # Recycle a driver after this many seconds
+DRIVER_ACQUIRE_TIMEOUT = 60  # Max time a scraper waits for a free driver
+DRIVER_MAX_RSS = int(os.getenv('DRIVER_MAX_RSS_MB', 1024)) * 2**20  # Recycle a Chrome tree grown past this
+MIN_AVAILABLE_MEMORY = int(os.getenv('MIN_AVAILABLE_MEMORY_MB', 768)) * 2**20  # Start no new Chrome below this
+DRIVER_MAX_WAITING = 24  # Queued leases beyond this are shed instead of waiting
+CANCEL_GRACE = 35  # Seconds a timed-out or cancelled scraper may keep its driver (covers one page-load timeout)
+STREAM_KEEPALIVE = 5  # Seconds between blank keep-alive lines, so a gone client is noticed between results
+CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failed legs before a supplier is reported unavailable
+CIRCUIT_RESET_TIMEOUT = 60  # Seconds an open supplier circuit fails fast before one probe search
+
+# Result cache (seconds a supplier's results stay fresh)
+CACHE_TTLS = {
+    'IGC': 15 * 60,
+    'PGW': 10 * 60,
+    'Pilkington': 30 * 60,
+    'MyGrant': 10 * 60,
+}
+CACHE_DEFAULT_TTL = 10 * 60
+
+# Per-supplier admission across every search in the process: (max legs in flight, leg starts per minute)
+SUPPLIER_LIMITS = {
+    'IGC': (2, 30),
+    'PGW': (3, 30),
+    'Pilkington': (2, 20),
+    'MyGrant': (3, 40),
+}
+SUPPLIER_DEFAULT_LIMIT = (3, 30)
+# Processes scraping at once (scrape workers, or gunicorn workers scraping in-process); above 1 they
+# share SUPPLIER_LIMITS through the job queue database
+SCRAPING_PROCESSES = int(os.getenv('SCRAPING_PROCESSES', os.getenv('WEB_CONCURRENCY', 1)))
+CACHE_MAX_STALE = 24 * 3600  # Oldest result still served while a refresh runs
+CACHE_STALE_WHILE_REVALIDATE = True  # Stream stale rows first, then a refreshed line
+IMPLICIT_WAIT = 0  # Disabled - scrapers use explicit readiness waits (see waits.py)
+HEADLESS_ARGS = ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu")
+PAGE_LOAD_STRATEGY = 'eager'  # 'normal', 'eager' (DOMContentLoaded) or 'none'
 PAGE_LOAD_TIMEOUT = 30  # Reduced from 60
 SCRIPT_TIMEOUT = 17  # Reduced from 30
 
-# Driver pool for reuse
-driver_pool = []
-driver_pool_lock = asyncio.Lock()
+async def get_driver_from_pool(supplier=None, context=None):
+    """Lease a warm driver from the process-wide pool, preferring one logged in to supplier"""
+    lease = scraper_loop.executor.submit(_in_context, context, _lease_driver, supplier)
+    try:
+        return await asyncio.wrap_future(lease)
+    except asyncio.CancelledError:
+        # The lease may still succeed after we are gone; give that driver straight back
+        lease.add_done_callback(_release_abandoned_lease)
+        raise
+
+def _release_abandoned_lease(lease):
+    if not lease.cancelled() and lease.exception() is None:
+        driver_pool.release(lease.result())
 
-async def get_driver_from_pool():
-    """Get a driver from the pool or create a new one if needed"""
-    async with driver_pool_lock:
-        if driver_pool:
-            return driver_pool.pop()
-        else:
-            return setup_chrome_driver()
+def _lease_driver(supplier):
+    """Acquire a pooled driver and switch its resource block list to supplier"""
+    driver = driver_pool.acquire(supplier, scrape_context.remaining(DRIVER_ACQUIRE_TIMEOUT))
+    resource_blocking.apply(driver, supplier)
+    return driver
 
 async def return_driver_to_pool(driver):
-    """Return a driver to the pool if it's still healthy"""
-    if len(driver_pool) < SHARED_DRIVER_POOL_SIZE:
-        try:
-            # Quick test to see if driver is responsive
-            driver.current_url  # Will throw if driver is unhealthy
-            async with driver_pool_lock:
-                driver_pool.append(driver)
-            return True
-        except:
-            try:
-                driver.quit()
-            except:
-                pass
-            return False
-    else:
-        try:
-            driver.quit()
-        except:
-            pass
-        return False
+    """Return a driver to the pool; unhealthy or worn-out drivers are recycled"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(scraper_loop.executor, driver_pool.release, driver)
 
 def setup_chrome_driver():
     """Set up a new Chrome driver with anti-detection measures and optimized settings"""
     start_time = time.time()
+    driver_dir = None  # Removed when the driver quits or fails to start
     try:
-        # Create a temp directory for the driver to avoid path conflicts
-        temp_dir = tempfile.mkdtemp()
-        driver_path = os.path.join(temp_dir, "chromedriver.exe")
+        if chrome_cache.ENABLED:
+            # Shared pre-patched chromedriver and a clone of the initialized profile template
+            driver_path = chrome_cache.driver_executable(CHROME_VERSION, CHROMEDRIVER_PATH)
+            driver_dir = user_data_dir = chrome_cache.new_profile(HEADLESS_ARGS)
+        else:
+            # Create a temp directory for the driver to avoid path conflicts
+            driver_dir = tempfile.mkdtemp()
+            driver_path = CHROMEDRIVER_PATH
 
-        # Set environment variable to use the temporary path
-        os.environ["UC_CHROMEDRIVER_PATH"] = driver_path
+            # Set environment variable to use the temporary path
+            os.environ["UC_CHROMEDRIVER_PATH"] = os.path.join(driver_dir, "chromedriver.exe")
+            user_data_dir = os.path.join(driver_dir, "user-data")
 
         options = uc.ChromeOptions()
+        options.page_load_strategy = PAGE_LOAD_STRATEGY
         options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--headless=new")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-gpu")
+        for arg in HEADLESS_ARGS:
+            options.add_argument(arg)
         
         # Additional performance options
         options.add_argument("--disable-extensions")
@@ -98,7 +153,6 @@ def setup_chrome_driver():
         options.add_argument("--disable-offline-load-stale-cache")
         
         # Add user data dir to avoid conflicts
-        user_data_dir = os.path.join(temp_dir, "user-data")
         options.add_argument(f"--user-data-dir={user_data_dir}")
         
         # Experimental options for performance
@@ -114,32 +168,251 @@ def setup_chrome_driver():
         }
         options.add_experimental_option('prefs', prefs)
 
+        # Capture mode and the page-load counters read Chrome's network events
+        if capture.enabled() or resource_blocking.STATS_ENABLED:
+            options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
         # Create driver with optimized timeouts
-        driver = uc.Chrome(version_main=CHROME_VERSION, options=options)
+        driver = uc.Chrome(version_main=CHROME_VERSION, options=options, driver_executable_path=driver_path)
+        chrome_cache.remove_on_quit(driver, driver_dir)
         driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
         driver.set_script_timeout(SCRIPT_TIMEOUT)
         driver.implicitly_wait(IMPLICIT_WAIT)
 
         elapsed = time.time() - start_time
+        metrics.observe("chrome_startup", elapsed)
         logger.info(f"Chrome driver set up in {elapsed:.2f}s")
         return driver
     except Exception as e:
         elapsed = time.time() - start_time
+        metrics.count("chrome_startup_error")
+        if driver_dir:
+            shutil.rmtree(driver_dir, ignore_errors=True)
         logger.error(f"Driver setup failed after {elapsed:.2f}s: {e}")
         raise
 
-async def scrape_with_driver(part_no, scraper_class, keys, name, timeout=MAX_SCRAPER_TIME):
-    """Run an individual scraper with its own driver and timeout"""
+# Event loop and executor shared by every request - started on the first search
+scraper_loop = ScraperLoop(SCRAPER_EXECUTOR_WORKERS)
+atexit.register(scraper_loop.stop)
+
+# With BROWSER_CONTEXTS=N, pooled drivers are isolated browser contexts, N to a Chrome
+context_fleet = None
+if browser_contexts.enabled():
+    context_fleet = ContextFleet(
+        setup_chrome_driver,
+        browser_contexts.CONTEXTS_PER_CHROME,
+        max_rss=DRIVER_MAX_RSS * browser_contexts.CONTEXTS_PER_CHROME,
+        page_load_strategy=PAGE_LOAD_STRATEGY,
+        performance_log=capture.enabled() or resource_blocking.STATS_ENABLED,
+    )
+
+# Driver pool for reuse - lives for the whole process so drivers stay warm between requests.
+# With BROWSER_BROKER set, drivers are leased from the shared browser broker process instead.
+if os.getenv('BROWSER_BROKER'):
+    driver_pool = BrokerClient(os.getenv('BROWSER_BROKER'), acquire_timeout=DRIVER_ACQUIRE_TIMEOUT)
+else:
+    driver_pool = DriverPool(
+        context_fleet.new_driver if context_fleet else setup_chrome_driver,
+        min_size=DRIVER_POOL_MIN_SIZE,
+        max_size=DRIVER_POOL_MAX_SIZE,
+        max_uses=DRIVER_MAX_USES,
+        max_age=DRIVER_MAX_AGE,
+        acquire_timeout=DRIVER_ACQUIRE_TIMEOUT,
+        # A context driver's own process tree is just the host's chromedriver; the fleet recycles whole hosts
+        max_rss=None if context_fleet else DRIVER_MAX_RSS,
+        min_available_memory=MIN_AVAILABLE_MEMORY,
+        max_waiting=DRIVER_MAX_WAITING,
+    )
+atexit.register(driver_pool.close)
+
+# Snapshot keys that are gauges rather than counters
+POOL_GAUGES = ('idle', 'leased', 'creating', 'waiting', 'in_quarantine', 'rss_bytes', 'max_rss_bytes',
+               'broker_leases')
+
+def _collect_runtime_metrics():
+    """Pool and wait statistics for /metrics"""
+    snapshot = driver_pool.snapshot()
+    lines = metrics.gauge_lines("driver_pool_drivers", "Chrome drivers owned by the pool by state", [
+        ({"state": state}, snapshot[state]) for state in ('idle', 'leased', 'creating')])
+    lines += metrics.gauge_lines("driver_pool_waiting", "Scrapes queued for a driver", [({}, snapshot['waiting'])])
+    lines += metrics.gauge_lines("driver_pool_quarantined", "Leased drivers held until their timed-out scraper exits",
+                                 [({}, snapshot['in_quarantine'])])
+    if context_fleet is None:
+        lines += metrics.gauge_lines("driver_pool_rss_bytes", "Resident memory of the pooled Chrome process trees", [
+            ({"stat": "total"}, snapshot['rss_bytes']), ({"stat": "max"}, snapshot['max_rss_bytes'])])
+    lines += metrics.gauge_lines("host_available_memory_bytes", "Memory available to new Chrome processes",
+                                 [({}, available_memory())])
+    if context_fleet is not None:
+        fleet = context_fleet.snapshot()
+        lines += metrics.gauge_lines("browser_context_hosts", "Chrome processes hosting browser contexts",
+                                     [({}, fleet['hosts'])])
+        lines += metrics.gauge_lines("browser_context_host_rss_bytes", "Resident memory of the host Chromes",
+                                     [({}, fleet['host_rss_bytes'])])
+    lines += metrics.counter_lines("driver_pool_events_total", "Driver pool lease and lifecycle counters", [
+        ({"event": event}, value) for event, value in snapshot.items() if event not in POOL_GAUGES])
+    lines += metrics.gauge_lines("scrape_flights_in_flight", "Supplier legs currently being scraped",
+                                 [({}, scrape_flights.in_flight())])
+    scheduled = sorted(supplier_scheduler.snapshot().items())
+    lines += metrics.gauge_lines("supplier_legs_in_flight", "Supplier legs admitted by the scheduler", [
+        ({"supplier": name}, in_flight) for name, (in_flight, _) in scheduled])
+    lines += metrics.gauge_lines("supplier_legs_queued", "Supplier legs waiting for a scheduler slot", [
+        ({"supplier": name}, queued) for name, (_, queued) in scheduled])
+    lines += metrics.gauge_lines("supplier_timeout_seconds", "Timeout given to the supplier's latest leg", [
+        ({"supplier": name}, f"{budget:.1f}") for name, (budget, _) in sorted(leg_timeouts.snapshot().items())])
+    lines += metrics.gauge_lines("supplier_latency_samples", "Leg durations the supplier's timeout is learned from", [
+        ({"supplier": name}, samples) for name, (_, samples) in sorted(leg_timeouts.snapshot().items())])
+    breakers = sorted(supplier_breakers.all().items())
+    lines += metrics.gauge_lines("supplier_circuit_state", "Supplier circuit breaker state (1 for the current one)", [
+        ({"supplier": name, "state": state}, int(breaker.state == state)) for name, breaker in breakers
+        for state in CIRCUIT_STATES])
+    lines += metrics.counter_lines("supplier_circuit_events_total", "Circuit breaker openings, rejections and probes", [
+        ({"supplier": name, "event": event}, value) for name, breaker in breakers
+        for event, value in breaker.stats.items()])
+    lines += metrics.gauge_lines("scraper_loop_streams", "Searches currently streaming from the scraper loop",
+                                 [({}, scraper_loop.active_streams())])
+
+    # Explicit waits, labelled "<supplier>:<wait>" by waits.py
+    timings = sorted(waits.timings().items())
+    samples = [(dict(zip(("supplier", "wait"), _split_wait_label(label))), stats) for label, stats in timings]
+    lines += metrics.counter_lines("scraper_wait_seconds_sum", "Total time spent in explicit waits",
+                                   [(labels, f"{stats['total']:.6f}") for labels, stats in samples])
+    lines += metrics.counter_lines("scraper_wait_seconds_count", "Explicit waits performed",
+                                   [(labels, stats['count']) for labels, stats in samples])
+    lines += metrics.counter_lines("scraper_wait_timeouts_total", "Explicit waits that timed out",
+                                   [(labels, stats['timeouts']) for labels, stats in samples])
+    return lines
+
+def _split_wait_label(label):
+    supplier, _, wait = label.rpartition(":")
+    return supplier or metrics.NO_SUPPLIER, wait
+
+metrics.register_collector(_collect_runtime_metrics)
+
+# Persistent result cache shared by every request (instance/scrape_cache.db)
+result_cache = ResultCache(
+    default_cache_path(),
+    ttls=CACHE_TTLS,
+    default_ttl=CACHE_DEFAULT_TTL,
+    max_stale=CACHE_MAX_STALE,
+)
+
+def _is_cacheable(rows):
+    """Only cache real results - not empty lists or the scrapers' "Not Found" placeholders"""
+    if not rows:
+        return False
+    return not all(
+        isinstance(row, dict) and all(value == "Not Found" for value in row.values())
+        for row in rows
+    )
+
+def _format_result(name, keys, data):
+    """Shape raw scraper rows into the {name: [dict, ...]} line sent to the client"""
+    if data:
+        # Format data as dictionaries
+        if isinstance(data, list) and all(isinstance(item, list) for item in data):
+            return {name: [dict(zip(keys, item)) for item in data]}
+        return {name: data}
+    return {name: []}
+
+def _serialize(line):
+    """json.dumps a {supplier: rows, ...} line, timed as that supplier's serialize stage"""
+    with metrics.span("serialize", next(iter(line))):
+        return json.dumps(line)
+
+def _finish_leg(recorder, driver):
+    """Account for the leg's last page load and, in capture mode, write its replay bundle"""
+    try:
+        if driver:
+            waits.drain_network(driver, page_loaded=True)
+        if recorder is not None:
+            recorder.save()
+    except Exception as e:
+        logger.error(f"Could not finish {scrape_context.current().supplier} network accounting: {e}")
+
+def _ignore_late_result(future):
+    # Mark a scraper's outcome as retrieved when nobody was waiting for it any more
+    if not future.cancelled():
+        future.exception()
+
+def _in_context(context, func, *args):
+    """Call func in an executor thread with the leg's ScrapeContext bound"""
+    with scrape_context.bind(context):
+        return func(*args)
+
+async def try_fast_path(part_no, fast_path, keys, name, timeout, context=None):
+    """Run a supplier's browserless HTTP search; None means fall back to the browser"""
+    start_time = time.time()
+    try:
+        loop = asyncio.get_event_loop()
+        data = await asyncio.wait_for(
+            loop.run_in_executor(scraper_loop.executor, _in_context, context, fast_path, part_no, logger),
+            timeout=timeout)
+    except FastPathUnavailable as e:
+        logger.info(f"{name} HTTP fast path unavailable ({e}), using browser")
+        metrics.count("fast_path_fallback", name)
+        return None
+    except asyncio.TimeoutError:
+        logger.warning(f"{name} HTTP fast path timed out, using browser")
+        metrics.count("fast_path_timeout", name)
+        return None
+    except Exception as e:
+        logger.warning(f"{name} HTTP fast path failed ({e}), using browser")
+        metrics.count("fast_path_error", name)
+        return None
+    finally:
+        metrics.observe("fast_path", time.time() - start_time, name)
+
+    result = _format_result(name, keys, data)
+    if _is_cacheable(result[name]):
+        result_cache.put(name, part_no, result[name])
+    elapsed = time.time() - start_time
+    metrics.observe_leg(name, "fast_path", "ok" if result[name] else "empty", elapsed)
+    logger.info(f"{name} HTTP fast path completed in {elapsed:.2f}s")
+    return result
+
+async def scrape_with_driver(part_no, scraper_class, keys, name, timeout=MAX_SCRAPER_TIME, fast_path=None,
+                             on_rows=None):
+    """Run an individual scraper with its own driver and timeout.
+
+    If the supplier has a ``fast_path`` (plain HTTP search using cookies from an
+    earlier browser login) it is tried first and no driver is leased unless it
+    cannot serve the search. ``on_rows`` receives intermediate rows from
+    scrapers that stream them. ``timeout`` is the leg's whole budget: the
+    driver lease and every explicit wait inside the scraper are capped by
+    what is left of it.
+    """
     driver = None
+    scraper_thread = None  # Future of the executor thread running the scraper
     start_time = time.time()
+    deadline = start_time + timeout
+    context = ScrapeContext(name, part_no, on_rows=on_rows, deadline=deadline)
+
+    # Capture mode records the full browser flow, so the fast path is not tried first
+    if capture.enabled():
+        context.recorder = capture.Recorder(name, part_no)
+        fast_path = None
+
+    if fast_path is not None:
+        try:
+            result = await try_fast_path(part_no, fast_path, keys, name, timeout, context)
+        except asyncio.CancelledError:
+            context.cancel()
+            raise
+        if result is not None:
+            # Not a leg_timeouts sample: the budget has to cover the browser fallback, not sub-second HTTP hits
+            supplier_breakers.get(name).record_success()
+            return result
     
     # Create a task for the actual scraper execution
     try:
         # Get a driver from the pool or create a new one
-        driver = await get_driver_from_pool()
-        
-        # Add wait capability for the scraper to use
-        wait = WebDriverWait(driver, 10)
+        acquire_start = time.time()
+        driver = await get_driver_from_pool(name, context)
+        metrics.observe("acquire", time.time() - acquire_start, name)
+        timeout = max(deadline - time.time(), 1)  # The fast path and the lease used part of the budget
+        if context.recorder is not None:
+            context.recorder.start(driver)
         
         # Log the search attempt
         logger.info(f"Searching part in {name}: {part_no}")
@@ -147,44 +420,79 @@ async def scrape_with_driver(part_no, scraper_class, keys, name, timeout=MAX_SCR
         # Call the scraper function - wrap with timeout
         try:
             # Create a future for the scraper execution
-            loop = asyncio.get_event_loop()
-            scraper_future = loop.run_in_executor(None, lambda: scraper_class(part_no, driver, logger))
-            
-            # Wait for scraper to complete with timeout
-            data = await asyncio.wait_for(scraper_future, timeout=timeout)
+            scraper_thread = scraper_loop.executor.submit(_in_context, context, scraper_class, part_no, driver, logger)
+            scraper_future = asyncio.wrap_future(scraper_thread)
+            scraper_future.add_done_callback(_ignore_late_result)
+
+            # Wait for scraper to complete with timeout (shielded: the thread is stopped in the finally block)
+            data = await asyncio.wait_for(asyncio.shield(scraper_future), timeout=timeout)
             
             # Process results
-            if data:
-                # Format data as dictionaries
-                if isinstance(data, list) and all(isinstance(item, list) for item in data):
-                    data_dicts = [dict(zip(keys, item)) for item in data]
-                    result = {name: data_dicts}
-                else:
-                    result = {name: data}
-            else:
-                result = {name: []}
+            result = _format_result(name, keys, data)
+
+            if _is_cacheable(result[name]):
+                result_cache.put(name, part_no, result[name])
                 
             elapsed = time.time() - start_time
+            metrics.observe_leg(name, "browser", "ok" if result[name] else "empty", elapsed)
+            supplier_breakers.get(name).record_success()
+            leg_timeouts.record(name, elapsed)
             logger.info(f"{name} scraper completed in {elapsed:.2f}s")
             return result
             
         except asyncio.TimeoutError:
             elapsed = time.time() - start_time
+            metrics.count("timeout", name)
+            metrics.observe_leg(name, "browser", "timeout", elapsed)
+            supplier_breakers.get(name).record_failure()
+            leg_timeouts.record(name, elapsed)
             logger.warning(f"{name} scraper timed out after {elapsed:.2f}s")
             return {name: []}
             
         except Exception as e:
             elapsed = time.time() - start_time
+            metrics.observe_leg(name, "browser", "error", elapsed)
+            supplier_breakers.get(name).record_failure()
             logger.error(f"{name} scraper failed after {elapsed:.2f}s: {e}")
             return {name: []}
 
+        except asyncio.CancelledError:
+            elapsed = time.time() - start_time
+            metrics.count("cancelled", name)
+            metrics.observe_leg(name, "browser", "cancelled", elapsed)
+            supplier_breakers.get(name).record_inconclusive()
+            logger.info(f"{name} scrape cancelled after {elapsed:.2f}s")
+            raise
+
+    except PoolExhausted as e:
+        elapsed = time.time() - start_time
+        metrics.count("shed", name)
+        metrics.observe_leg(name, "browser", "shed", elapsed)
+        supplier_breakers.get(name).record_inconclusive()  # Our capacity, not the supplier
+        logger.warning(f"{name} scrape shed after {elapsed:.2f}s: {e}")
+        return {name: []}
     except Exception as e:
         elapsed = time.time() - start_time
+        metrics.count("setup_error", name)
+        metrics.observe_leg(name, "browser", "error", elapsed)
+        supplier_breakers.get(name).record_inconclusive()  # No driver, so the supplier was never tried
         logger.error(f"Error in {name} scraper setup after {elapsed:.2f}s: {e}")
         return {name: []}
     finally:
-        # Return the driver to the pool if possible
-        if driver:
+        # A scraper still running (timed out or cancelled) stops at its next wait or page load
+        context.cancel()
+        busy = scraper_thread is not None and not scraper_thread.done()
+
+        if driver or context.recorder is not None:
+            # The browser's network log belongs to the thread while it is still driving it
+            await asyncio.get_event_loop().run_in_executor(scraper_loop.executor, _in_context, context,
+                                                           _finish_leg, context.recorder, None if busy else driver)
+
+        # Return the driver to the pool if possible; one still in use waits in quarantine until its thread exits
+        if driver and busy:
+            await asyncio.get_event_loop().run_in_executor(scraper_loop.executor, driver_pool.quarantine, driver,
+                                                           scraper_thread, CANCEL_GRACE)
+        elif driver:
             try:
                 driver_reused = await return_driver_to_pool(driver)
                 if driver_reused:
@@ -193,56 +501,210 @@ async def scrape_with_driver(part_no, scraper_class, keys, name, timeout=MAX_SCR
                     logger.debug(f"Driver disposed for {name}")
             except Exception as e:
                 logger.error(f"Error returning driver to pool for {name}: {e}")
-                try:
-                    driver.quit()
-                except:
-                    pass
+                driver_pool.discard(driver)
+
+# In-flight supplier legs shared by concurrent searches, grouped by part number
+scrape_flights = SingleFlight()
+
+# Suppliers that keep failing are reported unavailable instead of tying up drivers
+supplier_breakers = CircuitBreakers(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, probe_timeout=MAX_SCRAPER_TIME)
+
+# Per-supplier leg timeouts learned from recent browser leg durations, capped by the search deadline
+leg_timeouts = AdaptiveTimeouts(LEG_MIN_TIMEOUT, SEARCH_DEADLINE)
 
-async def run_scrapers_concurrently(part_no):
-    """Run all scrapers concurrently and yield results as soon as they complete"""
+# Bounds concurrent sessions and leg rate per supplier, queueing legs fairly across users; with several
+# scraping processes the job queue database holds the limits they all share
+supplier_scheduler = SupplierScheduler(SUPPLIER_LIMITS, SUPPLIER_DEFAULT_LIMIT,
+                                       shared=JobQueue(default_queue_path()) if SCRAPING_PROCESSES > 1 else None)
+
+async def scheduled_scrape(part_no, scraper_class, keys, name, timeout=MAX_SCRAPER_TIME, fast_path=None,
+                           on_rows=None, user=None):
+    """scrape_with_driver once the supplier scheduler admits the leg.
+
+    Time spent queued is recorded as the ``queue_wait`` stage and comes out
+    of the leg's timeout; a leg still queued when its timeout is up returns
+    no rows.
+    """
+    queued_at = time.time()
+    try:
+        async with supplier_scheduler.slot(name, user, timeout):
+            waited = time.time() - queued_at
+            metrics.observe("queue_wait", waited, name)
+            if waited >= 1:
+                logger.info(f"{name} leg for {part_no} waited {waited:.2f}s for a supplier slot")
+            return await scrape_with_driver(part_no, scraper_class, keys, name, max(timeout - waited, 1), fast_path,
+                                            on_rows)
+    except asyncio.TimeoutError:
+        waited = time.time() - queued_at
+        metrics.observe("queue_wait", waited, name)
+        metrics.count("queue_timeout", name)
+        metrics.observe_leg(name, "queue", "timeout", waited)
+        logger.warning(f"{name} leg for {part_no} got no supplier slot within {waited:.2f}s")
+        return {name: []}
+
+class LeaderAbandoned(Exception):
+    """The request running a shared scrape went away before it finished"""
+
+async def coalesced_scrape(part_no, scraper_class, keys, name, timeout=MAX_SCRAPER_TIME, fast_path=None,
+                           on_rows=None, user=None):
+    """scheduled_scrape, deduplicated across concurrent requests for the same supplier and part.
+
+    Only the first request runs the scraper; later ones await its result, and a
+    request joining after the leg finished (while the rest of that search is
+    still running) gets the finished result replayed. Intermediate rows are
+    only streamed to the request that runs the leg.
+    """
+    group = normalize_part_number(part_no)
+    for attempt in range(2):
+        future, is_leader = scrape_flights.join(group, name)
+        if is_leader:
+            try:
+                result = await scheduled_scrape(part_no, scraper_class, keys, name, timeout, fast_path, on_rows, user)
+            except BaseException:
+                scrape_flights.abandon(group, name, LeaderAbandoned(f"{name} scrape for {part_no} was abandoned"))
+                raise
+            scrape_flights.resolve(group, name, result)
+            return result
+
+        if future.done():
+            logger.info(f"{name} result for {part_no} replayed from a concurrent search")
+        else:
+            logger.info(f"{name} joined in-flight scrape for {part_no}")
+        metrics.count("coalesced", name)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{name} shared scrape for {part_no} did not finish within {timeout}s")
+            return {name: []}
+        except LeaderAbandoned:
+            # Take over the leg ourselves on the next attempt
+            logger.info(f"{name} leader for {part_no} went away, retrying")
+    return {name: []}
+
+async def run_scrapers_concurrently(part_no, use_cache=True, user=None):
+    """Run all scrapers concurrently and yield results as soon as they complete.
+
+    Fresh cached results are yielded immediately with ``"status": "cached"``
+    and that supplier is not scraped. Stale results are yielded with
+    ``"status": "stale"`` and refreshed in the background; the refreshed rows
+    follow as a second line with ``"status": "refreshed"``. With
+    ``use_cache=False`` every supplier is scraped live (results still refresh
+    the cache). Scrapers that stream rows produce ``"status": "partial"`` lines
+    holding all rows found so far, ahead of their final line. Suppliers whose
+    circuit breaker is open are not scraped and get an immediate
+    ``"status": "unavailable"`` line (with any stale cached rows). ``user``
+    is the key the supplier scheduler queues this search's legs under.
+    """
+    tasks = {}  # Live scraper task -> supplier
+    partial_task = None
     # Import scrapers here to avoid circular imports
     try:
         start_time = time.time()
         
         # Dynamically import all scrapers
-        from Scrapers.igc_scraper import IGCScraper
-        from Scrapers.pwg_scraper import PWGScraper
+        from Scrapers.igc_scraper import IGCScraper, http_search as igc_http_search
+        from Scrapers.pwg_scraper import PWGScraper, http_search as pwg_http_search
         from Scrapers.pilkington_scraper import PilkingtonScraper
-        from Scrapers.mygrant_scraper import MyGrantScraper
+        from Scrapers.mygrant_scraper import MyGrantScraper, http_search as mygrant_http_search
 
         # Load environment variables for credentials
         load_dotenv()
 
-        # Define scrapers with their keys and individual timeouts
+        # Define scrapers with their keys, default timeouts (until latency history is learned) and optional
+        # HTTP fast path
         scrapers = [
-            ('IGC', IGCScraper, ["Part Number", "Availability", "Price", "Location"], 150),
-            ('PGW', PWGScraper, ["Part Number", "Availability", "Price", "Location", "Description"], 150),
-            ('Pilkington', PilkingtonScraper, ["Part Number", "Part Name", "Price", "Location"], 150),
-            ('MyGrant', MyGrantScraper, ["Part Number", "Availability", "Price", "Location"], 150),
+            ('IGC', IGCScraper, ["Part Number", "Availability", "Price", "Location"], 150, igc_http_search),
+            ('PGW', PWGScraper, ["Part Number", "Availability", "Price", "Location", "Description"], 150, pwg_http_search),
+            ('Pilkington', PilkingtonScraper, ["Part Number", "Part Name", "Price", "Location"], 150, None),
+            ('MyGrant', MyGrantScraper, ["Part Number", "Availability", "Price", "Location"], 150, mygrant_http_search),
         ]
 
-        # Create tasks for each scraper with individual timeouts
-        tasks = {
-            asyncio.create_task(scrape_with_driver(part_no, scraper_class, keys, name, timeout)): name
-            for name, scraper_class, keys, timeout in scrapers
-        }
-        
+        # Intermediate rows reported from scraper threads
+        loop = asyncio.get_event_loop()
+        partials = asyncio.Queue()
+
+        def partial_reporter(name, keys):
+            def on_rows(rows):
+                try:
+                    loop.call_soon_threadsafe(partials.put_nowait, (name, _format_result(name, keys, rows)))
+                except RuntimeError:
+                    pass  # Request loop already gone
+            return on_rows
+
+        # Split suppliers into cache hits and live scrapes
+        cached_lines = []
+        refreshing = set()
+        budgets = {}
+        deadline = start_time + SEARCH_DEADLINE
+        for name, scraper_class, keys, timeout, fast_path in scrapers:
+            entry = result_cache.get(name, part_no) if use_cache else None
+            if entry is not None and entry.is_fresh:
+                logger.info(f"{name} served from cache ({entry.age:.0f}s old)")
+                metrics.count("cache_hit", name)
+                cached_lines.append({name: entry.rows, "status": "cached"})
+                continue
+            if not supplier_breakers.get(name).allow():
+                logger.warning(f"{name} is unavailable (circuit open), not scraping")
+                metrics.count("circuit_open", name)
+                cached_lines.append({name: entry.rows if entry is not None else [], "status": "unavailable"})
+                continue
+            if entry is not None and CACHE_STALE_WHILE_REVALIDATE:
+                logger.info(f"{name} serving stale cache ({entry.age:.0f}s old), refreshing")
+                metrics.count("cache_stale", name)
+                cached_lines.append({name: entry.rows, "status": "stale"})
+                refreshing.add(name)
+
+            # Create a task for each live scraper with its learned timeout, within the search deadline
+            budgets[name] = min(leg_timeouts.timeout_for(name, timeout), max(deadline - time.time(), 1))
+            on_rows = None if name in refreshing else partial_reporter(name, keys)
+            task = asyncio.create_task(
+                coalesced_scrape(part_no, scraper_class, keys, name, budgets[name], fast_path, on_rows, user))
+            tasks[task] = name
+        if budgets:
+            logger.info(f"Leg budgets for {part_no}: " + ", ".join(f"{n} {b:.0f}s" for n, b in budgets.items()))
+
+        # Cached rows go out before any live scraper has finished
+        for line in cached_lines:
+            yield _serialize(line)
+
         # Track which scrapers we've processed
         pending = set(tasks.keys())
+        finished = set()
         
         # Process results as they complete - don't wait for all to finish
         while pending:
-            # Wait for the next result to complete
-            done, pending = await asyncio.wait(
-                pending, 
+            if partial_task is None:
+                partial_task = asyncio.ensure_future(partials.get())
+
+            # Wait for the next result (or intermediate rows) to complete
+            done, _ = await asyncio.wait(
+                pending | {partial_task},
                 return_when=asyncio.FIRST_COMPLETED  # Process one at a time as they complete
             )
+
+            # Intermediate rows first, so they never overtake the final line
+            if partial_task in done:
+                done.discard(partial_task)
+                name, partial = partial_task.result()
+                partial_task = None
+                if name not in finished:
+                    yield _serialize({name: partial[name], "status": "partial"})
+            pending -= done
             
             # Handle completed tasks immediately
             for done_task in done:
+                finished.add(tasks[done_task])
                 try:
                     result = done_task.result()
-                    yield json.dumps(result)
+                    name = tasks[done_task]
+                    if name in refreshing:
+                        # Keep showing the stale rows if the refresh came back empty or "Not Found"
+                        if _is_cacheable(result[name]):
+                            yield _serialize({name: result[name], "status": "refreshed"})
+                        else:
+                            logger.warning(f"{name} refresh returned no rows, keeping stale results")
+                        continue
+                    yield _serialize(result)
                 except Exception as e:
                     name = tasks[done_task]
                     logger.error(f"Error processing {name} result: {e}")
@@ -257,45 +719,27 @@ async def run_scrapers_concurrently(part_no):
         logger.error(f"Error in run_scrapers_concurrently: {e}")
         yield json.dumps({"error": str(e)})
     finally:
-        # Clean up any remaining drivers in the pool
-        async with driver_pool_lock:
-            for driver in driver_pool:
-                try:
-                    driver.quit()
-                except:
-                    pass
-            driver_pool.clear()
-
-def runScraper(part_no):
-    """Flask-compatible generator function that yields results as they become available"""
-    # Set up a new event loop for this request
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        if partial_task is not None:
+            partial_task.cancel()
+        # Search cancelled (client gone): stop the scrapers still running so their drivers come back
+        unfinished = [task for task in tasks if not task.done()]
+        if unfinished:
+            logger.info(f"Search for {part_no} cancelled, stopping {', '.join(tasks[t] for t in unfinished)}")
+        for task in unfinished:
+            task.cancel()
 
-        # Create async generator - immediately yield results as they arrive
-        async def async_generator():
-            async for result in run_scrapers_concurrently(part_no):
-                yield result
-
-        # Run the async generator in the event loop - yield each result immediately
-        gen = async_generator()
-        try:
-            while True:
-                try:
-                    # Get next result from async generator
-                    result = loop.run_until_complete(gen.__anext__())
-                    yield result
-                except StopAsyncIteration:
-                    # Generator is done
-                    break
-                except Exception as e:
-                    logger.error(f"Error yielding result: {e}")
-                    yield json.dumps({"error": str(e)})
-        finally:
-            # Clean up
-            loop.close()
+def runScraper(part_no, use_cache=True, keepalive=None, user=None):
+    """Flask-compatible generator function that yields results as they become available.
 
+    The search runs on the shared background scraper loop; this generator only
+    relays its lines to the calling request thread. Closing it early cancels
+    the search. With ``keepalive`` a blank line is yielded after that many
+    idle seconds, so a streaming response notices a closed connection while
+    the scrapers are still working.
+    """
+    try:
+        yield from scraper_loop.stream(run_scrapers_concurrently(part_no, use_cache, user), idle_timeout=keepalive,
+                                       idle_item='')
     except Exception as e:
         logger.error(f"Error in runScraper: {e}")
         yield json.dumps({"error": str(e)})
@@ -303,12 +747,33 @@ def runScraper(part_no):
 
 # For direct testing
 if __name__ == "__main__":
+    import argparse
     import sys
 
-    if len(sys.argv) > 1:
-        part_no = sys.argv[1]
-    else:
-        part_no = "2000"  # Default test part number
+    parser = argparse.ArgumentParser(description="Run every supplier scraper for a part number")
+    parser.add_argument('part_no', nargs='?', default="2000", help="part number to search (default 2000)")
+    parser.add_argument('--capture', metavar='DIR',
+                        help="record every page and XHR response into replay bundles below DIR")
+    parser.add_argument('--replay', metavar='DIR',
+                        help="serve the bundles below DIR locally and scrape those instead of the live sites")
+    parser.add_argument('--replay-latency', type=float, default=0.0, help="seconds added to every replayed response")
+    args = parser.parse_args()
+    part_no = args.part_no
+    use_cache = not (args.capture or args.replay)
+
+    if args.capture:
+        capture.enable(args.capture)
+        print(f"Capturing supplier traffic to {args.capture}")
+    if args.replay:
+        replay = capture.ReplayServers(args.replay, latency=args.replay_latency).start()
+        atexit.register(replay.stop)
+        os.environ.update(replay.environ())
+        for var in capture.SECRET_VARS:
+            os.environ[var] = 'replay'
+        # Replayed rows must not end up in the real cache
+        result_cache = ResultCache(os.path.join(tempfile.mkdtemp(prefix='scrape-replay-'), 'scrape_cache.db'),
+                                   ttls=CACHE_TTLS, default_ttl=CACHE_DEFAULT_TTL, max_stale=CACHE_MAX_STALE)
+        print(f"Replaying {', '.join(replay.environ())} from {args.replay}")
 
     print(f"Testing scraper with part number: {part_no}")
 
@@ -323,7 +788,7 @@ if __name__ == "__main__":
     total_start = time.time()
     results_count = 0
     
-    for result in runScraper(part_no):
+    for result in runScraper(part_no, use_cache=use_cache):
         elapsed = time.time() - total_start
         print(f"[{elapsed:.2f}s] {result}")
         results_count += 1
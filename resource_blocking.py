@@ -0,0 +1,112 @@
+"""Per-supplier blocking of fonts, media and third-party widgets through DevTools"""
+import json
+import logging
+import os
+import threading
+import weakref
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv('BLOCK_RESOURCES', '1') != '0'  # Off: browsers load every resource again
+STATS_ENABLED = os.getenv('PAGE_LOAD_STATS', '1') != '0'  # Off: no performance log reads per page load
+
+# Patterns use Network.setBlockedURLs wildcards ('*' matches any run of characters)
+COMMON_BLOCKED_URLS = (
+    # Fonts and media (images are also disabled through Chrome prefs, this stops the requests)
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico', '*.mp4', '*.webm',
+    '*fonts.googleapis.com*', '*fonts.gstatic.com*', '*use.typekit.net*',
+    # Analytics, tag managers and ads
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*googlesyndication.com*',
+    '*googleadservices.com*', '*connect.facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+    '*bat.bing.com*', '*js-agent.newrelic.com*', '*nr-data.net*', '*cdn.segment.com*', '*snap.licdn.com*',
+    # Chat and support widgets
+    '*intercom.io*', '*intercomcdn.com*', '*zdassets.com*', '*zopim.com*', '*livechatinc.com*',
+    '*embed.tawk.to*', '*js.driftt.com*', '*js.hs-scripts.com*', '*js.hs-analytics.net*',
+)
+
+# Extra patterns for one supplier's site
+SUPPLIER_BLOCKED_URLS = {
+    'Pilkington': ('*.map', '*youtube.com*', '*ytimg.com*', '*player.vimeo.com*'),  # Heavy Angular SPA
+}
+
+# Common patterns a supplier's pages cannot do without
+SUPPLIER_ALLOWED_URLS = {
+    'Pilkington': ('*.svg',),  # Icon-only buttons collapse to 0x0 and fail visibility waits without their sprites
+}
+
+_applied = weakref.WeakKeyDictionary()  # driver -> supplier whose block list is active
+_pending = weakref.WeakKeyDictionary()  # driver -> request tallies since the last page load was flushed
+_lock = threading.Lock()
+
+
+def blocked_urls(supplier):
+    """Block list for supplier: common patterns plus its extras, minus its allowlist"""
+    allowed = set(SUPPLIER_ALLOWED_URLS.get(supplier, ()))
+    patterns = COMMON_BLOCKED_URLS + SUPPLIER_BLOCKED_URLS.get(supplier, ())
+    return [pattern for pattern in patterns if pattern not in allowed]
+
+
+def apply(driver, supplier):
+    """Install supplier's block list on a freshly leased driver (skipped when it is already active)"""
+    if not ENABLED:
+        return
+    with _lock:
+        if driver in _applied and _applied[driver] == supplier:
+            return
+    patterns = blocked_urls(supplier)
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+    except Exception as e:
+        logger.warning(f"Could not install {supplier} resource block list: {e}")
+        return
+    with _lock:
+        _applied[driver] = supplier
+    logger.debug(f"Blocking {len(patterns)} URL patterns for {supplier}")
+
+
+def network_events(driver):
+    """(method, params) of the DevTools network events logged since the last read"""
+    try:
+        entries = driver.get_log('performance')
+    except Exception:
+        return []  # Performance logging is off for this driver
+    events = []
+    for entry in entries:
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        events.append((message.get('method'), message.get('params', {})))
+    return events
+
+
+def track(driver, events):
+    """Add the requests in events to the driver's tallies for the current page load.
+
+    Blocked requests are counted, not sized: Chrome never downloads them.
+    """
+    with _lock:
+        tallies = _pending.get(driver)
+        if tallies is None:
+            tallies = _pending[driver] = {'loaded': 0, 'blocked': 0, 'failed': 0, 'bytes': 0}
+        for method, params in events:
+            if method == 'Network.loadingFinished':
+                tallies['loaded'] += 1
+                tallies['bytes'] += int(params.get('encodedDataLength') or 0)
+            elif method == 'Network.loadingFailed':
+                tallies['blocked' if params.get('blockedReason') else 'failed'] += 1
+
+
+def page_loaded(driver, supplier=None):
+    """Flush the driver's tallies as one page load of the current (or given) supplier"""
+    with _lock:
+        tallies = _pending.pop(driver, None)
+    if not tallies or not any(tallies.values()):
+        return
+    metrics.observe_page_load(tallies['loaded'], tallies['blocked'], tallies['failed'], tallies['bytes'], supplier)
+    logger.debug(f"Page load: {tallies['loaded']} requests ({tallies['bytes']} bytes), "
+                 f"{tallies['blocked']} blocked, {tallies['failed']} failed")
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_part_number(part_no):
+    """Canonical form of a part number used as the cache key"""
+    return "".join(str(part_no).split()).upper()
+
+
+class CacheEntry:
+    """Rows cached for one (supplier, part number) pair"""
+
+    def __init__(self, rows, fetched_at, ttl):
+        self.rows = rows
+        self.fetched_at = fetched_at
+        self.ttl = ttl
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+    @property
+    def is_fresh(self):
+        return self.age < self.ttl
+
+
+class ResultCache:
+    """SQLite-backed TTL cache of scraper results keyed by (supplier, part number).
+
+    Entries younger than the supplier's TTL are fresh. Older entries are still
+    returned (flagged stale) until ``max_stale`` seconds so the caller can serve
+    them while a refresh runs; after that they are treated as misses and purged.
+    """
+
+    def __init__(self, path, ttls=None, default_ttl=600, max_stale=24 * 3600):
+        self.path = path
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_stale = max_stale
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def ttl_for(self, supplier):
+        return self.ttls.get(supplier, self.default_ttl)
+
+    def get(self, supplier, part_no):
+        """Cached entry for supplier/part_no, or None if missing or too old to serve"""
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT payload, fetched_at FROM scrape_cache WHERE supplier = ? AND part_no = ?",
+                    (supplier, normalize_part_number(part_no)),
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache read failed for {supplier}/{part_no}: {e}")
+            return None
+
+        if row is None:
+            return None
+        payload, fetched_at = row
+        if time.time() - fetched_at >= self.max_stale:
+            return None
+        return CacheEntry(json.loads(payload), fetched_at, self.ttl_for(supplier))
+
+    def put(self, supplier, part_no, rows):
+        """Store rows for supplier/part_no and drop entries past max_stale"""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO scrape_cache (supplier, part_no, payload, fetched_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (supplier, normalize_part_number(part_no), json.dumps(rows), now),
+                )
+                conn.execute("DELETE FROM scrape_cache WHERE fetched_at < ?", (now - self.max_stale,))
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache write failed for {supplier}/{part_no}: {e}")
+
+    def invalidate(self, supplier=None, part_no=None):
+        """Remove cached entries, optionally narrowed to one supplier and/or part"""
+        query = "DELETE FROM scrape_cache WHERE 1 = 1"
+        params = []
+        if supplier is not None:
+            query += " AND supplier = ?"
+            params.append(supplier)
+        if part_no is not None:
+            query += " AND part_no = ?"
+            params.append(normalize_part_number(part_no))
+        try:
+            with self._connect() as conn:
+                conn.execute(query, params)
+        except sqlite3.Error as e:
+            logger.warning(f"Result cache invalidation failed: {e}")
+
+    def _connect(self):
+        # A short-lived connection per call keeps the cache safe to use from any thread
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS scrape_cache ("
+                        "supplier TEXT NOT NULL, "
+                        "part_no TEXT NOT NULL, "
+                        "payload TEXT NOT NULL, "
+                        "fetched_at REAL NOT NULL, "
+                        "PRIMARY KEY (supplier, part_no))"
+                    )
+                    conn.commit()
+                    self._initialized = True
+        return _ClosingConnection(conn)
+
+
+class _ClosingConnection:
+    """Context manager that commits (or rolls back) and then closes the connection"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        finally:
+            self._conn.close()
+        return False
+
+
+def default_cache_path():
+    """instance/scrape_cache.db, next to the Flask users.db"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'scrape_cache.db')
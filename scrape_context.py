@@ -0,0 +1,80 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-thread state for the supplier leg a scraper is currently running
+_local = threading.local()
+
+MIN_TIMEOUT = 0.1  # Shortest timeout handed out once a leg's deadline has passed
+
+
+class ScrapeCancelled(BaseException):
+    """Raised inside a scraper whose leg was cancelled (client gone or timed out).
+
+    A BaseException, like asyncio.CancelledError, so the scrapers' broad
+    ``except Exception`` retry loops do not swallow it.
+    """
+
+
+class ScrapeContext:
+    """State the orchestrator shares with a scraper running in an executor thread"""
+
+    def __init__(self, supplier, part_no, on_rows=None, recorder=None, deadline=None):
+        self.supplier = supplier
+        self.part_no = part_no
+        self.on_rows = on_rows  # Called with the rows found so far
+        self.recorder = recorder  # capture.Recorder while building replay bundles
+        self.deadline = deadline  # time.time() by which the leg must be done, or None
+        self.cancelled = threading.Event()  # Set when nobody wants the leg's result any more
+
+    def cancel(self):
+        """Ask the scraper to stop at its next wait or page load"""
+        self.cancelled.set()
+
+
+def current():
+    """ScrapeContext bound to this thread, or None outside of a supplier leg"""
+    return getattr(_local, 'context', None)
+
+
+@contextmanager
+def bind(context):
+    """Make context current for the duration of the block"""
+    previous = current()
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = previous
+
+
+def propagate(func):
+    """Wrap func so worker threads it is submitted to run with the caller's context bound"""
+    context = current()
+
+    def run(*args, **kwargs):
+        with bind(context):
+            return func(*args, **kwargs)
+    return run
+
+
+def check_cancelled():
+    """Raise ScrapeCancelled if the current leg has been cancelled"""
+    context = current()
+    if context is not None and context.cancelled.is_set():
+        raise ScrapeCancelled(f"{context.supplier} scrape for {context.part_no} was cancelled")
+
+
+def remaining(timeout):
+    """timeout, shortened to what is left of the current leg's deadline"""
+    context = current()
+    if context is None or context.deadline is None:
+        return timeout
+    return max(min(timeout, context.deadline - time.time()), MIN_TIMEOUT)
+
+
+def report_rows(rows):
+    """Stream the rows found so far to the client; a no-op when nobody is listening"""
+    context = current()
+    if context is not None and context.on_rows is not None:
+        context.on_rows(rows)
@@ -0,0 +1,180 @@
+"""Scrape worker service: processes that own the browsers and run queued searches.
+
+The web process enqueues searches in the SQLite job queue (SCRAPE_QUEUE=1)
+and streams the lines published here. Each worker process has its own
+driver pool and scraper loop and runs up to ``--jobs`` searches at once;
+the supervisor restarts worker processes that die. Queue mode is opt-in:
+stage, pool and breaker metrics are recorded in the worker processes, so
+the web process's /metrics only reports queue depth.
+
+    python scrape_worker.py --processes 2 --jobs 2
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from job_queue import JobQueue, default_queue_path
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.25  # Seconds between queue polls while idle
+HEARTBEAT_INTERVAL = 10  # Seconds between heartbeats for running jobs (well below JobQueue.stale_after)
+CANCEL_POLL_INTERVAL = 1  # Seconds between checks whether a running job's clients have all left
+RESTART_DELAY = 5  # Seconds before a dead worker process is replaced
+FINAL_STATUSES = (None, 'cached', 'refreshed', 'unavailable')  # Line statuses that settle a supplier's results
+
+
+def _supplier_line(line):
+    """(supplier, status) of a published NDJSON line; supplier is None for error lines"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None, None
+    supplier = next((key for key in data if key not in ('status', 'error')), None)
+    return supplier, data.get('status')
+
+
+def settled_suppliers(lines):
+    """Suppliers whose final line is among ``lines``"""
+    settled = set()
+    for line in lines:
+        supplier, status = _supplier_line(line)
+        if supplier is not None and status in FINAL_STATUSES:
+            settled.add(supplier)
+    return settled
+
+
+def run_job(queue, job, running, running_lock, slots):
+    """Run one search and publish its lines"""
+    import partScraper
+
+    start = time.time()
+    logger.info(f"Job {job.id}: searching {job.part_no} (attempt {job.attempts})")
+    try:
+        # Clients already have what an earlier attempt streamed; don't send those suppliers twice
+        settled = settled_suppliers(line for _, line in queue.read(job.id)[0]) if job.attempts > 1 else set()
+        if settled:
+            logger.info(f"Job {job.id}: {', '.join(sorted(settled))} already streamed by the previous attempt")
+        cancelled = False
+        checked_at = time.time()
+        # Blank keepalive lines wake us up to check for cancellation while the scrapers are busy
+        lines = partScraper.runScraper(job.part_no, use_cache=job.use_cache, keepalive=CANCEL_POLL_INTERVAL,
+                                       user=job.user)
+        try:
+            for line in lines:
+                if time.time() - checked_at >= CANCEL_POLL_INTERVAL:
+                    checked_at = time.time()
+                    if queue.cancelled(job.id):
+                        cancelled = True
+                        break
+                if not line or _supplier_line(line)[0] in settled:
+                    continue
+                queue.publish(job.id, line)
+        finally:
+            lines.close()  # Cancels the search still running, which cancels its legs' ScrapeContexts
+        queue.finish(job.id, cancelled=cancelled)
+        if cancelled:
+            logger.info(f"Job {job.id} cancelled after {time.time() - start:.2f}s: its clients have all left")
+        else:
+            logger.info(f"Job {job.id} finished in {time.time() - start:.2f}s")
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}")
+        try:
+            queue.finish(job.id, error=str(e))
+        except Exception as finish_error:
+            logger.error(f"Could not mark job {job.id} failed: {finish_error}")
+    finally:
+        with running_lock:
+            running.discard(job.id)
+        slots.release()
+
+
+def heartbeat(queue, running, running_lock):
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with running_lock:
+            job_ids = list(running)
+        try:
+            queue.heartbeat(job_ids)
+        except Exception as e:
+            logger.warning(f"Heartbeat failed: {e}")
+
+
+def work(jobs_per_process):
+    """Worker process main loop: claim jobs while a slot is free"""
+    import partScraper  # Loads the scrapers' dependencies once, before the first job
+
+    queue = JobQueue(default_queue_path())
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    running = set()  # Ids of the jobs this process is running
+    running_lock = threading.Lock()
+    slots = threading.Semaphore(jobs_per_process)
+    threading.Thread(target=heartbeat, args=(queue, running, running_lock), name="job-heartbeat",
+                     daemon=True).start()
+    partScraper.driver_pool.start()  # Warm browsers before the first job arrives
+    logger.info(f"Scrape worker {worker} ready for {jobs_per_process} concurrent jobs")
+
+    while True:
+        slots.acquire()
+        try:
+            job = queue.claim(worker)
+        except Exception as e:
+            logger.error(f"Could not claim a job: {e}")
+            job = None
+        if job is None:
+            slots.release()
+            time.sleep(POLL_INTERVAL)
+            continue
+        with running_lock:
+            running.add(job.id)
+        threading.Thread(target=run_job, args=(queue, job, running, running_lock, slots), name=f"job-{job.id}",
+                         daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run scrape worker processes fed by the job queue")
+    parser.add_argument('--processes', type=int, default=int(os.getenv('SCRAPE_WORKERS', 2)),
+                        help="worker processes, each with its own browsers (default $SCRAPE_WORKERS or 2)")
+    parser.add_argument('--jobs', type=int, default=2, help="concurrent searches per worker process")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+
+    os.environ['SCRAPING_PROCESSES'] = str(args.processes)  # Workers share supplier limits when there are several
+    context = multiprocessing.get_context('spawn')  # Fresh interpreters: no threads or browsers inherited
+    processes = {}
+    stopping = threading.Event()
+
+    def stop(sig, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while not stopping.is_set():
+        for index in range(args.processes):
+            process = processes.get(index)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                logger.warning(f"Scrape worker {index} exited with {process.exitcode}, restarting")
+                time.sleep(RESTART_DELAY)
+            process = context.Process(target=work, args=(args.jobs,), name=f"scrape-worker-{index}", daemon=True)
+            process.start()
+            processes[index] = process
+        stopping.wait(1)
+
+    logger.info("Stopping scrape workers")
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()  # End-of-stream marker on a request's result queue
+
+
+class ScraperLoop:
+    """One long-lived asyncio event loop, on a daemon thread, shared by every search.
+
+    Request threads hand it async generators through ``stream`` and read the
+    items back from a thread-safe queue, so pools, caches and in-flight scrape
+    coalescing all live on a single loop instead of one loop per request.
+    Blocking work (Selenium, HTTP, SQLite) goes to ``executor``, a dedicated
+    thread pool sized for the scrapers rather than asyncio's default one.
+    """
+
+    def __init__(self, max_workers, name="scraper-loop"):
+        self.name = name
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._active = 0  # Streams currently being consumed
+
+    def start(self):
+        """Start the loop thread (idempotent); returns the running loop"""
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(self.executor)
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            self._loop = loop
+            logger.info(f"Started {self.name} with {self.max_workers} executor threads")
+            return loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop; returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def stream(self, agen, idle_timeout=None, idle_item=None):
+        """Drive an async generator on the loop and yield its items in the calling thread.
+
+        Exceptions raised by the generator are re-raised here. If the caller
+        stops iterating early (client disconnected), the generator's task is
+        cancelled. With ``idle_timeout``, ``idle_item`` is yielded whenever
+        the generator produces nothing for that many seconds.
+        """
+        results = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    results.put(item)
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(_DONE)
+
+        future = self.submit(pump())
+        with self._lock:
+            self._active += 1
+        try:
+            while True:
+                try:
+                    item = results.get(timeout=idle_timeout)
+                except queue.Empty:
+                    yield idle_item
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            with self._lock:
+                self._active -= 1
+            if not future.done():
+                future.cancel()  # run_coroutine_threadsafe futures cancel the task on the loop
+
+    def active_streams(self):
+        with self._lock:
+            return self._active
+
+    def stop(self):
+        """Stop the loop without waiting for executor work.
+
+        Queued executor jobs are cancelled; ones already running are left to
+        finish on their own (the pool's atexit hook still joins them).
+        """
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join(timeout=5)
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Coalesces concurrent work for the same (group, key) onto one execution.
+
+    The first caller for a key becomes the leader and runs the work; everyone
+    else gets the leader's future. Finished keys stay joinable while any other
+    key in the same group is still running, so a late joiner replays results
+    that already completed instead of starting them again. A group is dropped
+    once all of its keys are done.
+
+    Futures are ``concurrent.futures.Future`` objects so callers running on
+    different threads or event loops can share them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}  # group -> {key: Future}
+
+    def join(self, group, key):
+        """Return (future, is_leader) for group/key"""
+        with self._lock:
+            flights = self._groups.setdefault(group, {})
+            future = flights.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            future.set_running_or_notify_cancel()
+            flights[key] = future
+            return future, True
+
+    def resolve(self, group, key, result):
+        """Publish the leader's result to every follower"""
+        with self._lock:
+            future = self._groups.get(group, {}).get(key)
+        if future is not None and not future.done():
+            future.set_result(result)
+        self._prune(group)
+
+    def abandon(self, group, key, exc):
+        """Leader gave up: wake followers with exc and let the next caller lead"""
+        with self._lock:
+            flights = self._groups.get(group, {})
+            future = flights.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(exc)
+        self._prune(group)
+
+    def in_flight(self):
+        """Number of keys currently being worked on"""
+        with self._lock:
+            return sum(1 for flights in self._groups.values()
+                       for future in flights.values() if not future.done())
+
+    def _prune(self, group):
+        with self._lock:
+            flights = self._groups.get(group)
+            if flights is not None and all(future.done() for future in flights.values()):
+                del self._groups[group]
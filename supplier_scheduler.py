@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class SupplierLimiter:
+    """Admission for one supplier's legs: a cap on legs in flight plus a token bucket on leg starts.
+
+    Legs that cannot start yet queue per user and are admitted round-robin
+    across users, so one user's burst of searches cannot starve everyone
+    else. Lives on the scraper loop; not thread-safe.
+
+    With ``shared`` (a JobQueue) the same limits are also enforced across
+    every process using its database: a leg admitted locally then starts a
+    leg there, polling while other processes hold the supplier's slots or
+    tokens. Those SQLite calls run in the loop's default executor, never on
+    the loop itself.
+    """
+
+    def __init__(self, name, max_in_flight, per_minute, shared=None):
+        self.name = name
+        self.max_in_flight = max(max_in_flight, 1)
+        self.rate = per_minute / 60.0  # Tokens added per second
+        self.burst = self.max_in_flight  # Bucket size
+        self.tokens = float(self.burst)
+        self.in_flight = 0
+        self._refilled_at = time.monotonic()
+        self._waiters = OrderedDict()  # user -> deque of futures, in round-robin order
+        self._wakeup = None  # Timer handle waiting for the next token
+        self.shared = shared
+
+    def queued(self):
+        # Also read from the metrics thread, hence the copies
+        return sum(1 for waiters in list(self._waiters.values()) for future in list(waiters) if not future.done())
+
+    async def acquire(self, user=None):
+        """Wait for a slot (and a token) for user's next leg; True if a shared leg was started for it"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user, deque()).append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_local()  # Granted just as we gave up
+            raise
+        if self.shared is None:
+            return False
+        try:
+            return await self._start_shared()
+        except BaseException:
+            self._release_local()
+            raise
+
+    def release(self, shared_leg=False):
+        """End a leg; ``shared_leg`` is what acquire returned for it"""
+        if shared_leg:
+            asyncio.get_running_loop().run_in_executor(None, self._finish_shared)
+        self._release_local()
+
+    def _release_local(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _dispatch(self):
+        self._refill()
+        while self.in_flight < self.max_in_flight and self._has_waiters():
+            if self.tokens < 1:
+                self._schedule_wakeup((1 - self.tokens) / self.rate if self.rate > 0 else 1)
+                return
+            self.tokens -= 1
+            self.in_flight += 1
+            self._next_waiter().set_result(None)
+
+    async def _start_shared(self):
+        """Start the leg in the shared limits, waiting while other processes hold them; False if unavailable"""
+        loop = asyncio.get_running_loop()
+        while True:
+            attempt = loop.run_in_executor(None, self._try_start_shared)
+            try:
+                wait = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                def finish_if_started(attempt):
+                    # The attempt ran on; a leg it started after all is nobody's now
+                    if not attempt.cancelled() and attempt.result() == 0:
+                        loop.run_in_executor(None, self._finish_shared)
+                attempt.add_done_callback(finish_if_started)
+                raise
+            if wait is None:
+                return False
+            if wait == 0:
+                return True
+            await asyncio.sleep(wait)
+
+    def _try_start_shared(self):
+        """0 once the leg is started in the shared limits, seconds to wait, or None if they are unavailable"""
+        try:
+            return self.shared.start_leg(self.name, self.max_in_flight, self.rate * 60)
+        except Exception as e:
+            logger.warning(f"Shared {self.name} leg limits unavailable, admitting on local limits: {e}")
+            return None
+
+    def _finish_shared(self):
+        try:
+            self.shared.finish_leg(self.name)
+        except Exception as e:
+            logger.warning(f"Could not finish shared {self.name} leg: {e}")
+
+    def _has_waiters(self):
+        """Drop waiters that were cancelled or timed out while queued; True if any are left"""
+        for user in list(self._waiters):
+            waiters = self._waiters[user]
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if not waiters:
+                del self._waiters[user]
+        return bool(self._waiters)
+
+    def _next_waiter(self):
+        """Pop the oldest waiter of the next user in round-robin order"""
+        user, waiters = next(iter(self._waiters.items()))
+        future = waiters.popleft()
+        self._waiters.move_to_end(user)  # That user goes to the back of the line
+        if not waiters:
+            del self._waiters[user]
+        return future
+
+    def _schedule_wakeup(self, delay):
+        if self._wakeup is not None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def wakeup():
+            self._wakeup = None
+            self._dispatch()
+        self._wakeup = loop.call_later(delay, wakeup)
+
+
+class SupplierScheduler:
+    """SupplierLimiter per supplier, created on first use from ``limits`` {name: (max in flight, legs per minute)}"""
+
+    def __init__(self, limits, default, shared=None):
+        self.limits = limits
+        self.default = default
+        self.shared = shared
+        self._limiters = {}
+
+    def limiter(self, name):
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = self._limiters[name] = SupplierLimiter(name, *self.limits.get(name, self.default),
+                                                             shared=self.shared)
+        return limiter
+
+    @asynccontextmanager
+    async def slot(self, name, user=None, timeout=None):
+        """Hold one of the supplier's leg slots; raises asyncio.TimeoutError if none frees up within timeout"""
+        limiter = self.limiter(name)
+        shared_leg = await asyncio.wait_for(limiter.acquire(user), timeout)
+        try:
+            yield
+        finally:
+            limiter.release(shared_leg)
+
+    def snapshot(self):
+        """{supplier: (legs in flight, legs queued)}"""
+        return {name: (limiter.in_flight, limiter.queued()) for name, limiter in list(self._limiters.items())}
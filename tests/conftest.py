@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))  # Fake driver and supplier stubs
+
+import http_fastpath
+
+
+@pytest.fixture(autouse=True)
+def no_fast_path(monkeypatch):
+    # Everything goes through the fake driver; nothing may reach the network
+    monkeypatch.setattr(http_fastpath, 'ENABLED', False)
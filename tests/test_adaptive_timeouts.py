@@ -0,0 +1,40 @@
+from adaptive_timeouts import AdaptiveTimeouts
+
+
+def test_default_until_enough_samples():
+    timeouts = AdaptiveTimeouts(20, 150, min_samples=5)
+    for _ in range(4):
+        timeouts.record('IGC', 1)
+    assert timeouts.timeout_for('IGC', 90) == 90
+    assert timeouts.timeout_for('PGW', 90) == 90
+
+
+def test_percentile_times_margin_plus_padding():
+    timeouts = AdaptiveTimeouts(1, 150, percentile=90, margin=1.5, padding=5, min_samples=10)
+    for seconds in range(1, 11):
+        timeouts.record('IGC', seconds * 10)
+    assert timeouts.timeout_for('IGC', 90) == 90 * 1.5 + 5
+
+
+def test_clamped_to_bounds():
+    timeouts = AdaptiveTimeouts(20, 150, min_samples=1)
+    timeouts.record('IGC', 1)
+    timeouts.record('PGW', 500)
+    assert timeouts.timeout_for('IGC', 90) == 20
+    assert timeouts.timeout_for('PGW', 90) == 150
+    assert timeouts.timeout_for('Pilkington', 500) == 150
+
+
+def test_window_forgets_old_legs():
+    timeouts = AdaptiveTimeouts(1, 1000, percentile=100, margin=1, padding=0, window=5, min_samples=5)
+    timeouts.record('IGC', 400)
+    for _ in range(5):
+        timeouts.record('IGC', 10)
+    assert timeouts.timeout_for('IGC', 90) == 10
+
+
+def test_snapshot_reports_last_budget_and_window():
+    timeouts = AdaptiveTimeouts(20, 150, min_samples=5)
+    timeouts.record('IGC', 30)
+    timeouts.timeout_for('IGC', 90)
+    assert timeouts.snapshot() == {'IGC': (90, 1)}
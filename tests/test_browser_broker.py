@@ -0,0 +1,39 @@
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import pytest
+
+from browser_broker import BrokerClient, create_authkey
+from driver_pool import PoolExhausted
+
+
+def serve_snapshot(address, delay):
+    """A broker stand-in that starts listening after ``delay`` seconds and answers one snapshot"""
+    def run():
+        time.sleep(delay)
+        with Listener(address, family='AF_UNIX', authkey=create_authkey(address)) as listener:
+            with listener.accept() as conn:
+                conn.recv()
+                conn.send(('ok', {'idle': 1}))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_client_waits_for_a_starting_broker(tmp_path):
+    address = str(tmp_path / 'broker.sock')
+    broker = serve_snapshot(address, delay=0.3)
+    client = BrokerClient(address, connect_timeout=5)
+    assert client.snapshot()['idle'] == 1
+    broker.join(1)
+    client.close()
+
+
+def test_client_gives_up_after_connect_timeout(tmp_path):
+    client = BrokerClient(str(tmp_path / 'broker.sock'), connect_timeout=0.2)
+    start = time.time()
+    with pytest.raises(PoolExhausted):
+        client.snapshot()
+    assert time.time() - start < 2
@@ -0,0 +1,111 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakers
+
+
+class Clock:
+    """Stands in for time.time() so reset and probe timeouts pass instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'time', clock)
+    return clock
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats == {'opened': 1, 'rejected': 1, 'probes': 0}
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=1, reset_timeout=60)
+    open_breaker(breaker)
+    clock.now += 59
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=3, reset_timeout=60)
+    open_breaker(breaker)
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened_at == clock.now
+    assert not breaker.allow()
+    assert breaker.stats['opened'] == 2
+
+
+def test_inconclusive_probe_is_retried_at_once(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=1, reset_timeout=60)
+    open_breaker(breaker)
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_inconclusive()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert breaker.stats['probes'] == 2
+
+
+def test_lost_probe_is_replaced_after_probe_timeout(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=1, reset_timeout=60, probe_timeout=300)
+    open_breaker(breaker)
+    clock.now += 60
+    assert breaker.allow()
+    clock.now += 299
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_inconclusive_while_closed_changes_nothing(clock):
+    breaker = CircuitBreaker('IGC', failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_inconclusive()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_breakers_are_per_supplier():
+    breakers = CircuitBreakers(failure_threshold=1)
+    breakers.get('IGC').record_failure()
+    assert breakers.get('IGC') is breakers.get('IGC')
+    assert breakers.get('IGC').state == OPEN
+    assert breakers.get('PGW').state == CLOSED
+    assert set(breakers.all()) == {'IGC', 'PGW'}
@@ -0,0 +1,121 @@
+import json
+import time
+
+import pytest
+
+from job_queue import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'scrape_jobs.db'), stale_after=0.2, max_attempts=2)
+
+
+def status(queue, job_id):
+    return queue.read(job_id)[1]
+
+
+def test_claim_takes_the_oldest_queued_job(queue):
+    first = queue.enqueue('2000', user='alice')
+    second = queue.enqueue('3000', use_cache=False)
+    job = queue.claim('worker-1')
+    assert (job.id, job.part_no, job.use_cache, job.attempts, job.user) == (first, '2000', True, 1, 'alice')
+    assert status(queue, first) == RUNNING
+    assert queue.claim('worker-2').id == second
+    assert queue.claim('worker-3') is None
+
+
+def test_same_part_joins_the_unfinished_job(queue):
+    job_id = queue.enqueue('2000')
+    assert queue.enqueue(' 2000 ') == job_id
+    assert queue.enqueue('2000', use_cache=False) != job_id
+    queue.claim('worker-1')
+    assert queue.enqueue('2000') == job_id
+    queue.finish(job_id)
+    assert queue.enqueue('2000') != job_id
+
+
+def test_published_lines_are_streamed_until_done(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    queue.publish(job_id, json.dumps({'IGC': []}))
+    queue.finish(job_id)
+    assert list(queue.stream(job_id, poll_interval=0.01)) == [json.dumps({'IGC': []})]
+    assert status(queue, job_id) == DONE
+
+
+def test_failed_job_streams_its_error(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    queue.finish(job_id, error="boom")
+    assert list(queue.stream(job_id, poll_interval=0.01)) == [json.dumps({'error': "boom"})]
+    assert status(queue, job_id) == FAILED
+
+
+def test_heartbeat_keeps_a_running_job(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    for _ in range(3):
+        time.sleep(0.1)
+        queue.heartbeat([job_id])
+    assert queue.claim('worker-2') is None
+    assert status(queue, job_id) == RUNNING
+
+
+def test_stale_job_is_retried_then_failed(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    time.sleep(0.3)
+    retry = queue.claim('worker-2')
+    assert (retry.id, retry.attempts) == (job_id, 2)
+    time.sleep(0.3)
+    assert queue.claim('worker-3') is None
+    assert status(queue, job_id) == FAILED
+    assert queue.read(job_id)[0][-1][1] == json.dumps({'error': "Scrape worker stopped responding"})
+
+
+def test_last_subscriber_leaving_drops_a_queued_job(queue):
+    job_id = queue.enqueue('2000')
+    queue.enqueue('2000')
+    queue.unsubscribe(job_id)
+    assert status(queue, job_id) == QUEUED
+    queue.unsubscribe(job_id)
+    assert status(queue, job_id) == CANCELLED
+    assert queue.claim('worker-1') is None
+    assert queue.enqueue('2000') != job_id
+
+
+def test_last_subscriber_leaving_cancels_a_running_job(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    assert not queue.cancelled(job_id)
+    queue.unsubscribe(job_id)
+    assert queue.cancelled(job_id)
+    assert status(queue, job_id) == RUNNING  # Until its worker notices
+    queue.finish(job_id, cancelled=True)
+    assert status(queue, job_id) == CANCELLED
+
+
+def test_closing_a_stream_unsubscribes(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    stream = queue.stream(job_id, keepalive=0)
+    assert next(stream) == ''
+    stream.close()
+    assert queue.cancelled(job_id)
+
+
+def test_cancelled_stale_job_is_not_retried(queue):
+    job_id = queue.enqueue('2000')
+    queue.claim('worker-1')
+    queue.unsubscribe(job_id)
+    time.sleep(0.3)
+    assert queue.claim('worker-2') is None
+    assert status(queue, job_id) == CANCELLED
+
+
+def test_depth(queue):
+    queue.enqueue('2000')
+    queue.enqueue('3000')
+    queue.claim('worker-1')
+    assert queue.depth() == {QUEUED: 1, RUNNING: 1}
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+
+import partScraper
+import result_cache
+from circuit_breaker import CircuitBreakers
+from result_cache import ResultCache, normalize_part_number
+
+SUPPLIERS = ('IGC', 'PGW', 'Pilkington', 'MyGrant')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'scrape_cache.db'), ttls={'IGC': 60}, default_ttl=600, max_stale=3600)
+
+
+def test_normalize_part_number():
+    assert normalize_part_number(' fw 02000 gty ') == 'FW02000GTY'
+
+
+def test_miss_then_fresh_hit(cache):
+    assert cache.get('IGC', '2000') is None
+    cache.put('IGC', '2000', [{'Part Number': 'FW02000GTY'}])
+    entry = cache.get('IGC', ' 2000 ')
+    assert entry.rows == [{'Part Number': 'FW02000GTY'}]
+    assert entry.is_fresh
+
+
+def test_stale_after_ttl_then_gone_after_max_stale(cache, clock):
+    cache.put('IGC', '2000', [{'Part Number': 'FW02000GTY'}])
+    cache.put('PGW', '2000', [{'Part Number': 'FW2000GTY'}])
+    clock.now += 60
+    assert not cache.get('IGC', '2000').is_fresh  # Past IGC's own TTL, still served
+    assert cache.get('PGW', '2000').is_fresh  # Default TTL
+    clock.now += 3600
+    assert cache.get('IGC', '2000') is None
+
+
+def test_refresh_makes_a_stale_entry_fresh(cache, clock):
+    cache.put('IGC', '2000', [{'Part Number': 'old'}])
+    clock.now += 120
+    assert not cache.get('IGC', '2000').is_fresh
+    cache.put('IGC', '2000', [{'Part Number': 'new'}])
+    entry = cache.get('IGC', '2000')
+    assert entry.is_fresh and entry.rows == [{'Part Number': 'new'}]
+
+
+def test_put_purges_entries_past_max_stale(cache, clock):
+    cache.put('IGC', '2000', [{'Part Number': 'FW02000GTY'}])
+    clock.now += 3601
+    cache.put('IGC', '3000', [{'Part Number': 'FW03000GTY'}])
+    with cache._connect() as conn:
+        assert conn.execute("SELECT part_no FROM scrape_cache").fetchall() == [('3000',)]
+
+
+def test_invalidate(cache):
+    for supplier in SUPPLIERS:
+        cache.put(supplier, '2000', [{'Part Number': supplier}])
+    cache.invalidate('IGC')
+    assert cache.get('IGC', '2000') is None
+    assert cache.get('PGW', '2000') is not None
+    cache.invalidate(part_no='2000')
+    assert all(cache.get(supplier, '2000') is None for supplier in SUPPLIERS)
+
+
+def search_lines(part_no):
+    async def collect():
+        return [json.loads(line) async for line in partScraper.run_scrapers_concurrently(part_no)]
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def stale_search(tmp_path, monkeypatch):
+    """Every supplier cached but stale; live legs return the rows in ``refreshed``"""
+    cache = ResultCache(str(tmp_path / 'scrape_cache.db'), default_ttl=0)
+    for supplier in SUPPLIERS:
+        cache.put(supplier, '2000', [{'Part Number': f'{supplier} stale'}])
+    refreshed = {supplier: [{'Part Number': f'{supplier} live'}] for supplier in SUPPLIERS}
+    scraped = []
+
+    async def coalesced_scrape(part_no, scraper_class, keys, name, timeout, fast_path=None, on_rows=None,
+                               user=None):
+        scraped.append(name)
+        return {name: refreshed[name]}
+
+    monkeypatch.setattr(partScraper, 'result_cache', cache)
+    monkeypatch.setattr(partScraper, 'supplier_breakers', CircuitBreakers())
+    monkeypatch.setattr(partScraper, 'coalesced_scrape', coalesced_scrape)
+    return refreshed, scraped
+
+
+def test_stale_rows_are_served_then_refreshed(stale_search):
+    refreshed, scraped = stale_search
+    lines = search_lines('2000')
+    assert lines[:4] == [{supplier: [{'Part Number': f'{supplier} stale'}], 'status': 'stale'}
+                         for supplier in SUPPLIERS]
+    assert sorted(map(json.dumps, lines[4:])) == sorted(
+        json.dumps({supplier: [{'Part Number': f'{supplier} live'}], 'status': 'refreshed'})
+        for supplier in SUPPLIERS)
+    assert sorted(scraped) == sorted(SUPPLIERS)
+
+
+def test_empty_refresh_keeps_the_stale_rows(stale_search):
+    refreshed, _ = stale_search
+    refreshed['IGC'] = []
+    lines = search_lines('2000')
+    assert {'IGC': [{'Part Number': 'IGC stale'}], 'status': 'stale'} in lines
+    assert not any('IGC' in line and line['status'] == 'refreshed' for line in lines)
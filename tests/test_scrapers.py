@@ -0,0 +1,251 @@
+import logging
+import threading
+import time
+
+import pytest
+from selenium.common.exceptions import TimeoutException
+
+import http_fastpath
+import scrape_context
+from circuit_breaker import SupplierUnavailable
+from driver_pool import mark_session_fresh
+from http_fastpath import FastPathUnavailable
+from fake_driver import FakeDriver, PagesTransport, StubTransport
+from scrape_context import ScrapeContext
+from stub_server import IGCStub, MyGrantStub, PGWStub, PilkingtonStub, _price
+from Scrapers import igc_scraper, mygrant_scraper, pilkington_scraper, pwg_scraper
+
+PART_NO = '2000'
+DOWN_PAGES = {'/': "<html><body><p>Down for maintenance</p></body></html>"}
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def forget_logins(monkeypatch):
+    # Module-level login state would carry one test's session into the next
+    monkeypatch.setattr(igc_scraper, '_login_session', None)
+    monkeypatch.setattr(mygrant_scraper, '_mygrant_cookies', None)
+
+
+def logged_in_driver(stub, supplier):
+    """Fake driver whose stub session cookie is set and whose pooled login is trusted"""
+    driver = FakeDriver(StubTransport(stub))
+    driver.add_cookie({'name': stub.cookie, 'value': '1'})
+    mark_session_fresh(driver, supplier)
+    return driver
+
+
+def short_leg(supplier, seconds=1):
+    """Bind a leg whose deadline caps every wait, so failing searches give up quickly"""
+    return scrape_context.bind(ScrapeContext(supplier, PART_NO, deadline=time.time() + seconds))
+
+
+# Parsers
+
+def test_igc_parse_search_results():
+    html = IGCStub().render('results.html', part_no=PART_NO)
+    assert igc_scraper.parse_search_results(html, PART_NO) == [
+        'FW02000GTY', 'FW02000GTYN', 'FW02000GBYH', 'DW02000GTY']
+
+
+def test_igc_parse_part_detail():
+    html = IGCStub().render('detail.html', part='FW02000GTY', price='201.50')
+    assert igc_scraper.parse_part_detail(html, 'FW02000GTY') == ['FW02000GTY', 'Yes', '$201.50', 'Opa-Locka Warehouse']
+
+
+def test_pgw_parse_search_results():
+    html = PGWStub().render('results.html', part_no=PART_NO)
+    location, parts, pending_checks = pwg_scraper.parse_search_results(html, PART_NO)
+    assert location == 'Miami, FL'
+    assert [part[0] for part in parts] == ['FW2000GTY', 'FW2000GTYN', 'FW2000GBYH']
+    assert parts[0][1:] == ['Check', 'See website for pricing', 'Miami, FL', 'Windshield -  Green Tint']
+    assert pending_checks == 3
+
+
+def test_pgw_parse_search_results_skips_other_parts():
+    html = PGWStub().render('results.html', part_no=PART_NO)
+    assert pwg_scraper.parse_search_results(html, '9999')[1] == []
+
+
+def test_pilkington_parse_search_results():
+    html = PilkingtonStub().render('results.html', part_no=PART_NO)
+    location, parts = pilkington_scraper.parse_search_results(html)
+    assert location == 'Miami, FL'
+    assert parts == [
+        ['FW02000GTY', 'Windshield Green Tint', '$201.50', 'Miami, FL'],
+        ['FW02000GTYN', 'Windshield Green Tint Rain Sensor', '$244.10', 'Miami, FL'],
+        ['FW02000GBYH', 'Windshield Solar Heated', '$298.75', 'Miami, FL'],
+    ]
+
+
+def test_pilkington_parse_search_results_without_table():
+    assert pilkington_scraper.parse_search_results(DOWN_PAGES['/']) == (None, [])
+
+
+def test_mygrant_parse_search_results():
+    html = MyGrantStub().render('results.html', part_no=PART_NO)
+    assert mygrant_scraper.parse_search_results(html) == [
+        ['FW02000GTY', 'Yes', '$188.00', 'Miami, FL'],
+        ['FW02000GTYN', 'No', '$231.00', 'Miami, FL'],
+        ['FW02000GBYH', 'Yes', '$276.00', 'Orlando, FL'],
+    ]
+
+
+def test_mygrant_parse_search_results_no_results_and_unknown_page():
+    assert mygrant_scraper.parse_search_results("<html><body><div>No results found</div></body></html>") == []
+    assert mygrant_scraper.parse_search_results(DOWN_PAGES['/']) is None
+
+
+# Search flows on a pooled (already logged in) driver
+
+def test_igc_search():
+    rows = igc_scraper.IGCScraper(PART_NO, logged_in_driver(IGCStub(), 'IGC'), logger)
+    assert [row[0] for row in rows] == ['FW02000GTY', 'FW02000GTYN', 'FW02000GBYH', 'DW02000GTY']
+    assert rows[0] == ['FW02000GTY', 'Yes', f"${_price('FW02000GTY')}", 'Opa-Locka Warehouse']
+
+
+def test_pgw_search():
+    rows = pwg_scraper.PWGScraper(PART_NO, logged_in_driver(PGWStub(), 'PGW'), logger)
+    assert [row[0] for row in rows] == ['FW2000GTY', 'FW2000GTYN', 'FW2000GBYH']
+
+
+def test_pilkington_search():
+    rows = pilkington_scraper.PilkingtonScraper(PART_NO, logged_in_driver(PilkingtonStub(), 'Pilkington'), logger)
+    assert [row[0] for row in rows] == ['FW02000GTY', 'FW02000GTYN', 'FW02000GBYH']
+
+
+def test_mygrant_search():
+    rows = mygrant_scraper.MyGrantScraper(PART_NO, logged_in_driver(MyGrantStub(), 'MyGrant'), logger)
+    assert [row[0] for row in rows] == ['FW02000GTY', 'FW02000GTYN', 'FW02000GBYH']
+
+
+# HTTP fast paths
+
+class FakeResponse:
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+
+
+def pgw_http(monkeypatch, results_html):
+    """Serve PGW's search form and then results_html to the HTTP fast path"""
+    search = FakeResponse(pwg_scraper.SEARCH_URL, PGWStub().render('search.html'))
+    monkeypatch.setattr(http_fastpath, 'fetch', lambda supplier, url, **kwargs: search)
+    monkeypatch.setattr(http_fastpath, 'submit_form',
+                        lambda supplier, response, form, fields: FakeResponse(search.url, results_html))
+
+
+def test_pgw_http_search_without_matching_parts_is_empty(monkeypatch):
+    pgw_http(monkeypatch, PGWStub().render('results.html', part_no=PART_NO))
+    assert pwg_scraper.http_search('9999', logger) == []
+
+
+def test_pgw_http_search_falls_back_on_unexpected_page(monkeypatch):
+    pgw_http(monkeypatch, DOWN_PAGES['/'])
+    with pytest.raises(FastPathUnavailable):
+        pwg_scraper.http_search(PART_NO, logger)
+
+
+def test_pgw_http_search_leaves_pending_checks_to_the_browser(monkeypatch):
+    pgw_http(monkeypatch, PGWStub().render('results.html', part_no=PART_NO))
+    with pytest.raises(FastPathUnavailable):
+        pwg_scraper.http_search(PART_NO, logger)
+
+
+# IGC detail pages over HTTP
+
+DETAIL_PARTS = ['FW02000GTY', 'FW02000GTYN', 'FW02000GBYH', 'DW02000GTY']
+
+
+def detail_row(part_number, source='http'):
+    return [part_number, 'Yes', source, 'Opa-Locka Warehouse']
+
+
+def test_igc_detail_error_only_loses_that_part(monkeypatch):
+    def http_part_detail(part_number):
+        if part_number == 'FW02000GTYN':
+            raise RuntimeError("unparseable detail page")
+        return detail_row(part_number)
+
+    monkeypatch.setattr(igc_scraper, 'http_part_detail', http_part_detail)
+    assert igc_scraper.fetch_part_details(DETAIL_PARTS) == [
+        detail_row(part) for part in DETAIL_PARTS if part != 'FW02000GTYN']
+
+
+def test_igc_detail_fallback_only_refetches_unfinished_parts(monkeypatch):
+    released = threading.Event()
+
+    def http_part_detail(part_number):
+        if part_number == 'FW02000GTY':
+            return detail_row(part_number)
+        if part_number == 'FW02000GTYN':
+            time.sleep(0.1)
+            raise FastPathUnavailable("no exported session")
+        released.wait(1)  # Still in flight when the fallback starts
+        return detail_row(part_number)
+
+    browser_fetches = []
+
+    def process_part_detail(driver, part_number):
+        browser_fetches.append(part_number)
+        return detail_row(part_number, 'browser')
+
+    monkeypatch.setattr(igc_scraper, 'http_part_detail', http_part_detail)
+    monkeypatch.setattr(igc_scraper, 'process_part_detail', process_part_detail)
+    start = time.time()
+    try:
+        rows = igc_scraper.fetch_part_details(DETAIL_PARTS, driver=object())
+    finally:
+        released.set()
+    assert time.time() - start < 0.9  # Did not wait for the fetches the browser redoes
+    assert browser_fetches == DETAIL_PARTS[1:]
+    assert rows == [detail_row(DETAIL_PARTS[0])] + [detail_row(part, 'browser') for part in DETAIL_PARTS[1:]]
+
+
+def test_igc_detail_without_http_or_driver_raises(monkeypatch):
+    def http_part_detail(part_number):
+        raise FastPathUnavailable("no exported session")
+
+    monkeypatch.setattr(igc_scraper, 'http_part_detail', http_part_detail)
+    with pytest.raises(FastPathUnavailable):
+        igc_scraper.fetch_part_details(DETAIL_PARTS)
+
+
+# Search flows through the stub login (Pilkington's login form is driven by JavaScript, which FakeDriver skips)
+
+@pytest.mark.parametrize('scraper, stub', [
+    (igc_scraper.IGCScraper, IGCStub),
+    (pwg_scraper.PWGScraper, PGWStub),
+    (mygrant_scraper.MyGrantScraper, MyGrantStub),
+])
+def test_search_logs_in_first(scraper, stub):
+    stub = stub()
+    driver = FakeDriver(StubTransport(stub))
+    assert len(scraper(PART_NO, driver, logger)) >= 3
+    assert driver.get_cookie(stub.cookie) is not None
+
+
+# Supplier down: a failed leg for the circuit breaker, not an empty result
+
+@pytest.mark.parametrize('scraper, supplier', [
+    (igc_scraper.IGCScraper, 'IGC'),
+    (mygrant_scraper.MyGrantScraper, 'MyGrant'),
+])
+def test_login_failure_raises_supplier_unavailable(scraper, supplier):
+    with short_leg(supplier), pytest.raises(SupplierUnavailable):
+        scraper(PART_NO, FakeDriver(PagesTransport(DOWN_PAGES)), logger)
+
+
+def test_pgw_unusable_search_form_raises_supplier_unavailable():
+    driver = FakeDriver(PagesTransport(DOWN_PAGES))
+    mark_session_fresh(driver, 'PGW')
+    with short_leg('PGW'), pytest.raises(SupplierUnavailable):
+        pwg_scraper.PWGScraper(PART_NO, driver, logger)
+
+
+def test_pilkington_unknown_page_times_out():
+    driver = FakeDriver(PagesTransport(DOWN_PAGES))
+    mark_session_fresh(driver, 'Pilkington')
+    with short_leg('Pilkington'), pytest.raises(TimeoutException):
+        pilkington_scraper.PilkingtonScraper(PART_NO, driver, logger)
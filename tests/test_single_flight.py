@@ -0,0 +1,53 @@
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_followers_share_the_leaders_result():
+    flights = SingleFlight()
+    leader, is_leader = flights.join('2000', 'IGC')
+    follower, is_follower_leader = flights.join('2000', 'IGC')
+    assert is_leader and not is_follower_leader
+    assert follower is leader
+    assert flights.in_flight() == 1
+    flights.resolve('2000', 'IGC', ['row'])
+    assert follower.result(timeout=0) == ['row']
+    assert flights.in_flight() == 0
+
+
+def test_keys_and_groups_are_independent():
+    flights = SingleFlight()
+    _, igc_leader = flights.join('2000', 'IGC')
+    _, pgw_leader = flights.join('2000', 'PGW')
+    _, other_part_leader = flights.join('3000', 'IGC')
+    assert igc_leader and pgw_leader and other_part_leader
+    assert flights.in_flight() == 3
+
+
+def test_finished_key_is_replayed_while_its_group_runs():
+    flights = SingleFlight()
+    flights.join('2000', 'IGC')
+    flights.join('2000', 'PGW')
+    flights.resolve('2000', 'IGC', ['igc row'])
+    late, is_leader = flights.join('2000', 'IGC')
+    assert not is_leader
+    assert late.result(timeout=0) == ['igc row']
+
+
+def test_group_is_dropped_once_every_key_is_done():
+    flights = SingleFlight()
+    flights.join('2000', 'IGC')
+    flights.resolve('2000', 'IGC', ['row'])
+    _, is_leader = flights.join('2000', 'IGC')
+    assert is_leader
+
+
+def test_abandon_fails_followers_and_frees_the_key():
+    flights = SingleFlight()
+    leader, _ = flights.join('2000', 'IGC')
+    flights.join('2000', 'PGW')
+    flights.abandon('2000', 'IGC', TimeoutError("leg timed out"))
+    with pytest.raises(TimeoutError):
+        leader.result(timeout=0)
+    _, is_leader = flights.join('2000', 'IGC')
+    assert is_leader
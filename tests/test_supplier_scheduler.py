@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from job_queue import JobQueue
+from supplier_scheduler import SupplierLimiter, SupplierScheduler
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def settle():
+    """Let granted waiters run"""
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_caps_legs_in_flight():
+    async def scenario():
+        limiter = SupplierLimiter('IGC', max_in_flight=2, per_minute=6000)
+        legs = [asyncio.ensure_future(limiter.acquire()) for _ in range(3)]
+        await settle()
+        assert [leg.done() for leg in legs] == [True, True, False]
+        assert (limiter.in_flight, limiter.queued()) == (2, 1)
+        limiter.release()
+        await asyncio.wait_for(legs[2], 1)  # Once the bucket has a token again
+        assert (limiter.in_flight, limiter.queued()) == (2, 0)
+    run(scenario())
+
+
+def test_users_are_served_round_robin():
+    async def scenario():
+        limiter = SupplierLimiter('IGC', max_in_flight=1, per_minute=6000)
+        order = []
+
+        async def leg(name, user):
+            await limiter.acquire(user)
+            order.append(name)
+
+        tasks = [asyncio.ensure_future(leg(name, user))
+                 for name, user in (('a1', 'alice'), ('a2', 'alice'), ('a3', 'alice'), ('b1', 'bob'))]
+        for _ in tasks:
+            await settle()
+            limiter.release()
+        await asyncio.gather(*tasks)
+        assert order == ['a1', 'a2', 'b1', 'a3']
+    run(scenario())
+
+
+def test_token_bucket_spaces_leg_starts():
+    async def scenario():
+        limiter = SupplierLimiter('IGC', max_in_flight=1, per_minute=600)  # One token every 0.1 s
+        await limiter.acquire()
+        limiter.release()
+        start = time.monotonic()
+        await limiter.acquire()
+        assert time.monotonic() - start >= 0.05
+    run(scenario())
+
+
+def test_slot_times_out_and_drops_the_waiter():
+    async def scenario():
+        scheduler = SupplierScheduler({'IGC': (1, 6000)}, (3, 30))
+        async with scheduler.slot('IGC'):
+            with pytest.raises(asyncio.TimeoutError):
+                async with scheduler.slot('IGC', timeout=0.05):
+                    pass
+            assert scheduler.snapshot() == {'IGC': (1, 0)}
+        assert scheduler.snapshot() == {'IGC': (0, 0)}
+        assert scheduler.limiter('PGW').max_in_flight == 3
+    run(scenario())
+
+
+def test_shared_limits_hold_across_schedulers(tmp_path):
+    queue = JobQueue(str(tmp_path / 'scrape_jobs.db'))
+
+    async def scenario():
+        web = SupplierScheduler({'IGC': (1, 6000)}, (3, 30), shared=queue)
+        worker = SupplierScheduler({'IGC': (1, 6000)}, (3, 30), shared=queue)
+        async with web.slot('IGC'):
+            with pytest.raises(asyncio.TimeoutError):
+                async with worker.slot('IGC', timeout=0.5):
+                    pass
+        async with worker.slot('IGC', timeout=1):
+            with queue._connect() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM supplier_legs").fetchone()[0] == 1
+    run(scenario())
+
+    with queue._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM supplier_legs").fetchone()[0] == 0
+
+
+def test_shared_token_bucket(tmp_path):
+    queue = JobQueue(str(tmp_path / 'scrape_jobs.db'))
+    assert queue.start_leg('IGC', 1, 60) == 0
+    queue.finish_leg('IGC')
+    wait = queue.start_leg('IGC', 1, 60)  # Bucket of one token, refilled once a second
+    assert 0 < wait <= 1
+
+
+class SharedLimits:
+    """Stands in for the JobQueue leg methods, counting calls and the threads they run on"""
+
+    def __init__(self, delay=0, error=None):
+        self.delay = delay
+        self.error = error
+        self.started = 0
+        self.finished = 0
+        self.threads = set()
+
+    def start_leg(self, supplier, max_in_flight, per_minute):
+        self.threads.add(threading.current_thread())
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        self.started += 1
+        return 0
+
+    def finish_leg(self, supplier):
+        self.threads.add(threading.current_thread())
+        self.finished += 1
+
+
+def test_shared_limits_stay_off_the_loop():
+    shared = SharedLimits(delay=0.2)
+
+    async def scenario():
+        scheduler = SupplierScheduler({'IGC': (1, 6000)}, (3, 30), shared=shared)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.ensure_future(tick())
+        async with scheduler.slot('IGC'):
+            pass
+        ticker.cancel()
+        assert ticks >= 10  # The loop kept running while the leg was started
+    run(scenario())
+    assert (shared.started, shared.finished) == (1, 1)
+    assert threading.main_thread() not in shared.threads
+
+
+def test_leg_started_after_a_timeout_is_finished():
+    shared = SharedLimits(delay=0.2)
+
+    async def scenario():
+        scheduler = SupplierScheduler({'IGC': (1, 6000)}, (3, 30), shared=shared)
+        with pytest.raises(asyncio.TimeoutError):
+            async with scheduler.slot('IGC', timeout=0.05):
+                pass
+        assert scheduler.snapshot() == {'IGC': (0, 0)}
+        await asyncio.sleep(0.3)
+    run(scenario())
+    assert (shared.started, shared.finished) == (1, 1)
+
+
+def test_unavailable_shared_limits_fall_back_to_local_ones():
+    shared = SharedLimits(error=OSError("database is locked"))
+
+    async def scenario():
+        scheduler = SupplierScheduler({'IGC': (1, 6000)}, (3, 30), shared=shared)
+        async with scheduler.slot('IGC', timeout=1):
+            pass
+    run(scenario())
+    assert shared.finished == 0  # No shared leg was started, so none is finished
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import capture
+import resource_blocking
+import scrape_context
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10  # Seconds before a readiness condition is considered failed
+POLL_FREQUENCY = 0.1  # WebDriverWait's default 0.5 s adds up to half a second per wait
+
+# label -> {'count', 'total', 'max', 'timeouts'}
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def _qualified(label):
+    """Prefix label with the supplier of the leg running on this thread"""
+    context = scrape_context.current()
+    if context is not None:
+        return f"{context.supplier}:{label}"
+    return label
+
+
+def _record(label, elapsed, timed_out):
+    with _timings_lock:
+        stats = _timings.setdefault(label, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        if timed_out:
+            stats['timeouts'] += 1
+    logger.debug(f"Wait '{label}' {'timed out' if timed_out else 'met'} after {elapsed:.2f}s")
+
+
+def timings():
+    """Copy of the recorded wait statistics, keyed by supplier-qualified label"""
+    with _timings_lock:
+        return {label: dict(stats) for label, stats in _timings.items()}
+
+
+def _as_condition(condition):
+    # A bare (By, value) locator means "element is present"
+    if isinstance(condition, tuple):
+        condition = EC.presence_of_element_located(condition)
+
+    def check(driver):
+        scrape_context.check_cancelled()  # Stop polling as soon as the leg is cancelled
+        return condition(driver)
+    return check
+
+
+def wait_for(driver, condition, timeout=DEFAULT_TIMEOUT, label="condition"):
+    """Block until condition holds and return its value, recording how long it took.
+
+    ``condition`` is an expected_conditions callable or a (By, value) locator.
+    Raises selenium's TimeoutException like WebDriverWait.until. The timeout
+    is shortened to whatever is left of the leg's deadline, and a cancelled
+    leg raises ScrapeCancelled instead of waiting.
+    """
+    label = _qualified(label)
+    timeout = scrape_context.remaining(timeout)
+    start = time.time()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(_as_condition(condition))
+    except TimeoutException:
+        _record(label, time.time() - start, timed_out=True)
+        raise
+    finally:
+        # Response bodies are only retrievable while the page is current
+        if capture.current_recorder() is not None:
+            drain_network(driver)
+    _record(label, time.time() - start, timed_out=False)
+    return result
+
+
+def drain_network(driver, page_loaded=False):
+    """Hand the browser's pending network events to the capture recorder and the page-load counters.
+
+    With ``page_loaded`` the requests tallied so far are flushed as one page
+    load; otherwise they keep accumulating (capture mode drains after every wait).
+    """
+    recorder = capture.current_recorder()
+    if recorder is None and not resource_blocking.STATS_ENABLED:
+        return
+    events = resource_blocking.network_events(driver)
+    if recorder is not None:
+        recorder.consume(driver, events)
+    if resource_blocking.STATS_ENABLED:
+        resource_blocking.track(driver, events)
+        if page_loaded:
+            resource_blocking.page_loaded(driver)
+
+
+def wait_for_any(driver, locators, timeout=DEFAULT_TIMEOUT, label="any"):
+    """Wait until one of several locators matches; returns (index, element) of the first hit.
+
+    Lets a scraper wait for "results or no-results or login form" in one go
+    instead of probing each outcome with its own timeout.
+    """
+    def first_match(d):
+        for index, (by, value) in enumerate(locators):
+            elements = d.find_elements(by, value)
+            if elements:
+                return index, elements[0]
+        return False
+
+    return wait_for(driver, first_match, timeout, label)
+
+
+def exists(driver, by, value):
+    """Immediate presence check - never waits (implicit waits are disabled on pooled drivers)"""
+    return bool(driver.find_elements(by, value))
+
+
+def _dom_parsed(d):
+    return d.execute_script("return document.readyState") in ("interactive", "complete")
+
+
+def wait_for_dom(driver, timeout=DEFAULT_TIMEOUT, label="dom parsed"):
+    """Wait until the HTML document has been parsed (readyState interactive or complete)"""
+    return wait_for(driver, _dom_parsed, timeout, label)
+
+
+def navigate(driver, url, ready=None, timeout=DEFAULT_TIMEOUT, label="page ready"):
+    """driver.get(url) followed by an explicit readiness wait.
+
+    With the 'eager' or 'none' page-load strategies driver.get returns before
+    the page has finished loading, so callers pass the element that proves the
+    page is usable: a condition, a locator, or a list of locators (then the
+    result of wait_for_any is returned). Without ``ready`` we wait for the DOM
+    to be parsed, which is immediate under the 'normal' and 'eager' strategies.
+    """
+    scrape_context.check_cancelled()
+    driver.get(url)
+    try:
+        if isinstance(ready, list):
+            return wait_for_any(driver, ready, timeout, label)
+        if ready is not None:
+            return wait_for(driver, ready, timeout, label)
+        return wait_for_dom(driver, timeout, label)
+    finally:
+        drain_network(driver, page_loaded=True)